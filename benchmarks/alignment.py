@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+Compares looking up each word's gloss and sentence with
+IntervalTier.intervalContaining() against aligning entire tiers at once with
+librecval.alignment.IntervalIndex, on a large synthetic elicitation session.
+
+Usage:
+    python -m benchmarks.alignment [--words N]
+"""
+
+import argparse
+import random
+from timeit import repeat
+
+from textgrid import IntervalTier  # type: ignore
+
+from librecval.alignment import IntervalIndex
+
+
+def make_tier(name: str, count: int, step: float) -> IntervalTier:
+    tier = IntervalTier(name)
+    time = 0.0
+    for i in range(count):
+        start = time + random.randint(0, 3) * step
+        time = start + random.randint(1, 8) * step
+        tier.add(start, time, f"{name} {i}")
+    return tier
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--words", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    cree_words = make_tier("Cree (word)", args.words, 0.125)
+    english_words = make_tier("English (word)", args.words, 0.125)
+    cree_sentences = make_tier("Cree (sentence)", args.words // 5, 0.625)
+
+    def one_at_a_time():
+        for interval in cree_words:
+            midtime = (interval.minTime + interval.maxTime) / 2
+            english_words.intervalContaining(midtime)
+            cree_sentences.intervalContaining(midtime)
+
+    def all_at_once():
+        words = IntervalIndex.from_tier(cree_words)
+        IntervalIndex.from_tier(english_words).midpoints_containing(words)
+        IntervalIndex.from_tier(cree_sentences).midpoints_containing(words)
+
+    print(f"{args.words} words, {args.words // 5} sentences")
+    results = {}
+    for name, function in [
+        ("intervalContaining", one_at_a_time),
+        ("IntervalIndex", all_at_once),
+    ]:
+        results[name] = min(repeat(function, repeat=args.repeat, number=1))
+        print(f"{name:>18}: {results[name] * 1000:8.2f} ms")
+    speedup = results["intervalContaining"] / results["IntervalIndex"]
+    print(f"speedup: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
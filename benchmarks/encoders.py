@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+Compares how many snippets per second each .m4a encoder can encode, using
+snippets cut from tests/fixtures/test.wav: first the encoder on its own, then
+end to end, through save_recording() and the transcode cache, both when the
+cache is empty and when every snippet is already in it. ffmpeg processes are
+counted too.
+
+Usage:
+    python -m benchmarks.encoders [--snippets N]
+"""
+
+import argparse
+import logging
+import subprocess
+import tempfile
+from pathlib import Path
+from time import perf_counter
+from typing import List, Tuple
+
+from pydub import AudioSegment  # type: ignore
+
+from librecval.extract_phrases import RecordingInfo
+from librecval.import_recordings import save_recording
+from librecval.recording_session import SessionID
+from librecval.transcode_cache import TranscodeCache
+from librecval.transcode_recording import ENCODERS, AACEncoder, PyAVEncoder
+
+TEST_WAV = Path(__file__).parent.parent / "tests" / "fixtures" / "test.wav"
+
+TAGS = dict(
+    title="acimosis",
+    artist="SPEAKER",
+    album="2015-12-03-AM-___-_",
+    language="crk",
+    creation_time="2015-12-03",
+    year=2015,
+)
+
+SESSION = SessionID.from_name(TAGS["album"])
+
+
+class FFmpegCounter:
+    """
+    Counts how many times ffmpeg is started, while in the with block.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._popen = subprocess.Popen
+
+    def __enter__(self) -> "FFmpegCounter":
+        def popen(args, *rest, **kwargs):
+            if args[0] == AudioSegment.converter:
+                self.count += 1
+            return self._popen(args, *rest, **kwargs)
+
+        subprocess.Popen = popen  # type: ignore
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        subprocess.Popen = self._popen  # type: ignore
+
+
+def save_all(
+    sound_bites: List[AudioSegment],
+    destination: Path,
+    cache: TranscodeCache,
+    encoder: AACEncoder,
+) -> Tuple[float, int]:
+    """
+    Saves every snippet as a recording. Returns the snippets/s, and how many
+    times ffmpeg was started.
+    """
+    destination.mkdir()
+    with FFmpegCounter() as ffmpeg:
+        start = perf_counter()
+        for n, sound_bite in enumerate(sound_bites):
+            info = RecordingInfo(
+                session=SESSION,
+                speaker=TAGS["artist"],
+                type="word",
+                timestamp=n,
+                transcription=TAGS["title"],
+                translation="snippet",
+            )
+            save_recording(destination, info, sound_bite, cache=cache, encoder=encoder)
+        elapsed = perf_counter() - start
+    return len(sound_bites) / elapsed, ffmpeg.count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--snippets", type=int, default=100)
+    args = parser.parse_args()
+    # save_recording() logs every recording, which would drown out the results:
+    logging.disable(logging.INFO)
+
+    sound = AudioSegment.from_file(str(TEST_WAV))
+    # Roughly what a track looks like: many short words.
+    sound_bites = [
+        sound[start : start + 300]
+        for start in range(0, len(sound) - 300, 5)[: args.snippets]
+    ]
+
+    print(f"{len(sound_bites)} snippets from {TEST_WAV.name}")
+    print("Encoder only:")
+    results = {}
+    for name, encoder_class in sorted(ENCODERS.items()):
+        if encoder_class is PyAVEncoder and not PyAVEncoder.is_available():
+            print(f"{name:>6}: not installed")
+            continue
+        encoder = encoder_class()
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            start = perf_counter()
+            for n, sound_bite in enumerate(sound_bites):
+                destination = Path(temporary_directory) / f"{n}.m4a"
+                encoder.encode(sound_bite, destination, tags=TAGS)
+            results[name] = len(sound_bites) / (perf_counter() - start)
+        print(f"{name:>6}: {results[name]:8.1f} snippets/s")
+
+    for name, rate in sorted(results.items()):
+        if name != "pydub":
+            print(f"{name} speedup: {rate / results['pydub']:.1f}x")
+
+    print("save_recording(), empty cache, then full cache:")
+    for name in sorted(results):
+        encoder = ENCODERS[name]()
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            temporary_path = Path(temporary_directory)
+            cache = TranscodeCache(temporary_path / "cache")
+            for attempt in ("cold", "warm"):
+                rate, ffmpeg_runs = save_all(
+                    sound_bites, temporary_path / attempt, cache, encoder
+                )
+                print(
+                    f"{name:>6} ({attempt}): {rate:8.1f} snippets/s, "
+                    f"{ffmpeg_runs} ffmpeg processes"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+Compares pydub's AudioSegment.normalize() with librecval.pcm.normalize_peaks()
+by normalizing snippets cut from tests/fixtures/test.wav.
+
+Usage:
+    python -m benchmarks.normalize [--repeat N]
+"""
+
+import argparse
+from pathlib import Path
+from timeit import repeat
+
+from pydub import AudioSegment  # type: ignore
+
+from librecval.pcm import normalize_peaks
+
+TEST_WAV = Path(__file__).parent.parent / "tests" / "fixtures" / "test.wav"
+
+HEADROOM = 0.1  # dB, same as librecval.extract_phrases
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    sound = AudioSegment.from_file(str(TEST_WAV))
+    # Roughly what a track looks like: many short, overlapping words.
+    sound_bites = [
+        sound[start : start + 300] for start in range(0, len(sound) - 300, 10)
+    ]
+
+    expected = [s.normalize(headroom=HEADROOM).raw_data for s in sound_bites]
+    actual = [s.raw_data for s in normalize_peaks(sound_bites, headroom=HEADROOM)]
+    assert actual == expected, "normalize_peaks() does not match pydub!"
+
+    def with_pydub():
+        for sound_bite in sound_bites:
+            sound_bite.normalize(headroom=HEADROOM)
+
+    def with_numpy():
+        normalize_peaks(sound_bites, headroom=HEADROOM)
+
+    print(f"{len(sound_bites)} snippets from {TEST_WAV.name}")
+    results = {}
+    for name, function in [("pydub", with_pydub), ("numpy", with_numpy)]:
+        best = min(repeat(function, repeat=args.repeat, number=args.number))
+        results[name] = best / args.number
+        print(f"{name:>6}: {results[name] * 1000:8.2f} ms per track")
+    print(f"speedup: {results['pydub'] / results['numpy']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
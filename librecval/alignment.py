@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Aligns the intervals of one TextGrid tier with the intervals of another.
+"""
+
+from decimal import Decimal
+from typing import List, Sequence, Union
+
+import numpy as np
+from textgrid import IntervalTier  # type: ignore
+
+# Returned instead of an index when no interval contains the time.
+NOT_FOUND = -1
+
+
+class IntervalIndex:
+    """
+    A tier, converted once into sorted arrays of integer milliseconds.
+
+    Looking up which interval contains a time is a binary search over these
+    arrays, so aligning every interval of one tier with another takes
+    O(m log n) instead of O(m × n), and is done in one vectorized call.
+    """
+
+    def __init__(
+        self,
+        starts: Sequence[int],
+        ends: Sequence[int],
+        marks: List[str],
+        name: str = "",
+    ) -> None:
+        assert len(starts) == len(ends) == len(marks)
+        self.name = name
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.marks = marks
+        assert np.all(self.ends[:-1] <= self.ends[1:]), "intervals are not sorted"
+
+    @classmethod
+    def from_tier(cls, tier: IntervalTier) -> "IntervalIndex":
+        intervals = list(tier)
+        return cls(
+            [to_milliseconds(interval.minTime) for interval in intervals],
+            [to_milliseconds(interval.maxTime) for interval in intervals],
+            [interval.mark for interval in intervals],
+            name=tier.name,
+        )
+
+    def __len__(self) -> int:
+        return len(self.marks)
+
+    def midpoints_containing(self, other: "IntervalIndex") -> np.ndarray:
+        """
+        For every interval in the other index, returns the index of the
+        interval in this index that contains its midpoint, or NOT_FOUND.
+
+        Like IntervalTier.intervalContaining(), a midpoint that lands exactly
+        on the boundary between two intervals belongs to the earlier one.
+        """
+        # Work in half-milliseconds, so that midpoints are integers too.
+        midpoints = other.starts + other.ends
+        # The first interval that does not end before the midpoint...
+        indices = np.searchsorted(2 * self.ends, midpoints, side="left")
+        # ...contains the midpoint, unless it starts after the midpoint.
+        found = indices < len(self)
+        clamped = np.minimum(indices, len(self) - 1)
+        if len(self) > 0:
+            found &= 2 * self.starts[clamped] <= midpoints
+        return np.where(found, indices, NOT_FOUND)
+
+
+def to_milliseconds(seconds: Union[Decimal, float]) -> int:
+    """
+    Converts interval times to an integer in milliseconds.
+    """
+    return int(seconds * 1000)
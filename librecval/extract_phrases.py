@@ -21,19 +21,48 @@
 #  - extract_items.praat
 #  - extract_sessions.praat
 
+import audioop
 import logging
+import mmap
+import multiprocessing
 import re
-from decimal import Decimal
+import struct
+import threading
+from contextlib import ExitStack, contextmanager
 from hashlib import sha256
 from os import fspath
 from pathlib import Path
-from typing import Dict, NamedTuple, Optional
+from typing import (
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import logme  # type: ignore
+import numpy as np
+from librecval.alignment import NOT_FOUND, IntervalIndex, to_milliseconds
+from librecval.import_journal import ImportJournal
+from librecval.import_manifest import ImportManifest, SessionInputs
+from librecval.import_report import ImportReport
 from librecval.normalization import normalize
-from librecval.recording_session import SessionID, SessionMetadata
+from librecval.pcm import channel_of, normalize_peak, normalize_peaks
+from librecval.pcm_cache import PCMCache
+from librecval.recording_session import (
+    SessionID,
+    SessionMetadata,
+    SessionParseError,
+)
+from librecval.session_directory import SessionDirectory, list_directory
+from librecval.text_grid_cache import TextGridCache
 from pydub import AudioSegment  # type: ignore
-from textgrid import IntervalTier, TextGrid  # type: ignore
 
 # ############################### Exceptions ############################### #
 
@@ -56,6 +85,18 @@ class InvalidTextGridName(RuntimeError):
     """
 
 
+class UnsupportedWaveFile(RuntimeError):
+    """
+    Raised when a .wav file cannot be memory-mapped, e.g., it's not PCM.
+    """
+
+
+class RecordingNotFoundError(RuntimeError):
+    """
+    Raised when a recording cannot be found in its session anymore.
+    """
+
+
 # ########################################################################## #
 
 
@@ -90,6 +131,38 @@ class RecordingInfo(NamedTuple):
         return sha256(self.signature().encode("UTF-8")).hexdigest()
 
 
+class Track(NamedTuple):
+    """
+    A TextGrid and its cooresponding audio: everything that was recorded on
+    one mic during one session.
+
+    If the audio is a multi-channel master (with every mic in one file), the
+    track is just one of its channels.
+    """
+
+    session: SessionID
+    speaker: str
+    text_grid: Path
+    sound_file: Path
+    channel: Optional[int] = None  # counting from 0
+
+
+class Snippet(NamedTuple):
+    """
+    Where to find a recording in its track, before any audio is decoded.
+    """
+
+    info: RecordingInfo
+    start: int  # in milliseconds
+    end: int  # in milliseconds
+
+
+Recordings = List[Tuple[RecordingInfo, AudioSegment]]
+
+# Given some recording IDs, returns the ones that have already been imported.
+ExistingRecordings = Callable[[List[str]], Set[str]]
+
+
 @logme.log
 class RecordingExtractor:
     """
@@ -98,56 +171,257 @@ class RecordingExtractor:
 
     logger: logging.Logger
 
-    def __init__(self, metadata=Dict[SessionID, SessionMetadata]) -> None:
+    def __init__(
+        self,
+        metadata=Dict[SessionID, SessionMetadata],
+        manifest: Optional[ImportManifest] = None,
+        existing_recordings: Optional[ExistingRecordings] = None,
+        report: Optional[ImportReport] = None,
+        journal: Optional[ImportJournal] = None,
+        text_grid_cache: Optional[TextGridCache] = None,
+        session_names: Optional[Collection[str]] = None,
+        pcm_cache: Optional[PCMCache] = None,
+    ) -> None:
         self.sessions: Dict[SessionID, Path] = {}
         self.metadata = metadata
-
-    def scan(self, root_directory: Path):
+        # When given, sessions that have not changed since the last import
+        # are skipped.
+        self.manifest = manifest
+        # When given, recordings that already exist are not extracted again.
+        self.existing_recordings = existing_recordings
+        self.report = report if report is not None else ImportReport()
+        # When given, tracks that an unfinished import already imported are
+        # skipped.
+        self.journal = journal
+        # When given, TextGrids that were parsed before are not parsed again.
+        self.text_grid_cache = text_grid_cache
+        # When given, only the session directories with these names are
+        # scanned.
+        self.session_names = session_names
+        # When given, masters that were decoded before are not decoded again.
+        self.pcm_cache = pcm_cache
+        self._session_inputs: Dict[SessionID, SessionInputs] = {}
+        # The multi-channel master that is currently open (if any), so that
+        # each mic's track does not have to open it again.
+        self._master: Optional[Tuple[Path, Audio]] = None
+        self._master_stack = ExitStack()
+
+    def __getstate__(self):
+        # Worker processes only cut snippets out of tracks that have already
+        # been planned; they have no use for the manifest or the journal, nor
+        # for checking which recordings exist (which might not even be
+        # picklable).
+        state = self.__dict__.copy()
+        state["manifest"] = None
+        state["existing_recordings"] = None
+        state["journal"] = None
+        state["_session_inputs"] = {}
+        state["report"] = ImportReport()
+        state["_master"] = None
+        state["_master_stack"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._master_stack = ExitStack()
+
+    def scan(self, root_directory: Path, jobs: int = 1):
         """
         Scans the directory provided for sessions.
         For each session directory found, its TextGrid/.wav file pairs are
         scanned for words and sentences.
+
+        When jobs > 1, each track is extracted in a pool of that many
+        processes. Recordings are yielded in the same order either way.
+        """
+        for _track, recordings in self.scan_by_track(root_directory, jobs):
+            yield from recordings
+
+    def scan_by_track(
+        self, root_directory: Path, jobs: int = 1
+    ) -> Iterator[Tuple[Track, Recordings]]:
+        """
+        Same as scan(), but yields every track along with its recordings,
+        even if it has none.
+        """
+        if jobs <= 1:
+            try:
+                for track in self.scan_tracks(root_directory):
+                    snippets = self.plan_track(track)
+                    recordings = (
+                        list(self.cut_track(track, snippets)) if snippets else []
+                    )
+                    yield track, recordings
+            finally:
+                self.close_master()
+            return
+
+        # Plan every track up front: this only needs the TextGrids, which is
+        # cheap compared to decoding audio.
+        planned = [
+            (track, self.plan_track(track))
+            for track in self.scan_tracks(root_directory)
+        ]
+        jobs_to_cut = [(track, snippets) for track, snippets in planned if snippets]
+        self.logger.info("Extracting %d tracks with %d jobs", len(jobs_to_cut), jobs)
+
+        # Only hand out a few tracks more than there are workers; otherwise,
+        # the pool would happily extract every track into memory while the
+        # consumer is still busy with the first one.
+        slots = threading.Semaphore(2 * jobs)
+        done = False
+
+        def throttled():
+            for job in jobs_to_cut:
+                slots.acquire()
+                if done:
+                    return
+                yield job
+
+        with multiprocessing.Pool(jobs) as pool:
+            try:
+                # imap() returns results in the order the tracks were
+                # submitted, no matter which worker finishes first.
+                results = pool.imap(self.cut_track_eagerly, throttled())
+                for track, snippets in planned:
+                    if not snippets:
+                        yield track, []
+                        continue
+                    recordings, report = next(results)
+                    slots.release()
+                    self.report.merge(report)
+                    yield track, recordings
+            finally:
+                # Unblock the pool's task handler, if need be.
+                done = True
+                slots.release()
+
+    def scan_tracks(self, root_directory: Path) -> Iterator[Track]:
+        """
+        Yields every track from every session in the directory provided.
         """
         self.logger.debug("Scanning %s for sessions...", root_directory)
-        for session_dir in root_directory.iterdir():
-            if not session_dir.resolve().is_dir():
-                self.logger.debug("Rejecting %s; not a directory", session_dir)
-                continue
+        files, directories = list_directory(root_directory)
+        for name in files:
+            self.logger.debug("Rejecting %s; not a directory", root_directory / name)
+        if self.session_names is not None:
+            directories = [name for name in directories if name in self.session_names]
+        for session_dir in (root_directory / name for name in sorted(directories)):
             try:
-                yield from self.extract_session(session_dir)
+                yield from self.tracks_in_session(session_dir)
             except DuplicateSessionError:
                 self.logger.exception("Skipping %s: duplicate", session_dir)
             except MissingMetadataError:
                 self.logger.exception("Skipping %s: Missing metadata", session_dir)
 
+    def extract_recording(
+        self,
+        root_directory: Path,
+        session_id: SessionID,
+        rec_id: str,
+        speaker: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> Tuple[RecordingInfo, AudioSegment]:
+        """
+        Extracts a single recording, given its ID, from its session in the
+        directory provided. Only the TextGrids of the speaker's tracks (if the
+        speaker is given) are read, and only the recording's audio is sliced
+        out of its track.
+
+        The recording can be cut at a different start or end (in milliseconds)
+        than its TextGrid says; its ID (and timestamp) stay the same.
+        """
+        session_dir = find_session_directory(root_directory, session_id)
+        if session_dir is None:
+            raise RecordingNotFoundError(f"No directory for {session_id}")
+
+        for track in self.tracks_in_session(session_dir):
+            if speaker is not None and track.speaker != speaker:
+                continue
+            for snippet in self.plan_track(track):
+                if snippet.info.compute_sha256hash() != rec_id:
+                    continue
+                if start is not None:
+                    snippet = snippet._replace(start=start)
+                if end is not None:
+                    snippet = snippet._replace(end=end)
+                if not 0 <= snippet.start < snippet.end:
+                    raise ValueError(f"Invalid bounds: {snippet.start}-{snippet.end}")
+                try:
+                    ((info, audio),) = self.cut_track(track, [snippet])
+                finally:
+                    self.close_master()
+                return info, audio
+
+        raise RecordingNotFoundError(f"{rec_id} is not in {session_dir}")
+
+    def reassigned_recordings(
+        self, session_dir: Path, speakers: Dict[str, str]
+    ) -> Dict[str, str]:
+        """
+        Returns the old and new ID of every recording in the session whose
+        speaker was reassigned, given each old speaker code and its new code.
+        The extractor must have the session's new metadata. Only the
+        TextGrids are read; the audio is not touched at all.
+        """
+        old_speaker_of = {new: old for old, new in speakers.items()}
+        renamed = {}
+        for track in self.tracks_in_session(session_dir):
+            if track.speaker not in old_speaker_of:
+                continue
+            for snippet in self.plan_track(track):
+                info = snippet.info
+                old_info = info._replace(speaker=old_speaker_of[track.speaker])
+                renamed[old_info.compute_sha256hash()] = info.compute_sha256hash()
+        return renamed
+
     def extract_session(self, session_dir: Path):
         """
         Extracts recordings from a single session.
         """
+        for track in self.tracks_in_session(session_dir):
+            yield from self.extract_track(track)
+
+    def tracks_in_session(self, session_dir: Path) -> Iterator[Track]:
+        """
+        Yields each TextGrid/audio pair in a single session.
+        """
         session_id = SessionID.from_name(session_dir.stem)
         if session_id in self.sessions:
+            self.report.skip(session_id, "duplicate session")
             raise DuplicateSessionError(
                 f"Duplicate session: {session_id} "
                 f"found at {self.sessions[session_id]}"
             )
         if session_id not in self.metadata:
+            self.report.skip(session_id, "no metadata")
             raise MissingMetadataError(f"Missing metadata for {session_id}")
 
         self.logger.debug("Scanning %s for .TextGrid files", session_dir)
-        text_grids = list(session_dir.glob("*.TextGrid"))
+        directory = SessionDirectory(session_dir)
+        text_grids = directory.text_grids
         self.logger.info("%d text grids in %s", len(text_grids), session_dir)
 
+        # Only look for a multi-channel master if a TextGrid needs one.
+        masters: Optional[Dict[Path, int]] = None
+
+        tracks = []
         for text_grid in text_grids:
-            # Find the cooresponding audio with a couple different strategies.
-            sound_file = find_audio_from_audacity_format(
-                text_grid
-            ) or find_audio_from_audition_format(text_grid)
+            sound_file = directory.audio_for(text_grid)
+            channel = None
+
+            if sound_file is None:
+                # Maybe every mic was recorded into the same file:
+                if masters is None:
+                    masters = find_multichannel_masters(directory.wave_files)
+                sound_file, channel = find_channel(text_grid, masters)
 
             if sound_file is None:
                 self.logger.warn("Could not find cooresponding audio for %s", text_grid)
+                self.report.skip(session_id, "no audio")
                 continue
 
-            assert text_grid.exists() and sound_file.exists()
             self.logger.debug("Matching sound file for %s", text_grid)
 
             try:
@@ -159,54 +433,213 @@ class RecordingExtractor:
                 self.logger.warn("Assuming single text grid is mic 1")
 
             speaker = self.metadata[session_id][mic_id]
+            tracks.append(Track(session_id, speaker, text_grid, sound_file, channel))
 
-            self.logger.debug(
-                "Opening audio and text grid from %s for speaker %s",
-                sound_file,
-                speaker,
+        if self.manifest is not None:
+            # Every mic may share the same master, so count each file once.
+            files = {path for t in tracks for path in (t.text_grid, t.sound_file)}
+            inputs = self.manifest.inputs_for(
+                session_id, self.metadata[session_id], files
             )
+            if self.manifest.is_unchanged(session_id, inputs):
+                self.logger.info(
+                    "Skipping %s: unchanged since last import", session_dir
+                )
+                self.report.skip(session_id, "unchanged")
+                return
+            if tracks:
+                # Only remember the session once all its tracks are imported.
+                self._session_inputs[session_id] = inputs
+            else:
+                self.manifest.record(session_id, inputs)
+
+        yield from tracks
+
+    def finish_track(self, track: Track) -> None:
+        """
+        Call this once all of the track's recordings have been imported.
+        """
+        if self.journal is not None:
+            self.journal.record(track.text_grid, track.sound_file)
+
+    def finish_session(self, session_id: SessionID) -> None:
+        """
+        Call this once all of the session's tracks have been imported.
+        """
+        inputs = self._session_inputs.pop(session_id, None)
+        if self.manifest is not None and inputs is not None:
+            self.manifest.record(session_id, inputs)
+            self.manifest.save()
+
+    def extract_track(self, track: Track):
+        """
+        Extracts recordings from a single TextGrid/audio pair.
+        """
+        snippets = self.plan_track(track)
+        if snippets:
+            yield from self.cut_track(track, snippets)
+
+    def plan_track(self, track: Track) -> List[Snippet]:
+        """
+        Finds every snippet in the track's TextGrid that still needs to be
+        extracted. This does not touch the audio at all.
+        """
+        if self.journal is not None and self.journal.is_done(
+            track.text_grid, track.sound_file
+        ):
+            self.logger.info("Skipping %s: done before resuming", track.text_grid)
+            self.report.skip(track.session, "resumed")
+            return []
+
+        self.logger.debug("Opening text grid %s", track.text_grid)
+        with self.report.stage("parse").timing():
+            tiers = load_text_grid(track.text_grid, self.text_grid_cache)
             extractor = PhraseExtractor(
-                session_id,
-                AudioSegment.from_file(fspath(sound_file)),
-                TextGrid.fromFile(fspath(text_grid)),
-                speaker,
+                track.session, None, tiers, track.speaker, report=self.report
             )
-            yield from extractor.extract_all()
+            snippets = list(extractor.plan_all())
+        self.report.session(track.session).text_grids += 1
+        if self.existing_recordings is None:
+            return snippets
 
+        existing = self.existing_recordings(
+            [snippet.info.compute_sha256hash() for snippet in snippets]
+        )
+        missing = [
+            snippet
+            for snippet in snippets
+            if snippet.info.compute_sha256hash() not in existing
+        ]
+        self.report.skip(track.session, "already imported", len(existing))
+        if not missing:
+            self.logger.info(
+                "All %d recordings from %s exist; not decoding %s",
+                len(snippets),
+                track.text_grid,
+                track.sound_file,
+            )
+        return missing
 
-@logme.log
-def find_audio_from_audacity_format(
-    annotation_path: Path, logger=None
+    def cut_track(self, track: Track, snippets: List[Snippet]):
+        """
+        Decodes the track's audio, and cuts out each of the given snippets.
+        """
+        self.logger.debug(
+            "Opening audio from %s for speaker %s", track.sound_file, track.speaker
+        )
+        with ExitStack() as stack:
+            with self.report.stage("decode").timing():
+                if track.channel is None:
+                    sound = stack.enter_context(
+                        open_audio(track.sound_file, self.pcm_cache)
+                    )
+                else:
+                    sound = self.open_master(track.sound_file)
+            with self.report.stage("slice").timing(len(snippets)):
+                sound_bites = [sound[s.start : s.end] for s in snippets]
+                if track.channel is not None:
+                    sound_bites = [channel_of(b, track.channel) for b in sound_bites]
+
+        # All of the track's snippets are normalized at once:
+        with self.report.stage("normalize").timing(len(snippets)):
+            normalized = normalize_peaks(sound_bites, headroom=HEADROOM)
+        yield from zip((snippet.info for snippet in snippets), normalized)
+
+    def open_master(self, sound_file: Path) -> "Audio":
+        """
+        Opens a multi-channel master. It stays open until a different master
+        is opened, since the tracks of a session's mics usually come one after
+        the other: that way, each master is only opened (or decoded) once.
+        """
+        if self._master is not None and self._master[0] == sound_file:
+            return self._master[1]
+
+        self.close_master()
+        self.logger.debug("Opening multi-channel master %s", sound_file)
+        sound = self._master_stack.enter_context(open_audio(sound_file, self.pcm_cache))
+        self._master = (sound_file, sound)
+        return sound
+
+    def close_master(self) -> None:
+        self._master = None
+        self._master_stack.close()
+
+    def cut_track_eagerly(
+        self, job: Tuple[Track, List[Snippet]]
+    ) -> Tuple[Recordings, ImportReport]:
+        """
+        Same as cut_track(), but returns a list, so that it can be sent
+        back from a worker process, along with how long each stage took.
+        """
+        track, snippets = job
+        self.report = ImportReport()
+        try:
+            recordings = list(self.cut_track(track, snippets))
+        finally:
+            # Every job gets its own copy of the extractor, so nothing can
+            # reuse the master afterwards.
+            self.close_master()
+        return recordings, self.report
+
+
+def find_session_directory(
+    root_directory: Path, session_id: SessionID
 ) -> Optional[Path]:
     """
-    Finds the associated audio in Audacity's format.
+    Returns the session's directory in the directory provided, if it's there.
+    Directories are named however the session was named when it was recorded,
+    which is not necessarily how the session ID is written.
     """
-    # TODO: tmill's kludge for certain missing filenames???
-    sound_file = annotation_path.with_suffix(".wav")
-    logger.debug("[Audacity Format] Trying %s...", sound_file)
-    return sound_file if sound_file.exists() else None
+    _files, directories = list_directory(root_directory)
+    for session_dir in (root_directory / name for name in sorted(directories)):
+        try:
+            if SessionID.from_name(session_dir.stem) == session_id:
+                return session_dir
+        except SessionParseError:
+            continue
+    return None
 
 
 @logme.log
-def find_audio_from_audition_format(
-    annotation_path: Path, logger=None
-) -> Optional[Path]:
-    #  Gross code to try Adobe Audition recorded files
-    session_dir = annotation_path.parent
-
-    # If it's in Audition format, there will be exactly ONE file with the
-    # *.sesx extension.
+def find_multichannel_masters(
+    sound_files: Iterable[Path], logger=None
+) -> Dict[Path, int]:
+    """
+    Finds the .wav files that have more than one channel, and how many
+    channels each has. Only the headers are read.
+    """
+    masters = {}
+    for sound_file in sound_files:
+        try:
+            wave_file = WaveFile(sound_file)
+        except UnsupportedWaveFile:
+            continue
+        channels = wave_file.channels
+        wave_file.close()
+        if channels > 1:
+            logger.debug("%s has %d channels", sound_file, channels)
+            masters[sound_file] = channels
+    return masters
+
+
+def find_channel(
+    annotation_path: Path, masters: Dict[Path, int]
+) -> Tuple[Optional[Path], Optional[int]]:
+    """
+    Finds the channel of the session's multi-channel master that has the
+    TextGrid's mic: mic 1 is the first channel, mic 2 the second, and so on.
+    Returns (None, None) if there's no (unambiguous) master with that mic.
+    """
+    if len(masters) != 1:
+        return None, None
+    ((master, channels),) = masters.items()
     try:
-        (audition_file,) = session_dir.glob("*.sesx")
-    except ValueError:
-        logger.debug("Could not find exactly one *.sesx file in %s", session_dir)
-        return None
-
-    sound_file = (
-        session_dir / f"{audition_file.stem}_Recorded" / f"{annotation_path.stem}.wav"
-    )
-    logger.debug("[Audition Format] Trying %s...", sound_file)
-    return sound_file if sound_file.exists() else None
+        mic_id = get_mic_id(annotation_path.stem)
+    except InvalidTextGridName:
+        return None, None
+    if not 1 <= mic_id <= channels:
+        return None, None
+    return master, mic_id - 1
 
 
 WORD_TIER_ENGLISH = 0
@@ -214,6 +647,106 @@ WORD_TIER_CREE = 1
 SENTENCE_TIER_ENGLISH = 2
 SENTENCE_TIER_CREE = 3
 
+# Praat's text files are a sequence of strings (in double quotes, which are
+# escaped by doubling them), numbers, and flags (like <exists>). Everything
+# else, like "xmin =" or "intervals [1]:", is only there for humans, so it is
+# skipped. This reads both the long and the short text formats.
+PRAAT_TOKEN = re.compile(
+    r"""
+        "(?P<string>(?:[^"]|"")*)"
+      | (?P<number>[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)
+      | \[[^\]]*\]  # indices
+      | <\w+>  # flags
+    """,
+    re.VERBOSE,
+)
+
+# Times are rounded like the textgrid package does, so that intervals start
+# and end on exactly the same milliseconds.
+TEXT_GRID_PRECISION = 5
+
+
+def load_text_grid(
+    text_grid: Path, cache: Optional[TextGridCache] = None
+) -> List[IntervalIndex]:
+    """
+    Returns the tiers that recordings are extracted from (see WORD_TIER_ENGLISH
+    and friends) as intervals in integer milliseconds. Only these tiers are
+    parsed.
+
+    If a cache is given, a TextGrid that was loaded before (even if it has been
+    renamed) is not parsed again.
+    """
+    contents = text_grid.read_bytes()
+    if cache is None:
+        return parse_text_grid(contents)
+
+    key = cache.key_for(contents)
+    tiers = cache.get(key)
+    if tiers is None:
+        tiers = parse_text_grid(contents)
+        cache.put(key, tiers)
+    return tiers
+
+
+def parse_text_grid(contents: bytes, tiers_needed: int = 4) -> List[IntervalIndex]:
+    """
+    Parses the first few tiers of a TextGrid in Praat's text format.
+
+    This produces the same intervals as the textgrid package, but without
+    building an object for every single interval, and without parsing the
+    tiers that are never used.
+    """
+    if contents.startswith((b"\xff\xfe", b"\xfe\xff")):
+        text = contents.decode("UTF-16")
+    else:
+        text = contents.decode("UTF-8-sig")
+
+    tokens = (
+        (match.group("string"), match.group("number"))
+        for match in PRAAT_TOKEN.finditer(text)
+        if match.lastgroup is not None
+    )
+
+    def next_string() -> str:
+        string, _number = next(tokens)
+        if string is None:
+            raise ValueError("Expected a string")
+        return string.replace('""', '"')
+
+    def next_number() -> str:
+        _string, number = next(tokens)
+        if number is None:
+            raise ValueError("Expected a number")
+        return number
+
+    def next_time() -> float:
+        return round(float(next_number()), TEXT_GRID_PRECISION)
+
+    try:
+        if not next_string().startswith("ooTextFile") or next_string() != "TextGrid":
+            raise ValueError("Not a TextGrid")
+        next_time(), next_time()
+        tier_count = int(next_number())
+
+        tiers = []
+        for _ in range(min(tier_count, tiers_needed)):
+            if next_string() != "IntervalTier":
+                raise ValueError("Only interval tiers are supported")
+            name = next_string()
+            next_time(), next_time()
+            starts, ends, marks = [], [], []
+            for _ in range(int(next_number())):
+                start, end, mark = next_time(), next_time(), next_string()
+                if start < end:  # the textgrid package ignores empty intervals
+                    starts.append(to_milliseconds(start))
+                    ends.append(to_milliseconds(end))
+                    marks.append(mark)
+            tiers.append(IntervalIndex(starts, ends, marks, name=name))
+    except StopIteration:
+        raise ValueError("TextGrid ended too soon")
+    return tiers
+
 
 @logme.log
 class PhraseExtractor:
@@ -226,28 +759,39 @@ class PhraseExtractor:
     def __init__(
         self,
         session: SessionID,
-        sound: AudioSegment,
-        text_grid: TextGrid,
+        sound: Optional[AudioSegment],  # None, if only planning
+        tiers: List[IntervalIndex],  # from load_text_grid()
         speaker: str,  # Something like "ABC"
+        report: Optional[ImportReport] = None,
     ) -> None:
         self.session = session
         self.sound = sound
-        self.text_grid = text_grid
+        self.tiers = tiers
         self.speaker = speaker
+        self.report = report
 
     def extract_all(self):
-        assert len(self.text_grid.tiers) >= 4, "TextGrid has too few tiers"
+        for snippet in self.plan_all():
+            yield self.cut(snippet)
+
+    def plan_all(self):
+        """
+        Yields every word and sentence in the TextGrid as a Snippet.
+        """
+        assert len(self.tiers) >= 4, "TextGrid has too few tiers"
 
         self.logger.debug("Extracting words from %s/%s", self.session, self.speaker)
-        yield from self.extract_words(
-            cree_tier=self.text_grid.tiers[WORD_TIER_CREE],
-            english_tier=self.text_grid.tiers[WORD_TIER_ENGLISH],
+        yield from self.plan_phrases(
+            "word",
+            cree=self.tiers[WORD_TIER_CREE],
+            english=self.tiers[WORD_TIER_ENGLISH],
         )
 
         self.logger.debug("Extracting sentences from %s/%s", self.session, self.speaker)
-        yield from self.extract_sentences(
-            cree_tier=self.text_grid.tiers[SENTENCE_TIER_CREE],
-            english_tier=self.text_grid.tiers[SENTENCE_TIER_ENGLISH],
+        yield from self.plan_phrases(
+            "sentence",
+            cree=self.tiers[SENTENCE_TIER_CREE],
+            english=self.tiers[SENTENCE_TIER_ENGLISH],
         )
 
     def extract_words(self, cree_tier, english_tier):
@@ -257,57 +801,72 @@ class PhraseExtractor:
         yield from self.extract_phrases("sentence", cree_tier, english_tier)
 
     def extract_phrases(
-        self, type_: str, cree_tier: IntervalTier, english_tier: IntervalTier
+        self, type_: str, cree_tier: IntervalIndex, english_tier: IntervalIndex
     ):
-        assert is_cree_tier(cree_tier), cree_tier.name
-        assert is_english_tier(english_tier), english_tier.name
+        for snippet in self.plan_phrases(type_, cree_tier, english_tier):
+            yield self.cut(snippet)
 
-        for interval in cree_tier:
-            if not interval.mark or interval.mark.strip() == "":
+    def cut(self, snippet: Snippet) -> Tuple[RecordingInfo, AudioSegment]:
+        """
+        Return a tuple of the phrase and its audio.
+        """
+        assert self.sound is not None, "Cannot cut snippets without audio"
+        return snippet.info, cut_snippet(self.sound, snippet)
+
+    def plan_phrases(self, type_: str, cree: IntervalIndex, english: IntervalIndex):
+        assert is_cree_tier(cree), cree.name
+        assert is_english_tier(english), english.name
+
+        # Align the entire tier at once, rather than searching the other
+        # tiers for every single interval.
+        glosses = english.midpoints_containing(cree)
+        if type_ == "word":
+            sentences = self.sentence_index()
+            in_sentence = sentences.midpoints_containing(cree)
+        else:
+            in_sentence = np.full(len(cree), NOT_FOUND)
+
+        for i, mark in enumerate(cree.marks):
+            if not mark or mark.strip() == "":
                 # This interval is empty, for some reason.
                 continue
 
-            transcription = normalize(interval.mark)
+            transcription = normalize(mark)
 
-            start = to_milliseconds(interval.minTime)
-            end = to_milliseconds(interval.maxTime)
-            midtime = (interval.minTime + interval.maxTime) / 2
+            start = int(cree.starts[i])
+            end = int(cree.ends[i])
 
             # Figure out if this word belongs to a sentence.
-            if type_ == "word" and self.timestamp_within_sentence(midtime):
+            sentence = in_sentence[i]
+            if sentence != NOT_FOUND and sentences.marks[sentence] != "":
                 # It's an example sentence; leave it for the next loop.
                 # TODO: WHY ARE WE SKIPPING IT AGAIN?
                 self.logger.debug("%r is in a sentence", transcription)
                 continue
 
             # Get the word's English gloss.
-            english_interval = english_tier.intervalContaining(midtime)
-            if english_interval is None:
-                self.logger.warn("Could not find translation for %r", interval)
+            gloss = glosses[i]
+            if gloss == NOT_FOUND:
+                self.logger.warn(
+                    "Could not find translation for %r at %d ms", mark, start
+                )
+                if self.report is not None:
+                    self.report.skip(self.session, "no translation")
                 continue
 
-            translation = normalize(english_interval.mark)
-
-            # Snip out the sounds.
-            sound_bite = self.sound[start:end]
-            # tmills: normalize sound levels (some speakers are very quiet)
-            sound_bite = sound_bite.normalize(headroom=0.1)  # dB
+            translation = normalize(english.marks[gloss])
 
-            yield self.info_for(type_, transcription, translation, start, sound_bite)
+            info = self.info_for(type_, transcription, translation, start)
+            yield Snippet(info, start, end)
 
     def info_for(
-        self,
-        type_: str,
-        transcription: str,
-        translation: str,
-        timestamp: int,
-        sound_bite: AudioSegment,
-    ):
+        self, type_: str, transcription: str, translation: str, timestamp: int
+    ) -> RecordingInfo:
         """
-        Return a tuple of the phrase and its audio.
+        Return all the information about the phrase.
         """
         assert type_ in ("word", "sentence")
-        info = RecordingInfo(
+        return RecordingInfo(
             session=self.session,
             speaker=self.speaker,
             type=type_,
@@ -315,34 +874,224 @@ class PhraseExtractor:
             transcription=transcription,
             translation=translation,
         )
-        return info, sound_bite
 
-    def timestamp_within_sentence(self, timestamp: Decimal):
+    def sentence_index(self) -> IntervalIndex:
         """
-        Return True when the timestamp is found inside a Cree sentence.
+        Returns the Cree sentences, indexed for alignment.
         """
-        sentences = self.text_grid.tiers[SENTENCE_TIER_CREE]
-        sentence = sentences.intervalContaining(timestamp)
-        return sentence and sentence.mark != ""
+        return self.tiers[SENTENCE_TIER_CREE]
 
+    def timestamp_within_sentence(self, timestamp: int):
+        """
+        Return True when the timestamp (in milliseconds) is found inside a
+        Cree sentence.
+        """
+        sentences = self.sentence_index()
+        point = IntervalIndex([timestamp], [timestamp], [""])
+        (sentence,) = sentences.midpoints_containing(point)
+        return sentence != NOT_FOUND and sentences.marks[sentence] != ""
 
-cree_pattern = re.compile(r"\b(?:cree|crk)\b", re.IGNORECASE)
-english_pattern = re.compile(r"\b(?:english|eng|en)\b", re.IGNORECASE)
 
+# ################################# Audio ################################## #
 
-def is_english_tier(tier: IntervalTier) -> bool:
-    return bool(english_pattern.search(tier.name))
+# tmills: normalize sound levels (some speakers are very quiet)
+HEADROOM = 0.1  # dB
 
+# Format codes from the "fmt " chunk of a .wav file:
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
 
-def is_cree_tier(tier: IntervalTier) -> bool:
-    return bool(cree_pattern.search(tier.name))
 
+class WaveFile:
+    """
+    A memory-mapped PCM .wav file.
 
-def to_milliseconds(seconds: Decimal) -> int:
+    Master recordings can be hours long, so instead of reading the whole file
+    into memory (as AudioSegment.from_file() does), the operating system pages
+    in only the parts that are actually sliced. Slices work just like slicing
+    an AudioSegment (in milliseconds), but only the slice is ever copied.
     """
-    Converts interval times to an integer in milliseconds.
+
+    def __init__(self, path: Path) -> None:
+        with open(path, "rb") as wav_file:
+            try:
+                self._mmap = mmap.mmap(wav_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise UnsupportedWaveFile(f"Empty file: {path}")
+
+        try:
+            self._parse_headers(path)
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def _parse_headers(self, path: Path) -> None:
+        data = self._mmap
+        if data[0:4] != b"RIFF" or data[8:12] != b"WAVE":
+            raise UnsupportedWaveFile(f"Not a RIFF/WAVE file: {path}")
+
+        fmt = None
+        pos = 12
+        while pos + 8 <= len(data):
+            chunk_id = data[pos : pos + 4]
+            (chunk_size,) = struct.unpack_from("<I", data, pos + 4)
+            if chunk_id == b"fmt ":
+                fmt = data[pos + 8 : pos + 8 + chunk_size]
+            elif chunk_id == b"data":
+                break
+            # Chunks are padded to an even number of bytes.
+            pos += 8 + chunk_size + (chunk_size & 1)
+        else:
+            raise UnsupportedWaveFile(f"Could not find data chunk in {path}")
+
+        if fmt is None or len(fmt) < 16:
+            raise UnsupportedWaveFile(f"Could not find fmt chunk in {path}")
+        audio_format, channels, frame_rate = struct.unpack_from("<HHI", fmt, 0)
+        (bits_per_sample,) = struct.unpack_from("<H", fmt, 14)
+        if audio_format == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+            # The actual format is the first two bytes of the sub-format GUID.
+            (audio_format,) = struct.unpack_from("<H", fmt, 24)
+        if audio_format != WAVE_FORMAT_PCM or bits_per_sample % 8 != 0:
+            raise UnsupportedWaveFile(f"Not PCM audio: {path}")
+
+        self.channels = channels
+        self.frame_rate = frame_rate
+        self.sample_width = bits_per_sample // 8
+        self.frame_width = self.channels * self.sample_width
+
+        # Some programs write a bogus size for the data chunk (especially for
+        # huge files), so never trust it past the end of the file.
+        start = pos + 8
+        size = min(chunk_size, len(data) - start)
+        size -= size % self.frame_width
+        self._data = memoryview(data)[start : start + size]
+
+    def frame_count(self) -> int:
+        return len(self._data) // self.frame_width
+
+    def __len__(self) -> int:
+        """
+        Returns the length of the audio in milliseconds, like AudioSegment.
+        """
+        return round(1000 * (self.frame_count() / self.frame_rate))
+
+    def view(self, start: int, end: int) -> memoryview:
+        """
+        Returns the raw PCM data between start and end (in milliseconds),
+        without copying it. Stops short at the end of the audio.
+        """
+        duration = len(self)
+        first = self._frame_at(min(start, duration)) * self.frame_width
+        last = self._frame_at(min(end, duration)) * self.frame_width
+        return self._data[first:last]
+
+    def __getitem__(self, millisecond: slice) -> AudioSegment:
+        """
+        Copies a slice (in milliseconds) into an AudioSegment.
+        """
+        assert isinstance(millisecond, slice) and millisecond.step is None
+        start = 0 if millisecond.start is None else millisecond.start
+        end = len(self) if millisecond.stop is None else millisecond.stop
+
+        data = bytes(self.view(start, end))
+        if self.sample_width == 1:
+            # 8-bit .wav files are unsigned; AudioSegment wants them signed.
+            data = audioop.bias(data, 1, -128)
+
+        # Pad with silence exactly like AudioSegment does, in case rounding
+        # puts the end of the slice a frame or two past the end of the audio.
+        duration = len(self)
+        expected = (
+            self._frame_at(min(end, duration)) - self._frame_at(min(start, duration))
+        ) * self.frame_width
+        data += b"\0" * (expected - len(data))
+
+        return AudioSegment(
+            data=data,
+            sample_width=self.sample_width,
+            frame_rate=self.frame_rate,
+            channels=self.channels,
+        )
+
+    def _frame_at(self, millisecond: int) -> int:
+        # The same arithmetic as AudioSegment, so slices are identical.
+        return int(millisecond * (self.frame_rate / 1000.0))
+
+    def close(self) -> None:
+        # The view must be released before the memory map can be closed.
+        self._data.release()
+        self._mmap.close()
+
+
+Audio = Union[WaveFile, AudioSegment]
+
+
+@contextmanager
+def open_audio(
+    sound_file: Path, pcm_cache: Optional[PCMCache] = None
+) -> Iterator[Audio]:
     """
-    return int(seconds * 1000)
+    Opens a track's audio. PCM .wav files are memory-mapped; anything else is
+    decoded into memory with pydub.
+
+    If a pcm_cache is given, audio that was decoded before is memory-mapped
+    from the cache instead, and newly decoded audio is added to it.
+    """
+    logger = logging.getLogger(__name__)
+    if sound_file.suffix.lower() == ".wav":
+        try:
+            wave_file = WaveFile(sound_file)
+        except UnsupportedWaveFile as error:
+            logger.debug("Decoding instead: %s", error)
+        else:
+            try:
+                yield wave_file
+            finally:
+                wave_file.close()
+            return
+
+    if pcm_cache is None:
+        yield AudioSegment.from_file(fspath(sound_file))
+        return
+
+    key = pcm_cache.key_for(sound_file)
+    cached_path = pcm_cache.get(key)
+    if cached_path is not None:
+        try:
+            wave_file = WaveFile(cached_path)
+        except (UnsupportedWaveFile, FileNotFoundError) as error:
+            # Evicted in the meantime, or corrupt.
+            logger.warning("Decoding %s again: %s", sound_file, error)
+        else:
+            try:
+                yield wave_file
+            finally:
+                wave_file.close()
+            return
+
+    audio = AudioSegment.from_file(fspath(sound_file))
+    pcm_cache.put(key, audio)
+    yield audio
+
+
+def cut_snippet(sound: Audio, snippet: Snippet) -> AudioSegment:
+    """
+    Snips out the sounds of a snippet from its track.
+    """
+    sound_bite = sound[snippet.start : snippet.end]
+    return normalize_peak(sound_bite, headroom=HEADROOM)
+
+
+cree_pattern = re.compile(r"\b(?:cree|crk)\b", re.IGNORECASE)
+english_pattern = re.compile(r"\b(?:english|eng|en)\b", re.IGNORECASE)
+
+
+def is_english_tier(tier: IntervalIndex) -> bool:
+    return bool(english_pattern.search(tier.name))
+
+
+def is_cree_tier(tier: IntervalIndex) -> bool:
+    return bool(cree_pattern.search(tier.name))
 
 
 def get_mic_id(name: str) -> int:
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Remembers which TextGrids an unfinished import has already imported.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List
+
+import logme  # type: ignore
+
+TrackState = Dict[str, List[int]]
+
+
+@logme.log
+class ImportJournal:
+    """
+    An append-only file with one line of JSON for every TextGrid whose
+    recordings have all been imported. If the import crashes, the next import
+    skips these TextGrids, and picks up where the previous one left off.
+
+    Every line is flushed to disk as soon as it is written, so at worst, the
+    very last line is incomplete; it is ignored, and cut off, so that the next
+    line is not written onto the end of it.
+
+    The journal is cleared once an import finishes.
+    """
+
+    logger: logging.Logger
+
+    def __init__(self, path: Path, load: bool = True) -> None:
+        self.path = path
+        self._done: Dict[str, TrackState] = {}
+
+        if not load or not path.exists():
+            return
+
+        with open(path, "rb+") as journal_file:
+            contents = journal_file.read()
+            complete = contents[: contents.rfind(b"\n") + 1]
+            if len(complete) < len(contents):
+                self.logger.warning("Ignoring incomplete line in %s", path)
+                journal_file.truncate(len(complete))
+
+        for line in complete.decode("UTF-8").splitlines():
+            entry = json.loads(line)
+            self._done[entry["text_grid"]] = entry["state"]
+
+        if self._done:
+            self.logger.info(
+                "Resuming import: %d text grids already done", len(self._done)
+            )
+
+    def is_done(self, text_grid: Path, sound_file: Path) -> bool:
+        """
+        True if the TextGrid was imported before, and neither it nor its audio
+        has changed since.
+        """
+        state = self._done.get(key_for(text_grid))
+        return state is not None and state == track_state(text_grid, sound_file)
+
+    def record(self, text_grid: Path, sound_file: Path) -> None:
+        """
+        Writes down that all of the TextGrid's recordings have been imported.
+        """
+        key, state = key_for(text_grid), track_state(text_grid, sound_file)
+        self._done[key] = state
+        entry = {"text_grid": key, "state": state}
+        with open(self.path, "a", encoding="UTF-8") as journal_file:
+            journal_file.write(json.dumps(entry) + "\n")
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    def clear(self) -> None:
+        """
+        Forgets everything; call this once the import has finished.
+        """
+        self._done.clear()
+        if self.path.exists():
+            self.path.unlink()
+
+
+def key_for(text_grid: Path) -> str:
+    return os.fspath(text_grid.resolve())
+
+
+def track_state(text_grid: Path, sound_file: Path) -> TrackState:
+    """
+    The size and modification time of the track's files. The journal is
+    short-lived, so there's no need to hash the files.
+    """
+    state = {}
+    for kind, path in (("text_grid", text_grid), ("sound_file", sound_file)):
+        stat = path.stat()
+        state[kind] = [stat.st_size, stat.st_mtime_ns]
+    return state
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Remembers what every session looked like the last time it was imported.
+"""
+
+import json
+import logging
+import os
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+import logme  # type: ignore
+
+from librecval.recording_session import SessionID, SessionMetadata
+
+# Bump this whenever the manifest's format changes; older manifests are ignored.
+MANIFEST_VERSION = 1
+
+# How many bytes to hash at a time.
+CHUNK_SIZE = 1024 * 1024
+
+FileState = Dict[str, Any]
+SessionInputs = Dict[str, Any]
+
+
+class MetadataChanges(NamedTuple):
+    """
+    How the metadata differs from when each session was last imported.
+    """
+
+    # Sessions whose row in the metadata changed (e.g., a speaker's code):
+    changed: List[str]
+    # Sessions that are no longer in the metadata (e.g., marked !SKIP):
+    removed: List[str]
+
+    def __str__(self) -> str:
+        return (
+            f"Metadata changed for {len(self.changed)} sessions; "
+            f"{len(self.removed)} sessions are no longer in the metadata"
+        )
+
+
+@logme.log
+class ImportManifest:
+    """
+    A JSON file that records, for every imported session, the metadata that
+    was used, and the size, modification time, and SHA-256 hash of each of its
+    TextGrid and audio files.
+
+    If none of these have changed since the last import, there is no point in
+    importing the session again.
+    """
+
+    logger: logging.Logger
+
+    def __init__(self, path: Path, load: bool = True) -> None:
+        self.path = path
+        self._sessions: Dict[str, SessionInputs] = {}
+
+        if not load or not path.exists():
+            return
+
+        with open(path, encoding="UTF-8") as manifest_file:
+            contents = json.load(manifest_file)
+        if contents.get("version") != MANIFEST_VERSION:
+            self.logger.warning("Ignoring manifest with unknown version: %s", path)
+            return
+        self._sessions = contents["sessions"]
+
+    def inputs_for(
+        self, session: SessionID, metadata: SessionMetadata, files: Iterable[Path]
+    ) -> SessionInputs:
+        """
+        Returns everything that the import of this session depends on.
+        """
+        previous = self._sessions.get(str(session), {}).get("files", {})
+        states = {}
+        for path in sorted(files):
+            key = os.fspath(path.resolve())
+            states[key] = file_state(path, previous.get(key))
+
+        return {"metadata": metadata_state(metadata), "files": states}
+
+    def is_unchanged(self, session: SessionID, inputs: SessionInputs) -> bool:
+        """
+        True if the session was imported before with the exact same inputs.
+        """
+        previous = self._sessions.get(str(session))
+        if previous is None:
+            return False
+        if previous["metadata"] != inputs["metadata"]:
+            return False
+        return contents_of(previous["files"]) == contents_of(inputs["files"])
+
+    def diff_metadata(
+        self, metadata: Dict[SessionID, SessionMetadata]
+    ) -> MetadataChanges:
+        """
+        Compares the metadata of every session that was imported before with
+        the given metadata.
+        """
+        current = {str(session): m for session, m in metadata.items()}
+        changed, removed = [], []
+        for name, previous in sorted(self._sessions.items()):
+            if name not in current:
+                removed.append(name)
+            elif previous["metadata"] != metadata_state(current[name]):
+                changed.append(name)
+        return MetadataChanges(changed, removed)
+
+    def reassigned_speakers(
+        self, session: SessionID, metadata: SessionMetadata
+    ) -> Optional[Dict[str, str]]:
+        """
+        If the only thing that changed in the session's metadata since it was
+        imported is who was speaking on some of the mics, returns each old
+        speaker code and its new code. Otherwise, returns None.
+
+        Every speaker must be on exactly one mic, before and after, so that
+        each recording has exactly one new speaker. A mic that gained or lost
+        its speaker does not count: its recordings have to be extracted, or
+        removed.
+        """
+        previous = self._sessions.get(str(session))
+        if previous is None:
+            return None
+
+        old, new = previous["metadata"], metadata_state(metadata)
+        if old["raw_name"] != new["raw_name"]:
+            return None
+        if old["mics"].keys() != new["mics"].keys():
+            return None
+        pairs = [
+            (old["mics"][mic], new["mics"][mic])
+            for mic in old["mics"]
+            if old["mics"][mic] != new["mics"][mic]
+        ]
+        if not pairs or any(code is None for pair in pairs for code in pair):
+            return None
+        for state in (old, new):
+            speakers = [code for code in state["mics"].values() if code is not None]
+            if len(set(speakers)) != len(speakers):
+                return None
+        return dict(pairs)
+
+    def record_metadata(self, session: SessionID, metadata: SessionMetadata) -> None:
+        """
+        Remember the session's new metadata, as if it had been imported with
+        it; e.g., once its recordings have been given to their new speakers.
+        The session must have been imported before. Call save() to write this
+        to disk.
+        """
+        self._sessions[str(session)]["metadata"] = metadata_state(metadata)
+
+    def record(self, session: SessionID, inputs: SessionInputs) -> None:
+        """
+        Remember the inputs of the session. Call save() to write this to disk.
+        """
+        self._sessions[str(session)] = inputs
+
+    def save(self) -> None:
+        """
+        Writes the manifest to disk.
+        """
+        # Write to a temporary file first, so that a crash never leaves a
+        # half-written manifest behind.
+        temporary_path = self.path.with_name(self.path.name + ".tmp")
+        with open(temporary_path, "w", encoding="UTF-8") as manifest_file:
+            json.dump(
+                {"version": MANIFEST_VERSION, "sessions": self._sessions},
+                manifest_file,
+                indent=2,
+                sort_keys=True,
+            )
+        os.replace(temporary_path, self.path)
+        self.logger.debug("Wrote manifest to %s", self.path)
+
+
+def metadata_state(metadata: SessionMetadata) -> Dict[str, Any]:
+    """
+    Everything in the session's metadata that its recordings depend on: its
+    name, as it is written in the metadata (which may be renamed with an
+    override), and who was speaking on each mic. Sessions that are skipped
+    are not in the metadata at all.
+    """
+    return {
+        "raw_name": metadata.raw_name,
+        "mics": {str(mic): speaker for mic, speaker in metadata.mics.items()},
+    }
+
+
+def file_state(path: Path, previous: Optional[FileState] = None) -> FileState:
+    """
+    Returns the size, modification time, and hash of the file.
+    The hash is reused from the previous state if the file's size and
+    modification time have not changed, since the audio files are HUGE.
+    """
+    stat = path.stat()
+    if (
+        previous is not None
+        and previous["size"] == stat.st_size
+        and previous["mtime_ns"] == stat.st_mtime_ns
+    ):
+        digest = previous["sha256"]
+    else:
+        digest = hash_file(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+
+
+def hash_file(path: Path) -> str:
+    """
+    Returns the SHA-256 hash of the file's contents, as hexadecimal.
+    """
+    digest = sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def contents_of(states: Dict[str, FileState]) -> Dict[str, Any]:
+    """
+    Only the contents matter; a file that was merely touched is unchanged.
+    """
+    return {path: (state["size"], state["sha256"]) for path, state in states.items()}
@@ -21,24 +21,62 @@
 Temporary place for database creation glue code.
 """
 
+import json
 import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Callable
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Deque,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import logme  # type: ignore
 from typing_extensions import Literal
 
-from librecval.extract_phrases import AudioSegment, RecordingExtractor, RecordingInfo
-from librecval.recording_session import parse_metadata
-from librecval.transcode_recording import transcode_to_aac
+from librecval.extract_phrases import (
+    AudioSegment,
+    ExistingRecordings,
+    RecordingExtractor,
+    RecordingInfo,
+    Track,
+    find_session_directory,
+)
+from librecval.import_journal import ImportJournal
+from librecval.import_manifest import ImportManifest
+from librecval.import_report import ImportReport
+from librecval.pcm import Loudness, loudness_of
+from librecval.pcm_cache import PCMCache
+from librecval.quality import QualityAnalyzer
+from librecval.recording_session import SessionID, SessionMetadata, parse_metadata
+from librecval.speech_profile import SpeechProfile
+from librecval.text_grid_cache import TextGridCache
+from librecval.transcode_cache import TranscodeCache, link_or_copy
+from librecval.transcode_recording import (
+    AAC_EXPORT_PARAMETERS,
+    OPUS_EXPORT_PARAMETERS,
+    AACEncoder,
+    PydubEncoder,
+    transcode_to_aac,
+    transcode_to_opus,
+)
 
 ImportRecording = Callable[[RecordingInfo, Path], None]
 
-# TODO: create report with emoji
-#
-# ✅ 2016-04-23AM-OFF - 3 text grids, 230 words
-# ⚠️  2016-05-06AM-KCH - could not link text grids to audio
-# ⚠️  2016-03-06AM-OFF - could not find mettadata
+# Recordings are written with this suffix first (e.g., abc123.partial.m4a), and
+# renamed once they are complete.
+PARTIAL_SUFFIX = ".partial"
 
 
 class RecordingError(Exception):
@@ -47,7 +85,22 @@ class RecordingError(Exception):
     """
 
 
-Format = Literal["wav", "m4a"]
+Format = Literal["wav", "m4a", "webm"]
+
+# Everything that determines how each format is encoded.
+ENCODER_PARAMETERS: Dict[str, Dict[str, Any]] = {
+    "m4a": AAC_EXPORT_PARAMETERS,
+    "webm": OPUS_EXPORT_PARAMETERS,
+    "wav": {"format": "wav"},
+}
+
+# The bitrate ladder: lower bitrates of each format, for people on slow or
+# metered connections. The top of the ladder ("high") is the recording itself.
+BITRATE_LADDER: Dict[str, Dict[str, str]] = {
+    "m4a": {"low": "32k", "medium": "64k"},
+    "webm": {"low": "12k", "medium": "20k"},
+}
+LADDER_TIERS = ("low", "medium")
 
 
 @logme.log
@@ -57,10 +110,73 @@ def initialize(
     metadata_filename: Path,
     import_recording: ImportRecording,
     recording_format: Format = "m4a",
+    jobs: int = 1,
+    encoders: int = 1,
+    queue_size: Optional[int] = None,
+    manifest: Optional[ImportManifest] = None,
+    existing_recordings: Optional[ExistingRecordings] = None,
+    report: Optional[ImportReport] = None,
+    journal: Optional[ImportJournal] = None,
+    checkpoint: Optional[Callable[[], None]] = None,
+    transcode_cache: Optional[TranscodeCache] = None,
+    encoder: Optional[AACEncoder] = None,
+    extra_formats: Sequence[Format] = (),
+    tiers: Sequence[str] = (),
+    profile: Optional[SpeechProfile] = None,
+    analyzer: Optional[QualityAnalyzer] = None,
+    text_grid_cache: Optional[TextGridCache] = None,
+    session_names: Optional[Collection[str]] = None,
+    pcm_cache: Optional[PCMCache] = None,
     logger=None,
-) -> None:
+) -> ImportReport:
     """
     Creates the database from scratch.
+
+    Recordings are extracted using the given number of processes (jobs).
+    Extracted recordings are queued up to be encoded by a pool of encoder
+    threads; at most queue_size recordings wait in the queue at any time, so
+    extraction pauses whenever the encoders fall behind. Encoded recordings
+    are then imported one by one, in the order they were extracted.
+
+    If a manifest is given, sessions that have not changed since the last
+    import are skipped, and the manifest is updated as soon as each session
+    has been imported.
+
+    If a journal is given, every TextGrid is written down as soon as all of
+    its recordings have been imported, so that an import that crashed can
+    resume where it left off. If import_recording() does not save recordings
+    right away, pass a checkpoint() function that does; it is called before
+    writing to the journal or the manifest.
+
+    Recordings that already exist are not extracted again; in fact, a track's
+    audio is not even decoded if all of its recordings exist. By default, a
+    recording exists if it has been written to the destination, but this can
+    be overridden by passing existing_recordings.
+
+    If a transcode_cache is given, audio that was encoded before is reused.
+    .m4a files are encoded with the given encoder (by default, pydub's).
+
+    Recordings can be saved in extra formats too (e.g., Opus in a .webm file),
+    next to the recording in the destination, as can lower tiers of the
+    bitrate ladder (e.g., abc123.low.m4a).
+
+    If a text_grid_cache is given, TextGrids that were parsed before are not
+    parsed again.
+
+    If session_names are given, only the session directories with those names
+    are imported.
+
+    If a pcm_cache is given, masters that had to be decoded before (rather
+    than memory-mapped) are read from the cache instead.
+
+    If a speech profile is given, it is applied to every recording before it
+    is encoded; the report says how much it saved.
+
+    Every recording is assessed by the quality analyzer (by default, with its
+    default thresholds) before the speech profile trims it; its problems are
+    saved along with the recording (see read_measurements()).
+
+    Returns a report of what was imported, and how long each stage took.
     """
 
     dest = Path(transcoded_recordings_path)
@@ -74,15 +190,189 @@ def initialize(
     with open(metadata_filename) as metadata_csv:
         metadata = parse_metadata(metadata_csv)
 
-    # Insert each thing found.
-    ex = RecordingExtractor(metadata)
-    for info, audio in ex.scan(root_directory=directory):
+    if queue_size is None:
+        queue_size = 2 * encoders
+
+    if existing_recordings is None:
+        existing_recordings = partial(recordings_in_directory, dest, recording_format)
+    assert queue_size >= 1, queue_size
+
+    # New names, since mypy doesn't know they're never None in the closures below:
+    import_report = report if report is not None else ImportReport()
+    quality_analyzer = analyzer if analyzer is not None else QualityAnalyzer()
+
+    def encode(info: RecordingInfo, audio: AudioSegment) -> Tuple[Path, List[str]]:
+        # Trimming would make any recording look truncated, so assess it first.
+        with import_report.stage("assess").timing():
+            problems = quality_analyzer.assess(audio).problems
+
+        if profile is not None:
+            with import_report.stage("profile").timing():
+                profiled = profile.apply(audio)
+            import_report.profile.add(
+                len(audio.raw_data), len(profiled.raw_data), len(audio), len(profiled)
+            )
+            audio = profiled
+
+        with import_report.stage("encode").timing():
+            recording_path = save_recording(
+                dest,
+                info,
+                audio,
+                recording_format,
+                cache=transcode_cache,
+                encoder=encoder,
+                extra_formats=extra_formats,
+                tiers=tiers,
+                problems=problems,
+            )
+        return recording_path, problems
+
+    # Recordings waiting to be encoded (or already encoded, but waiting to be
+    # imported), oldest first. Each track is followed by the track itself, to
+    # mark that all of its recordings have been imported.
+    queue: Deque[
+        Union[Track, Tuple[RecordingInfo, "Future[Tuple[Path, List[str]]]"]]
+    ] = deque()
+    unfinished_session: Optional[SessionID] = None
+
+    def finish_track(track: Track) -> None:
+        nonlocal unfinished_session
+        if checkpoint is not None:
+            checkpoint()
+        ex.finish_track(track)
+        # Tracks are imported in order, so a track from the next session
+        # means the previous session is done.
+        if unfinished_session is not None and unfinished_session != track.session:
+            ex.finish_session(unfinished_session)
+        unfinished_session = track.session
+
+    def import_oldest() -> None:
+        item = queue.popleft()
+        if isinstance(item, Track):
+            return finish_track(item)
+
+        info, encoded = item
         try:
-            recording_path = save_recording(dest, info, audio, recording_format)
+            recording_path, problems = encoded.result()
         except RecordingError:
             logger.exception("Exception while saving recording; skipping.")
+            import_report.skip(info.session, "could not save")
         else:
-            import_recording(info, recording_path)
+            with import_report.stage("insert").timing():
+                import_recording(info, recording_path)
+            import_report.session(info.session).add_recording(info.type, problems)
+
+    # Insert each thing found.
+    ex = RecordingExtractor(
+        metadata,
+        manifest=manifest,
+        existing_recordings=existing_recordings,
+        report=import_report,
+        journal=journal,
+        text_grid_cache=text_grid_cache,
+        session_names=session_names,
+        pcm_cache=pcm_cache,
+    )
+    remove_partial_recordings(dest)
+    with ThreadPoolExecutor(max_workers=encoders) as pool:
+        for track, recordings in ex.scan_by_track(directory, jobs=jobs):
+            for info, audio in recordings:
+                queue.append((info, pool.submit(encode, info, audio)))
+                if len(queue) >= queue_size:
+                    import_oldest()
+            queue.append(track)
+
+        while queue:
+            import_oldest()
+
+    if unfinished_session is not None:
+        ex.finish_session(unfinished_session)
+    # Sessions without any tracks have to be saved too.
+    if manifest is not None:
+        manifest.save()
+    # Everything is done, so there's nothing to resume.
+    if journal is not None:
+        journal.clear()
+
+    import_report.finish()
+    logger.info(
+        "Imported %d recordings in %.1fs",
+        import_report.recordings,
+        import_report.elapsed(),
+    )
+    return import_report
+
+
+class SpeakerReassignment(NamedTuple):
+    """
+    Recordings in a session that now belong to another speaker, because the
+    speaker codes in the metadata changed since the session was imported.
+    """
+
+    session: SessionID
+    # Each old speaker code, and its new code:
+    speakers: Dict[str, str]
+    # Each recording's old ID, and its new ID:
+    recordings: Dict[str, str]
+
+
+@logme.log
+def plan_speaker_reassignments(
+    directory: Path,
+    metadata: Dict[SessionID, SessionMetadata],
+    manifest: ImportManifest,
+    text_grid_cache: Optional[TextGridCache] = None,
+    logger=None,
+) -> List[SpeakerReassignment]:
+    """
+    Finds every session whose metadata differs from when it was last imported
+    only in its speaker codes (see ImportManifest.reassigned_speakers()).
+    These sessions need not be extracted again: their recordings can simply
+    be given to their new speakers, and new IDs. Only their TextGrids are
+    read.
+
+    Once the recordings are reassigned, record the new metadata in the
+    manifest, so that the sessions are not imported again.
+    """
+    extractor = RecordingExtractor(metadata, text_grid_cache=text_grid_cache)
+    reassignments = []
+    for session, session_metadata in sorted(metadata.items(), key=lambda m: str(m[0])):
+        speakers = manifest.reassigned_speakers(session, session_metadata)
+        if speakers is None:
+            continue
+        session_dir = find_session_directory(directory, session)
+        if session_dir is None:
+            logger.warn("Cannot reassign speakers: no directory for %s", session)
+            continue
+        recordings = extractor.reassigned_recordings(session_dir, speakers)
+        logger.info("Reassigning %d recordings in %s", len(recordings), session)
+        reassignments.append(SpeakerReassignment(session, speakers, recordings))
+    return reassignments
+
+
+@logme.log
+def remove_partial_recordings(directory: Path, logger=None) -> None:
+    """
+    Removes recordings that were only partially written, e.g., when a previous
+    import crashed while transcoding.
+    """
+    for partial_path in directory.glob("*" + PARTIAL_SUFFIX + ".*"):
+        logger.warn("Removing partially written %s", partial_path)
+        partial_path.unlink()
+
+
+def recordings_in_directory(
+    directory: Path, recording_format: Format, rec_ids: List[str]
+) -> Set[str]:
+    """
+    Returns the recording IDs that have already been written to the directory.
+    """
+    return {
+        rec_id
+        for rec_id in rec_ids
+        if (directory / f"{rec_id}.{recording_format}").exists()
+    }
 
 
 @logme.log
@@ -91,8 +381,30 @@ def save_recording(
     info: RecordingInfo,
     audio: AudioSegment,
     recording_format: Format = "m4a",
+    cache: Optional[TranscodeCache] = None,
+    encoder: Optional[AACEncoder] = None,
+    extra_formats: Sequence[Format] = (),
+    tiers: Sequence[str] = (),
+    problems: Sequence[str] = (),
     logger=None,
 ) -> Path:
+    """
+    Encodes the recording, and saves it in the destination directory.
+
+    The recording is also saved in any extra formats, next to the recording
+    itself (e.g., abc123.webm next to abc123.m4a). So are the given tiers of
+    the bitrate ladder, in every format (e.g., abc123.low.m4a). These are all
+    written first, so if the recording exists, so do they.
+
+    The recording's loudness (see loudness_of()) is measured while the audio
+    is in memory, and saved next to the recording too (e.g., abc123.json),
+    along with any problems the quality analyzer found with it; see
+    read_measurements().
+
+    If a cache is given, audio that was already encoded with the same tags
+    (perhaps before the recording's translation was corrected) is hard linked
+    from the cache, instead of being encoded again.
+    """
     rec_id = info.compute_sha256hash()
     recording_path = dest / f"{rec_id}.{recording_format}"
     if recording_path.exists():
@@ -103,21 +415,129 @@ def save_recording(
         raise RecordingError(f"Recording empty for {info!r}")
 
     # https://www.ffmpeg.org/doxygen/3.2/group__metadata__api.html
-    logger.debug("Writing audio to %s", recording_path)
-    if recording_format == "m4a":
-        transcode_to_aac(
+    tags = dict(
+        title=info.transcription,
+        artist=info.speaker,
+        album=info.session,
+        language="crk",
+        creation_time=f"{info.session.date:%Y-%m-%d}",
+        year=info.session.year,
+    )
+
+    measurements = {"loudness": loudness_of(audio)._asdict(), "problems": problems}
+    with open(measurements_path(recording_path), "w", encoding="UTF-8") as json_file:
+        json.dump(measurements, json_file)
+
+    for audio_format in (*extra_formats, recording_format):
+        # Wave files have no tags, nor a bitrate.
+        format_tags = None if audio_format == "wav" else tags
+        ladder = BITRATE_LADDER.get(audio_format, {})
+
+        variants: List[Tuple[Path, Optional[str]]] = [
+            (dest / f"{rec_id}.{tier}.{audio_format}", ladder[tier])
+            for tier in tiers
+            if tier in ladder
+        ]
+        variants.append((dest / f"{rec_id}.{audio_format}", None))
+
+        for path, bitrate in variants:
+            logger.debug("Writing audio to %s", path)
+            write_audio(
+                path,
+                audio,
+                audio_format,
+                format_tags,
+                cache=cache,
+                encoder=encoder,
+                bitrate=bitrate,
+            )
+    return recording_path
+
+
+class Measurements(NamedTuple):
+    """
+    What was measured while the recording was being saved.
+    """
+
+    loudness: Loudness
+    # See librecval.quality:
+    problems: List[str]
+
+
+def measurements_path(recording_path: Path) -> Path:
+    return recording_path.with_suffix(".json")
+
+
+def read_measurements(recording_path: Path) -> Optional[Measurements]:
+    """
+    Returns the measurements that were saved along with the recording, if any.
+    """
+    try:
+        with open(measurements_path(recording_path), encoding="UTF-8") as json_file:
+            measurements = json.load(json_file)
+    except FileNotFoundError:
+        return None
+    return Measurements(
+        Loudness(**measurements["loudness"]), list(measurements["problems"])
+    )
+
+
+def write_audio(
+    path: Path,
+    audio: AudioSegment,
+    audio_format: Format,
+    tags: Optional[Dict[str, Any]],
+    cache: Optional[TranscodeCache] = None,
+    encoder: Optional[AACEncoder] = None,
+    bitrate: Optional[str] = None,
+) -> None:
+    # Write to a temporary name first, so that a crash never leaves a
+    # half-written recording that looks complete.
+    partial_path = path.with_name(path.stem + PARTIAL_SUFFIX + path.suffix)
+
+    if cache is None:
+        encode(audio, partial_path, audio_format, tags, encoder, bitrate)
+    else:
+        parameters = ENCODER_PARAMETERS[audio_format]
+        if bitrate is not None:
+            parameters = {**parameters, "bitrate": bitrate}
+        # The tags are part of the encoded file, so they're part of the key
+        # too. Then a cache hit is just a hard link: no need to run ffmpeg.
+        if tags is not None:
+            parameters = {**parameters, "tags": {k: str(v) for k, v in tags.items()}}
+        # Only .m4a files have a choice of encoder; pydub does everything else.
+        if audio_format == "m4a" and encoder is not None:
+            encoder_name = encoder.name
+        else:
+            encoder_name = PydubEncoder.name
+        encoded_path = cache.encode(
             audio,
-            recording_path,
-            tags=dict(
-                title=info.transcription,
-                artist=info.speaker,
-                album=info.session,
-                language="crk",
-                creation_time=f"{info.session.date:%Y-%m-%d}",
-                year=info.session.year,
+            audio_format,
+            parameters,
+            partial(
+                encode,
+                recording_format=audio_format,
+                tags=tags,
+                encoder=encoder,
+                bitrate=bitrate,
             ),
+            encoder_name,
         )
+        link_or_copy(encoded_path, partial_path)
+    os.replace(partial_path, path)
+
+
+def encode(
+    audio: AudioSegment,
+    destination: Path,
+    recording_format: Format,
+    tags: Optional[Dict[str, Any]] = None,
+    encoder: Optional[AACEncoder] = None,
+    bitrate: Optional[str] = None,
+) -> None:
+    if recording_format == "m4a":
+        transcode_to_aac(audio, destination, encoder, tags=tags, bitrate=bitrate)
+    elif recording_format == "webm":
+        transcode_to_opus(audio, destination, bitrate, tags=tags)
     else:
-        audio.export(os.fspath(recording_path), format="wav")
-    assert recording_path.exists()
-    return recording_path
+        audio.export(os.fspath(destination), format="wav").close()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Reports what happened during an import, and where the time went.
+
+The summary looks something like this:
+
+    ✅ 2016-04-23-AM-OFF-_ - 3 text grids, 230 words, 12 sentences
+    ⚠️  2016-05-06-AM-KCH-_ - 0 text grids, 0 words, 0 sentences; no audio (2)
+    ⚠️  2016-03-06-AM-OFF-_ - 0 text grids, 0 words, 0 sentences; no metadata (1)
+"""
+
+import json
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from librecval.quality import is_unusable
+
+# The stages of an import, in the order that they happen:
+STAGES = (
+    "parse",
+    "decode",
+    "slice",
+    "normalize",
+    "assess",
+    "profile",
+    "encode",
+    "insert",
+)
+
+# Things that are skipped because they were already done; nothing is wrong:
+ALREADY_DONE = frozenset(["unchanged", "resumed", "already imported"])
+
+
+class Stage:
+    """
+    Counts how many items went through one stage of the import, and how much
+    time was spent doing so. Safe to use from several threads.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.count = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timing(self, count: int = 1) -> Iterator[None]:
+        """
+        Times the body of the with-statement. It counts as the given number
+        of items, unless it raises an exception.
+        """
+        start = perf_counter()
+        yield
+        elapsed = perf_counter() - start
+        with self._lock:
+            self.count += count
+            self.seconds += elapsed
+
+    def merge(self, other: "Stage") -> None:
+        with self._lock:
+            self.count += other.count
+            self.seconds += other.seconds
+
+    def rate(self) -> float:
+        return self.count / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "seconds": self.seconds, "rate": self.rate()}
+
+    def __getstate__(self):
+        # Locks cannot be sent to worker processes.
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.count} in {self.seconds:.1f}s ({self.rate():.1f}/s)"
+
+
+class ProfileReport:
+    """
+    How much the speech profile shrank the audio: its raw PCM size, and its
+    duration (which encoded files are roughly proportional to). Safe to use
+    from several threads.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.milliseconds_before = 0
+        self.milliseconds_after = 0
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        bytes_before: int,
+        bytes_after: int,
+        milliseconds_before: int,
+        milliseconds_after: int,
+    ) -> None:
+        with self._lock:
+            self.count += 1
+            self.bytes_before += bytes_before
+            self.bytes_after += bytes_after
+            self.milliseconds_before += milliseconds_before
+            self.milliseconds_after += milliseconds_after
+
+    def merge(self, other: "ProfileReport") -> None:
+        with self._lock:
+            self.count += other.count
+            self.bytes_before += other.bytes_before
+            self.bytes_after += other.bytes_after
+            self.milliseconds_before += other.milliseconds_before
+            self.milliseconds_after += other.milliseconds_after
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "bytes_saved": self.bytes_saved,
+            "seconds_before": self.milliseconds_before / 1000,
+            "seconds_after": self.milliseconds_after / 1000,
+        }
+
+    def __getstate__(self):
+        # Locks cannot be sent to worker processes.
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __str__(self) -> str:
+        seconds_saved = (self.milliseconds_before - self.milliseconds_after) / 1000
+        return (
+            f"speech profile: saved {self.bytes_saved / 1e6:.1f} MB of PCM "
+            f"({percent_saved(self.bytes_before, self.bytes_after):.0f}%), "
+            f"{seconds_saved:.1f}s of audio "
+            f"({percent_saved(self.milliseconds_before, self.milliseconds_after):.0f}%)"
+        )
+
+
+def percent_saved(before: int, after: int) -> float:
+    return 100 * (1 - after / before) if before else 0.0
+
+
+class SessionReport:
+    """
+    What was extracted from one session, and what was skipped (and why).
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.text_grids = 0
+        self.words = 0
+        self.sentences = 0
+        # Recordings that were imported, but found to be unusable:
+        self.unusable = 0
+        self.skipped: Counter = Counter()
+
+    def add_recording(self, type_: str, problems: Sequence[str] = ()) -> None:
+        if type_ == "word":
+            self.words += 1
+        else:
+            assert type_ == "sentence", type_
+            self.sentences += 1
+        if is_unusable(problems):
+            self.unusable += 1
+
+    def merge(self, other: "SessionReport") -> None:
+        self.text_grids += other.text_grids
+        self.words += other.words
+        self.sentences += other.sentences
+        self.unusable += other.unusable
+        self.skipped.update(other.skipped)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "text_grids": self.text_grids,
+            "words": self.words,
+            "sentences": self.sentences,
+            "unusable": self.unusable,
+            "skipped": dict(self.skipped),
+        }
+
+    @property
+    def has_problems(self) -> bool:
+        """
+        Whether anything was skipped for a reason that someone should look
+        into (e.g., missing audio or metadata).
+        """
+        return any(reason not in ALREADY_DONE for reason in self.skipped)
+
+    def __str__(self) -> str:
+        # The warning sign is narrow in most terminals, so pad it:
+        status = "⚠️ " if self.has_problems else "✅"
+        line = (
+            f"{status} {self.name} - {self.text_grids} text grids, "
+            f"{self.words} words, {self.sentences} sentences"
+        )
+        if self.unusable:
+            line += f" ({self.unusable} unusable)"
+        if self.skipped:
+            reasons = ", ".join(
+                f"{reason} ({count})" for reason, count in sorted(self.skipped.items())
+            )
+            line += f"; {reasons}"
+        return line
+
+
+class ImportReport:
+    """
+    Everything that happened during one import run.
+    """
+
+    def __init__(self) -> None:
+        self.stages = {name: Stage(name) for name in STAGES}
+        self.sessions: Dict[str, SessionReport] = {}
+        self.profile = ProfileReport()
+        self._start = perf_counter()
+        self.seconds: Optional[float] = None
+
+    def stage(self, name: str) -> Stage:
+        return self.stages[name]
+
+    def session(self, session: Any) -> SessionReport:
+        """
+        Returns the report for the session (a SessionID, or its name).
+        """
+        name = str(session)
+        if name not in self.sessions:
+            self.sessions[name] = SessionReport(name)
+        return self.sessions[name]
+
+    def skip(self, session: Any, reason: str, count: int = 1) -> None:
+        """
+        Notes that something in the session was skipped, and why.
+        """
+        if count > 0:
+            self.session(session).skipped[reason] += count
+
+    def merge(self, other: "ImportReport") -> None:
+        """
+        Adds the results of another report, e.g., from a worker process.
+        """
+        for name, stage in other.stages.items():
+            self.stages[name].merge(stage)
+        for name, session in other.sessions.items():
+            self.session(name).merge(session)
+        self.profile.merge(other.profile)
+
+    @property
+    def recordings(self) -> int:
+        return sum(s.words + s.sentences for s in self.sessions.values())
+
+    def finish(self) -> None:
+        self.seconds = perf_counter() - self._start
+
+    def elapsed(self) -> float:
+        if self.seconds is None:
+            return perf_counter() - self._start
+        return self.seconds
+
+    def rate(self) -> float:
+        elapsed = self.elapsed()
+        return self.recordings / elapsed if elapsed else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "seconds": self.elapsed(),
+            "recordings": self.recordings,
+            "recordings_per_second": self.rate(),
+            "stages": {name: stage.as_dict() for name, stage in self.stages.items()},
+            "speech_profile": self.profile.as_dict(),
+            "sessions": {
+                name: session.as_dict()
+                for name, session in sorted(self.sessions.items())
+            },
+        }
+
+    def save(self, path: Path) -> None:
+        """
+        Writes the report as JSON.
+        """
+        with open(path, "w", encoding="UTF-8") as report_file:
+            json.dump(self.as_dict(), report_file, indent=2, ensure_ascii=False)
+
+    def summary(self) -> str:
+        """
+        Returns a human-readable summary.
+        """
+        lines = [str(session) for _name, session in sorted(self.sessions.items())]
+        lines.append(
+            f"{self.recordings} recordings in {self.elapsed():.1f}s "
+            f"({self.rate():.1f}/s)"
+        )
+        lines.extend(str(stage) for stage in self.stages.values())
+        if self.profile.count:
+            lines.append(str(self.profile))
+        return "\n".join(lines)
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Vectorized operations on raw PCM samples.
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from pydub import AudioSegment  # type: ignore
+from pydub.utils import db_to_float, ratio_to_db  # type: ignore
+
+# AudioSegment stores samples as signed, little-endian integers.
+# (24-bit audio is always converted to 32-bit when it is loaded).
+DTYPES: Dict[int, np.dtype] = {
+    1: np.dtype("<i1"),
+    2: np.dtype("<i2"),
+    4: np.dtype("<i4"),
+}
+
+
+def samples_of(audio: AudioSegment) -> np.ndarray:
+    """
+    Returns the (interleaved) samples of the audio, without copying them.
+    """
+    return np.frombuffer(audio.raw_data, dtype=DTYPES[audio.sample_width])
+
+
+def peak_of(samples: np.ndarray) -> int:
+    """
+    Returns the largest absolute sample value, like audioop.max().
+    """
+    if len(samples) == 0:
+        return 0
+    # np.abs() would overflow on the most negative value, so avoid it:
+    return max(int(samples.max()), -int(samples.min()))
+
+
+def gain_for_peak(peak: int, sample_width: int, headroom: float) -> float:
+    """
+    Returns the factor that AudioSegment.normalize() multiplies samples by.
+
+    This follows pydub's computation step by step, since even the slightest
+    difference in rounding would produce different samples.
+    """
+    if peak == 0:
+        # pydub leaves silence alone.
+        return 1.0
+    max_possible_amplitude = (2 ** (sample_width * 8)) / 2
+    target_peak = max_possible_amplitude * db_to_float(-headroom)
+    needed_boost = ratio_to_db(target_peak / peak)
+    return db_to_float(float(needed_boost))
+
+
+def normalize_peaks(
+    segments: Sequence[AudioSegment], headroom: float = 0.1
+) -> List[AudioSegment]:
+    """
+    Normalizes each segment so that its peak is headroom dB below the maximum
+    amplitude. The result is identical to calling .normalize(headroom) on each
+    segment, but all segments are scaled in one vectorized pass.
+
+    All segments must have the same sample width.
+    """
+    if not segments:
+        return []
+
+    sample_width = segments[0].sample_width
+    assert all(s.sample_width == sample_width for s in segments)
+    dtype = DTYPES[sample_width]
+
+    # Scale every segment into one big buffer, so that clamping and rounding
+    # happen in a single pass over all the samples.
+    arrays = [samples_of(segment) for segment in segments]
+    scaled = np.empty(sum(len(samples) for samples in arrays), dtype=np.float64)
+    boundaries = []
+    start = 0
+    for samples in arrays:
+        end = start + len(samples)
+        gain = gain_for_peak(peak_of(samples), sample_width, headroom)
+        np.multiply(samples, gain, out=scaled[start:end])
+        boundaries.append((start, end))
+        start = end
+
+    # This mimics audioop.mul(): clamp to the representable range, then round
+    # towards negative infinity.
+    info = np.iinfo(dtype)
+    np.clip(scaled, info.min, info.max, out=scaled)
+    np.floor(scaled, out=scaled)
+    normalized = scaled.astype(dtype)
+
+    return [
+        segment._spawn(normalized[start:end].tobytes())
+        for segment, (start, end) in zip(segments, boundaries)
+    ]
+
+
+def normalize_peak(segment: AudioSegment, headroom: float = 0.1) -> AudioSegment:
+    """
+    Same as segment.normalize(headroom), but vectorized.
+    """
+    (normalized,) = normalize_peaks([segment], headroom)
+    return normalized
+
+
+def channel_of(audio: AudioSegment, channel: int) -> AudioSegment:
+    """
+    Returns one channel (counting from 0) of the audio, as mono audio.
+    """
+    assert 0 <= channel < audio.channels, channel
+    if audio.channels == 1:
+        return audio
+    # Work on bytes rather than samples, so that any sample width will do:
+    frames = np.frombuffer(audio.raw_data, dtype=np.uint8).reshape(
+        -1, audio.channels, audio.sample_width
+    )
+    return audio._spawn(
+        frames[:, channel].tobytes(),
+        overrides={"channels": 1, "frame_width": audio.sample_width},
+    )
+
+
+def chunk_rms(
+    audio: AudioSegment, frames_per_chunk: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Splits the audio into chunks of the given number of frames (the last one
+    may be shorter), and returns the first frame of each chunk, and its RMS.
+    """
+    samples = samples_of(audio).reshape(-1, audio.channels)
+    n_frames = len(samples)
+    starts = np.arange(0, n_frames, frames_per_chunk)
+    if n_frames == 0:
+        return starts, np.zeros(0)
+    # Every channel of every frame in the chunk counts:
+    squares = np.square(samples, dtype=np.float64).sum(axis=1)
+    sums = np.add.reduceat(squares, starts)
+    counts = np.diff(np.append(starts, n_frames)) * audio.channels
+    return starts, np.sqrt(sums / counts)
+
+
+def sound_bounds(
+    audio: AudioSegment, threshold: float = -50.0, chunk_length: int = 10
+) -> Optional[Tuple[int, int]]:
+    """
+    Returns where (in milliseconds) the first sound starts, and where the last
+    sound ends, or None if the audio is silent. Sound is any chunk (of
+    chunk_length milliseconds) whose RMS is above the threshold (in dBFS).
+
+    This is like pydub.silence.detect_leading_silence(), but only looks at
+    every sample once, and finds both ends at the same time.
+    """
+    n_frames = len(audio.raw_data) // audio.frame_width
+    if n_frames == 0:
+        return None
+
+    frames_per_chunk = max(1, audio.frame_rate * chunk_length // 1000)
+    starts, rms = chunk_rms(audio, frames_per_chunk)
+
+    # Same as pydub's dBFS:
+    max_possible_amplitude = (2 ** (audio.sample_width * 8)) / 2
+    (loud,) = np.nonzero(rms > max_possible_amplitude * db_to_float(threshold))
+    if len(loud) == 0:
+        return None
+
+    first_frame = starts[loud[0]]
+    last_frame = min(starts[loud[-1]] + frames_per_chunk, n_frames)
+    return (
+        int(first_frame * 1000 // audio.frame_rate),
+        int(-(-last_frame * 1000 // audio.frame_rate)),
+    )
+
+
+class Loudness(NamedTuple):
+    """
+    How long a recording is, and how loud. Levels are in dBFS, like
+    AudioSegment.max_dBFS and AudioSegment.dBFS; both are None for silence.
+
+    The waveform is the peak of each of a fixed number of equal slices of the
+    recording, as a percentage of full scale: enough to draw it, without
+    having to download (let alone decode) the audio.
+    """
+
+    duration: int  # in milliseconds
+    peak: Optional[float]
+    rms: Optional[float]
+    waveform: List[int]
+
+
+# How many slices a recording's waveform is made of.
+WAVEFORM_BINS = 64
+
+
+def loudness_of(audio: AudioSegment, bins: int = WAVEFORM_BINS) -> Loudness:
+    """
+    Measures the audio, looking at every sample once.
+    """
+    samples = samples_of(audio)
+    max_possible_amplitude = (2 ** (audio.sample_width * 8)) / 2
+    if len(samples) == 0:
+        return Loudness(len(audio), None, None, [0] * bins)
+
+    peak = peak_of(samples)
+    # Truncated, exactly like audioop.rms():
+    rms = int(np.sqrt(np.mean(np.square(samples, dtype=np.float64))))
+
+    # Slices are whole frames, so that every channel counts:
+    frames = samples.reshape(-1, audio.channels)
+    starts = np.linspace(0, len(frames), bins, endpoint=False).astype(np.int64)
+    # Widen first, so that the most negative sample has a magnitude:
+    magnitudes = np.abs(frames.astype(np.int64)).max(axis=1)
+    if len(frames) < bins:
+        # Some slices are empty; they take on the next slice's peak.
+        starts = np.minimum(starts, len(frames) - 1)
+    peaks = np.maximum.reduceat(magnitudes, starts)
+    waveform = np.minimum(100, np.round(100 * peaks / max_possible_amplitude))
+
+    return Loudness(
+        duration=len(audio),
+        peak=ratio_to_db(peak, max_possible_amplitude) if peak else None,
+        rms=ratio_to_db(rms, max_possible_amplitude) if rms else None,
+        waveform=[int(level) for level in waveform],
+    )
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Remembers the decoded audio of masters that can't be memory-mapped as they
+are, so that imports run again (e.g., while tuning extraction) never decode
+the same master twice.
+"""
+
+import logging
+import os
+from hashlib import sha256
+from pathlib import Path
+from tempfile import mkstemp
+from typing import Optional
+
+import logme  # type: ignore
+from pydub import AudioSegment  # type: ignore
+
+# Change this whenever decoding changes what is cached, so that nothing decoded
+# the old way is used.
+CACHE_VERSION = 1
+
+# How much of the source file to hash at a time.
+HASH_BLOCK_SIZE = 1 << 20
+
+
+@logme.log
+class PCMCache:
+    """
+    A directory of decoded audio, as PCM .wav files (which WaveFile can
+    memory-map), named by the SHA-256 hash of the file they were decoded
+    from. Since the key only depends on the contents of the file, masters
+    that are moved or renamed are not decoded again.
+
+    Decoded audio is big, so the cache is kept under max_size bytes by
+    evicting the audio that was least recently used.
+
+    It is always safe to delete the cache.
+    """
+
+    logger: logging.Logger
+
+    def __init__(self, directory: Path, max_size: int) -> None:
+        self.directory = directory
+        self.max_size = max_size
+
+    def key_for(self, sound_file: Path) -> str:
+        digest = sha256(f"v{CACHE_VERSION}\n".encode("UTF-8"))
+        with open(sound_file, "rb") as source:
+            for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        # Spread the files across subdirectories, so that no single
+        # directory gets too big.
+        return self.directory / key[:2] / f"{key}.wav"
+
+    def get(self, key: str) -> Optional[Path]:
+        """
+        Returns the path to the audio that was cached with the key, if any.
+        """
+        cached_path = self.path_for(key)
+        try:
+            # Access times are unreliable (many filesystems are mounted with
+            # noatime), so the modification time says when it was last used.
+            os.utime(cached_path)
+        except FileNotFoundError:
+            return None
+        self.logger.debug("Cache hit: %s", cached_path)
+        return cached_path
+
+    def put(self, key: str, audio: AudioSegment) -> Path:
+        cached_path = self.path_for(key)
+        cached_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a unique name, then move it into place, so that
+        # concurrent imports never see a half-written file.
+        handle, temporary_name = mkstemp(
+            suffix=".wav", prefix=".", dir=cached_path.parent
+        )
+        try:
+            with open(handle, "wb") as cached_file:
+                audio.export(cached_file, format="wav")
+            os.replace(temporary_name, cached_path)
+        except BaseException:
+            os.unlink(temporary_name)
+            raise
+        self.evict()
+        return cached_path
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used audio until the cache fits in
+        max_size bytes.
+        """
+        entries = []
+        for cached_path in self.directory.glob("??/*.wav"):
+            try:
+                stat = cached_path.stat()
+            except FileNotFoundError:
+                # Another import evicted it.
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, cached_path))
+
+        total = sum(size for _mtime, size, _path in entries)
+        for _mtime, size, cached_path in sorted(entries):
+            if total <= self.max_size:
+                break
+            self.logger.debug("Evicting %s", cached_path)
+            try:
+                cached_path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
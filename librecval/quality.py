@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Finds recordings that are obviously unusable, so that nobody has to listen
+to them to find out.
+"""
+
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from pydub import AudioSegment  # type: ignore
+from pydub.utils import db_to_float, ratio_to_db  # type: ignore
+
+from librecval.pcm import chunk_rms, samples_of
+
+# The problems a recording can have:
+CLIPPED = "clipped"
+NOISY = "noisy"
+SILENT = "silent"
+TRUNCATED = "truncated"
+
+# Plenty of good recordings start or end loud (the fixtures' do, for one), so
+# being truncated is only worth pointing out to whoever reviews the recording;
+# the other problems make a recording unusable.
+UNUSABLE_PROBLEMS = frozenset([CLIPPED, NOISY, SILENT])
+
+
+def is_unusable(problems: Sequence[str]) -> bool:
+    """
+    Whether a recording with these problems should be marked unusable.
+    """
+    return any(problem in UNUSABLE_PROBLEMS for problem in problems)
+
+
+class Assessment(NamedTuple):
+    """
+    What's wrong with a recording (if anything), and the measurements that
+    gave it away.
+    """
+
+    problems: List[str]
+    # The fraction of samples that are stuck at the recording's extremes:
+    clipped: float
+    # How much louder (in dB) the speech is than the background noise; None if
+    # the recording is silent, and infinite if the background is silent:
+    snr: Optional[float]
+
+    @property
+    def is_unusable(self) -> bool:
+        return is_unusable(self.problems)
+
+
+class QualityAnalyzer(NamedTuple):
+    """
+    How to find obviously unusable recordings:
+
+     - clipped: the waveform is flattened against its peak, for long enough
+       that it can't just be the crest of a wave;
+     - noisy: the speech barely stands out from the background noise;
+     - silent: there's (almost) nothing there at all;
+     - truncated: the recording starts or ends in the middle of speech, as
+       if a TextGrid interval was drawn too tight (which, on its own, does
+       not make it unusable).
+
+    Every measurement is relative to the recording itself, so it works just
+    as well on normalized audio; a recording that's nothing but (normalized)
+    background noise is noisy, rather than silent.
+    """
+
+    # Anything quieter than this (in dBFS) is silence.
+    silence_threshold: float = -50.0
+    # Speech that's less than this much louder (in dB) than the noise is noisy.
+    min_snr: float = 6.0
+    # How much of the recording may be clipped.
+    max_clipped: float = 0.001
+    # A recording is truncated if its first or last chunk is within this many
+    # dB of its loudest chunk.
+    truncation_margin: float = 6.0
+    # How finely the recording is chopped up to measure its levels (ms).
+    chunk_length: int = 10
+
+    def assess(self, audio: AudioSegment) -> Assessment:
+        """
+        Finds the recording's problems, looking at every sample only a couple
+        of times.
+        """
+        samples = samples_of(audio)
+        max_possible_amplitude = (2 ** (audio.sample_width * 8)) / 2
+        if len(samples) == 0:
+            return Assessment([SILENT], 0.0, None)
+        rms = np.sqrt(np.mean(np.square(samples, dtype=np.float64)))
+        level = ratio_to_db(rms, max_possible_amplitude) if rms else float("-inf")
+        if level < self.silence_threshold:
+            return Assessment([SILENT], 0.0, None)
+
+        problems = []
+        clipped = clipped_fraction(samples)
+        if clipped > self.max_clipped:
+            problems.append(CLIPPED)
+
+        frames_per_chunk = max(1, audio.frame_rate * self.chunk_length // 1000)
+        _starts, levels = chunk_rms(audio, frames_per_chunk)
+        # The quiet parts are (mostly) the background; the loud parts speech:
+        noise, speech = np.percentile(levels, [10, 95])
+        snr = float(ratio_to_db(speech, noise)) if noise > 0 else float("inf")
+        if snr < self.min_snr:
+            problems.append(NOISY)
+        else:
+            # Only speech can be cut off; noise is loud everywhere.
+            loud = levels.max() * db_to_float(-self.truncation_margin)
+            if len(levels) > 2 and (levels[0] >= loud or levels[-1] >= loud):
+                problems.append(TRUNCATED)
+
+        return Assessment(problems, clipped, snr)
+
+
+# How many consecutive samples stuck at an extreme count as clipping. Even the
+# broadest crest of a low voice only has a sample or two at its very peak.
+CLIPPED_RUN = 3
+
+
+def clipped_fraction(samples: np.ndarray) -> float:
+    """
+    Returns the fraction of samples in runs that are stuck at the highest or
+    the lowest sample value. Both extremes are checked separately, since
+    clipping often happens on only one side of the waveform.
+
+    Stuck samples are exactly equal, even once normalized (which scales equal
+    samples equally). Lossy codecs ripple the flat tops, so only heavy
+    clipping (which the decoder clips all over again) is found in them.
+    """
+    highest, lowest = samples.max(), samples.min()
+    stuck = np.zeros(len(samples) + 2, dtype=np.int8)
+    if highest > 0:
+        stuck[1:-1] |= samples == highest
+    if lowest < 0:
+        stuck[1:-1] |= samples == lowest
+
+    # Find where each run of stuck samples starts and ends:
+    edges = np.diff(stuck)
+    (run_starts,) = np.nonzero(edges == 1)
+    (run_ends,) = np.nonzero(edges == -1)
+    lengths = run_ends - run_starts
+    return float(lengths[lengths >= CLIPPED_RUN].sum() / len(samples))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Lists a session's directory once, so that finding the audio for each of its
+TextGrids does not have to touch the filesystem again.
+"""
+
+import logging
+import os
+from pathlib import Path
+from typing import FrozenSet, List, Optional, Tuple
+
+import logme  # type: ignore
+
+
+@logme.log
+class SessionDirectory:
+    """
+    The files in a session directory, read with a single os.scandir() call.
+
+    Finding a TextGrid's audio used to glob and stat several files for every
+    TextGrid. That adds up quickly when the sessions are on a network file
+    system; instead, everything is looked up in memory. Audio recorded with
+    Adobe Audition is in a subdirectory, which is also listed (once) if the
+    session needs it.
+    """
+
+    logger: logging.Logger
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        files, directories = list_directory(path)
+        self.files: FrozenSet[str] = frozenset(files)
+        self.directories: FrozenSet[str] = frozenset(directories)
+        # The files in Audition's subdirectory, once it is listed:
+        self._recorded: Optional[FrozenSet[str]] = None
+
+    @property
+    def text_grids(self) -> List[Path]:
+        return self._paths_with_suffix(".TextGrid")
+
+    @property
+    def wave_files(self) -> List[Path]:
+        return self._paths_with_suffix(".wav")
+
+    def audio_for(self, annotation_path: Path) -> Optional[Path]:
+        """
+        Finds the audio that goes with the TextGrid, with a couple different
+        strategies.
+        """
+        return self.audacity_audio_for(annotation_path) or self.audition_audio_for(
+            annotation_path
+        )
+
+    def audacity_audio_for(self, annotation_path: Path) -> Optional[Path]:
+        """
+        Audacity saves the audio right next to the TextGrid.
+        """
+        name = f"{annotation_path.stem}.wav"
+        self.logger.debug("[Audacity Format] Trying %s...", name)
+        return self.path / name if name in self.files else None
+
+    def audition_audio_for(self, annotation_path: Path) -> Optional[Path]:
+        """
+        Adobe Audition saves the audio in a subdirectory named after the one
+        (and only) *.sesx file.
+        """
+        recorded_dir = self.audition_recorded_dir
+        if recorded_dir is None:
+            return None
+
+        if self._recorded is None:
+            files, _directories = list_directory(self.path / recorded_dir)
+            self._recorded = frozenset(files)
+
+        name = f"{annotation_path.stem}.wav"
+        self.logger.debug("[Audition Format] Trying %s/%s...", recorded_dir, name)
+        return self.path / recorded_dir / name if name in self._recorded else None
+
+    @property
+    def audition_recorded_dir(self) -> Optional[str]:
+        # If it's in Audition format, there will be exactly ONE file with the
+        # *.sesx extension.
+        try:
+            (audition_file,) = self._paths_with_suffix(".sesx")
+        except ValueError:
+            self.logger.debug("Could not find exactly one *.sesx file in %s", self.path)
+            return None
+
+        recorded_dir = f"{audition_file.stem}_Recorded"
+        return recorded_dir if recorded_dir in self.directories else None
+
+    def _paths_with_suffix(self, suffix: str) -> List[Path]:
+        names = sorted(name for name in self.files if name.endswith(suffix))
+        return [self.path / name for name in names]
+
+
+def list_directory(path: Path) -> Tuple[List[str], List[str]]:
+    """
+    Returns the names of the files, and of the subdirectories, in the
+    directory. Symbolic links count as whatever they point to.
+    """
+    files: List[str] = []
+    directories: List[str] = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    directories.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
+    except FileNotFoundError:
+        pass
+    return files, directories
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Prepares snippets of speech for encoding, so that they take fewer bytes to
+store, and to download.
+"""
+
+from typing import NamedTuple
+
+from pydub import AudioSegment  # type: ignore
+
+from librecval.pcm import sound_bounds
+
+
+class SpeechProfile(NamedTuple):
+    """
+    How to prepare a snippet of speech for encoding:
+
+     - trim the silence before and after the speech, keeping some padding;
+     - resample it to a rate that's plenty for speech.
+
+    TextGrid intervals are drawn generously, so most snippets start and end
+    with silence. Encoded files are roughly proportional to their duration,
+    so trimming saves the most.
+
+    The snippet should already be mono (one mic's channel); anything else is
+    left as it is, for the encoders to reject.
+    """
+
+    # Anything quieter than this (in dBFS) is silence.
+    silence_threshold: float = -50.0
+    # How much silence to keep before and after the speech (ms), so that
+    # quiet consonants at the edges are not cut off.
+    padding: int = 150
+    # Enough to keep sibilants (e.g., s, c), which 16 kHz would muffle.
+    frame_rate: int = 22050
+
+    def apply(self, audio: AudioSegment) -> AudioSegment:
+        bounds = sound_bounds(audio, self.silence_threshold)
+        # Leave silent snippets alone, rather than trimming them away entirely.
+        if bounds is not None:
+            start, end = bounds
+            start = max(0, start - self.padding)
+            end = min(len(audio), end + self.padding)
+            audio = audio[start:end]
+
+        if audio.frame_rate > self.frame_rate:
+            audio = audio.set_frame_rate(self.frame_rate)
+        return audio
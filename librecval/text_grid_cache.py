@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Remembers the tiers of TextGrids that were parsed before, so that they are
+never parsed twice.
+"""
+
+import json
+import logging
+import os
+from hashlib import sha256
+from pathlib import Path
+from tempfile import mkstemp
+from typing import List, Optional
+
+import logme  # type: ignore
+
+from librecval.alignment import IntervalIndex
+
+# Change this whenever parsing changes what is cached, so that nothing parsed
+# the old way is used.
+CACHE_VERSION = 1
+
+
+@logme.log
+class TextGridCache:
+    """
+    A directory of parsed tiers, in JSON, named by the SHA-256 hash of the
+    TextGrid file. Since the key only depends on the contents of the file,
+    sessions that are imported again (even renamed or moved) are not parsed
+    again.
+
+    It is always safe to delete the cache.
+    """
+
+    logger: logging.Logger
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def key_for(self, contents: bytes) -> str:
+        digest = sha256(f"v{CACHE_VERSION}\n".encode("UTF-8"))
+        digest.update(contents)
+        return digest.hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        # Spread the files across subdirectories, so that no single
+        # directory gets too big.
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[List[IntervalIndex]]:
+        """
+        Returns the tiers that were cached with the key, if any.
+        """
+        try:
+            with open(self.path_for(key), encoding="UTF-8") as cached_file:
+                tiers = json.load(cached_file)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            self.logger.warn("Ignoring corrupt cache entry %s", key)
+            return None
+        return [
+            IntervalIndex(tier["starts"], tier["ends"], tier["marks"], tier["name"])
+            for tier in tiers
+        ]
+
+    def put(self, key: str, tiers: List[IntervalIndex]) -> None:
+        cached_path = self.path_for(key)
+        cached_path.parent.mkdir(parents=True, exist_ok=True)
+        tiers_as_json = [
+            {
+                "name": tier.name,
+                "starts": tier.starts.tolist(),
+                "ends": tier.ends.tolist(),
+                "marks": tier.marks,
+            }
+            for tier in tiers
+        ]
+        # Write to a unique name, then move it into place, so that
+        # concurrent imports never see a half-written file.
+        handle, temporary_name = mkstemp(
+            suffix=".json", prefix=".", dir=cached_path.parent
+        )
+        try:
+            with open(handle, "w", encoding="UTF-8") as cached_file:
+                json.dump(tiers_as_json, cached_file, ensure_ascii=False)
+            os.replace(temporary_name, cached_path)
+        except BaseException:
+            os.unlink(temporary_name)
+            raise
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Remembers the result of encoding audio, so that the same audio is never
+encoded twice.
+"""
+
+import json
+import logging
+import os
+import shutil
+from hashlib import sha256
+from pathlib import Path
+from tempfile import mkstemp
+from typing import Any, Callable, Dict
+
+import logme  # type: ignore
+from pydub import AudioSegment  # type: ignore
+
+Encoder = Callable[[AudioSegment, Path], None]
+
+
+@logme.log
+class TranscodeCache:
+    """
+    A directory of encoded audio, named by the SHA-256 hash of the raw PCM
+    samples, the settings used to encode them (tags included), and the
+    encoder. Since the key does not depend on the rest of the recording's
+    metadata, correcting a translation does not require encoding anything
+    again. Identical audio is stored only once: recordings are hard links to
+    the cached file, which is linked as-is, without running ffmpeg at all.
+
+    It is always safe to delete the cache.
+    """
+
+    logger: logging.Logger
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def key_for(
+        self, audio: AudioSegment, parameters: Dict[str, Any], encoder_name: str
+    ) -> str:
+        digest = sha256()
+        header = {
+            "sample_width": audio.sample_width,
+            "frame_rate": audio.frame_rate,
+            "channels": audio.channels,
+            "parameters": parameters,
+            # Different encoders make different files from the same audio:
+            "encoder": encoder_name,
+        }
+        digest.update(json.dumps(header, sort_keys=True).encode("UTF-8"))
+        digest.update(audio.raw_data)
+        return digest.hexdigest()
+
+    def path_for(self, key: str, extension: str) -> Path:
+        # Spread the files across subdirectories, so that no single
+        # directory gets too big.
+        return self.directory / key[:2] / f"{key}.{extension}"
+
+    def encode(
+        self,
+        audio: AudioSegment,
+        extension: str,
+        parameters: Dict[str, Any],
+        encoder: Encoder,
+        encoder_name: str,
+    ) -> Path:
+        """
+        Returns the path to the encoded audio. The encoder is only called if
+        the same audio was never encoded with the same parameters, by the
+        same encoder, before.
+        """
+        key = self.key_for(audio, parameters, encoder_name)
+        cached_path = self.path_for(key, extension)
+        if cached_path.exists():
+            self.logger.debug("Cache hit: %s", cached_path)
+            return cached_path
+
+        cached_path.parent.mkdir(parents=True, exist_ok=True)
+        # Encode to a unique name, then move it into place, so that
+        # concurrent encoders never see a half-written file.
+        handle, temporary_name = mkstemp(
+            suffix=f".{extension}", prefix=".", dir=cached_path.parent
+        )
+        os.close(handle)
+        try:
+            encoder(audio, Path(temporary_name))
+            os.replace(temporary_name, cached_path)
+        except BaseException:
+            os.unlink(temporary_name)
+            raise
+        return cached_path
+
+
+def link_or_copy(source: Path, destination: Path) -> None:
+    """
+    Hard links the source to the destination, so that the file is only stored
+    once. Copies it instead if that's not possible (e.g., across filesystems).
+    """
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
@@ -16,14 +16,181 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import subprocess
+from abc import ABC, abstractmethod
+from os import fspath
 from pathlib import Path
-from typing import Union
+from typing import Any, Dict, Optional, Type, Union
 
+import numpy as np
 from pydub import AudioSegment  # type: ignore
 
+# How .m4a files are encoded. This will save a mono audio stream encoded in
+# AAC, in an MP4 container.
+# Anything that changes the encoded audio belongs here, since these settings
+# are part of the key of the transcode cache.
+AAC_EXPORT_PARAMETERS: Dict[str, Any] = dict(
+    format="ipod",
+    codec="aac",
+    # On Ubuntu's ffmpeg, the aac codec is experimental,
+    # so enable experimental codecs!
+    parameters=["-strict", "-2"],
+)
+
+
+# How .webm files are encoded: a mono Opus stream, in a WebM container.
+# Opus is designed for speech, so it needs a fraction of AAC's bitrate.
+OPUS_EXPORT_PARAMETERS: Dict[str, Any] = dict(
+    format="webm", codec="libopus", bitrate="32k", parameters=[]
+)
+
+Tags = Dict[str, Any]
+
+
+class AACEncoder(ABC):
+    """
+    Encodes audio to an .m4a file, with the given tags.
+
+    All encoders produce the same kind of file (mono AAC in an MP4 container,
+    with the same tags); they only differ in how they get ffmpeg to do it.
+    Encoders are used from several threads at once.
+    """
+
+    name: str
+
+    @abstractmethod
+    def encode(
+        self,
+        audio: AudioSegment,
+        destination: Path,
+        tags: Optional[Tags] = None,
+        bitrate: Optional[str] = None,
+    ) -> None:
+        """
+        Encodes the audio. The bitrate is in ffmpeg's notation (e.g., "64k");
+        by default, it's ffmpeg's default bitrate.
+        """
+
+
+class PydubEncoder(AACEncoder):
+    """
+    Lets pydub do the encoding. Slow: pydub writes the audio to a temporary
+    file, runs ffmpeg on it, writes ffmpeg's output to another temporary file,
+    and finally copies that to the destination.
+    """
+
+    name = "pydub"
+
+    def encode(
+        self,
+        audio: AudioSegment,
+        destination: Path,
+        tags: Optional[Tags] = None,
+        bitrate: Optional[str] = None,
+        **kwargs,
+    ) -> None:
+        audio.export(
+            destination, **AAC_EXPORT_PARAMETERS, tags=tags, bitrate=bitrate, **kwargs
+        ).close()
+
+
+class PyAVEncoder(AACEncoder):
+    """
+    Encodes in-process, using ffmpeg's libraries through PyAV. No processes
+    are started at all, which makes it much faster than starting ffmpeg for
+    every recording.
+
+    PyAV is optional; see is_available().
+    """
+
+    name = "pyav"
+
+    def __init__(self) -> None:
+        import av  # type: ignore
+
+        self._av = av
+
+    @staticmethod
+    def is_available() -> bool:
+        try:
+            import av  # type: ignore # noqa
+        except ImportError:
+            return False
+        return True
+
+    def encode(
+        self,
+        audio: AudioSegment,
+        destination: Path,
+        tags: Optional[Tags] = None,
+        bitrate: Optional[str] = None,
+    ) -> None:
+        av = self._av
+        audio = audio.set_sample_width(2)
+        # Packed samples are a single plane of interleaved samples:
+        samples = np.frombuffer(audio.raw_data, dtype="<i2").reshape(1, -1)
+        frame = av.AudioFrame.from_ndarray(samples, format="s16", layout="mono")
+        frame.sample_rate = audio.frame_rate
+        frame.pts = 0
+
+        container = av.open(
+            fspath(destination), mode="w", format=AAC_EXPORT_PARAMETERS["format"]
+        )
+        with container:
+            for key, value in (tags or {}).items():
+                container.metadata[key] = str(value)
+            stream = container.add_stream(
+                AAC_EXPORT_PARAMETERS["codec"], rate=audio.frame_rate
+            )
+            stream.layout = "mono"
+            if bitrate is not None:
+                stream.bit_rate = bits_per_second(bitrate)
+            # The codec splits the frame into as many frames as it needs;
+            # encode(None) flushes whatever is left.
+            for packet in stream.encode(frame):
+                container.mux(packet)
+            for packet in stream.encode(None):
+                container.mux(packet)
+
+
+def bits_per_second(bitrate: str) -> int:
+    """
+    Converts a bitrate in ffmpeg's notation into bits per second.
+
+    >>> bits_per_second("64k")
+    64000
+    >>> bits_per_second("96000")
+    96000
+    """
+    if bitrate.endswith("k"):
+        return int(bitrate[:-1]) * 1000
+    return int(bitrate)
+
+
+ENCODERS: Dict[str, Type[AACEncoder]] = {
+    PydubEncoder.name: PydubEncoder,
+    PyAVEncoder.name: PyAVEncoder,
+}
+
+
+def get_encoder(name: str = PydubEncoder.name) -> AACEncoder:
+    """
+    Returns the encoder with the given name. pydub is the default, since it
+    only needs ffmpeg; PyAV is much faster, but it has to be installed
+    separately.
+    """
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown encoder: {name!r}")
+    if name == PyAVEncoder.name and not PyAVEncoder.is_available():
+        raise ValueError("PyAV is not installed (pip install av)")
+    return ENCODERS[name]()
+
 
 def transcode_to_aac(
-    recording: Union[Path, AudioSegment], destination: Path, **kwargs
+    recording: Union[Path, AudioSegment],
+    destination: Path,
+    encoder: Optional[AACEncoder] = None,
+    **kwargs,
 ) -> None:
     """
     Transcodes an audio file to an .m4a file.
@@ -45,18 +212,44 @@ def transcode_to_aac(
     assert len(audio) > 0, "Recording is empty"
     assert destination.suffix == ".m4a", "Don't you want an .m4a file?"
 
-    # This assumes ffmpeg as the backend. This will save
-    # a mono audio stream encoded in AAC, in an MP4 container.
-    audio.export(
-        destination,
-        format="ipod",
-        codec="aac",
-        **kwargs,
-        # On Ubuntu's ffmpeg, the aac codec is experimental,
-        # so enable experimental codecs!
-        parameters=["-strict", "-2"],
-    ).close()
+    if encoder is None:
+        encoder = PydubEncoder()
+    encoder.encode(audio, destination, **kwargs)
+
 
+def transcode_to_opus(
+    audio: AudioSegment, destination: Path, bitrate: Optional[str] = None, **kwargs
+) -> None:
+    """
+    Transcodes audio to a .webm file, with Opus audio.
 
-# TODO: transcode to Opus in Ogg to support libre browsers and basically
-# nothing else.
+    All modern browsers, except Safari, support Opus in WebM; Safari users
+    should get .m4a files instead.
+    """
+    assert audio.channels == 1, "Recording is not mono"
+    assert len(audio) > 0, "Recording is empty"
+    assert destination.suffix == ".webm", "Don't you want a .webm file?"
+
+    parameters = dict(OPUS_EXPORT_PARAMETERS)
+    if bitrate is not None:
+        parameters.update(bitrate=bitrate)
+    audio.export(destination, **parameters, **kwargs).close()
+
+
+def transcode_file(
+    source: Path,
+    destination: Path,
+    parameters: Dict[str, Any] = OPUS_EXPORT_PARAMETERS,
+) -> None:
+    """
+    Transcodes an already encoded file (e.g., an .m4a file) into another
+    format, keeping its tags. ffmpeg does all the work, so the audio is never
+    decoded into memory.
+    """
+    command = [AudioSegment.converter, "-y", "-v", "error", "-i", fspath(source)]
+    command += ["-vn", "-acodec", parameters["codec"]]
+    if "bitrate" in parameters:
+        command += ["-b:a", parameters["bitrate"]]
+    command += parameters["parameters"]
+    command += ["-f", parameters["format"], fspath(destination)]
+    subprocess.run(command, check=True, stdin=subprocess.DEVNULL, capture_output=True)
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Lets several processes, on several machines, import sessions together.
+
+Every session is a unit of work in a queue shared by all of them (an SQLite
+database on the shared volume). Workers claim sessions, one at a time, and
+extract and encode their recordings into shared storage. A single coordinator
+then commits each session's recordings to the database, so that workers never
+write to the database themselves.
+
+A claim is only good for a short lease, which the worker renews (its
+heartbeat) for as long as it works on the session. If a worker dies, its
+lease runs out, and another worker claims the session again. A session that
+fails too many times is given up on.
+"""
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import logme  # type: ignore
+
+from librecval.extract_phrases import RecordingInfo
+from librecval.recording_session import SessionID
+
+# Every state that a session can be in, in order:
+PENDING = "pending"  # waiting for a worker
+CLAIMED = "claimed"  # a worker is extracting it
+EXTRACTED = "extracted"  # waiting for the coordinator
+COMMITTED = "committed"  # in the database
+FAILED = "failed"  # failed too many times; given up on
+STATES = (PENDING, CLAIMED, EXTRACTED, COMMITTED, FAILED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    name TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_expires REAL,
+    output TEXT,
+    error TEXT
+)
+"""
+
+# Only the worker that holds the claim can change a claimed session. Takes the
+# CLAIMED state, followed by the claim itself.
+WHERE_CLAIMED = "WHERE state = ? AND name = ? AND worker = ? AND attempts = ?"
+
+# The name of the list of recordings that a worker extracted from a session.
+RECORDINGS_LIST = "recordings.jsonl"
+
+
+class Claim(NamedTuple):
+    """
+    A worker's claim on a session. The attempt number tells this claim apart
+    from earlier claims on the same session (perhaps by the same worker).
+    """
+
+    session: str
+    worker: str
+    attempt: int
+
+
+@logme.log
+class SessionQueue:
+    """
+    The shared queue of sessions. Safe to use from several threads,
+    processes, and machines: every method uses its own connection, and
+    changes the queue in a single transaction.
+
+    Leases are compared with each machine's clock, so the clocks of the
+    machines should agree to well within the lease.
+    """
+
+    logger: logging.Logger
+
+    def __init__(
+        self,
+        path: Path,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 3,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.clock = clock
+        with self._transaction() as db:
+            db.execute(SCHEMA)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # Take the write lock right away, so that two workers never claim the
+        # same session.
+        db = sqlite3.connect(os.fspath(self.path), timeout=60, isolation_level=None)
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+    def add(self, sessions: Iterable[str]) -> int:
+        """
+        Adds sessions to the queue, unless they're already in it. Returns how
+        many were added.
+        """
+        with self._transaction() as db:
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO sessions (name) VALUES (?)",
+                [(name,) for name in sessions],
+            )
+            return db.total_changes - before
+
+    def claim(self, worker: str) -> Optional[Claim]:
+        """
+        Claims the next session that needs a worker: either one that nobody
+        has claimed yet, or one whose worker let its lease run out. Returns
+        None if there is no such session right now.
+        """
+        now = self.clock()
+        with self._transaction() as db:
+            # Workers that let their lease run out on their last attempt
+            # probably crashed on this session; stop trying.
+            db.execute(
+                "UPDATE sessions SET state = ?, error = 'lease expired' "
+                "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, CLAIMED, now, self.max_attempts),
+            )
+            row = db.execute(
+                "SELECT name, attempts FROM sessions "
+                "WHERE state = ? OR (state = ? AND lease_expires < ?) "
+                "ORDER BY name LIMIT 1",
+                (PENDING, CLAIMED, now),
+            ).fetchone()
+            if row is None:
+                return None
+
+            name, attempts = row
+            claim = Claim(name, worker, attempts + 1)
+            db.execute(
+                "UPDATE sessions "
+                "SET state = ?, worker = ?, attempts = ?, lease_expires = ? "
+                "WHERE name = ?",
+                (CLAIMED, worker, claim.attempt, now + self.lease_seconds, name),
+            )
+
+        self.logger.info("%s claimed %s (attempt %d)", worker, name, claim.attempt)
+        return claim
+
+    def heartbeat(self, claim: Claim) -> bool:
+        """
+        Renews the claim's lease. Returns False if the claim has been lost
+        (because its lease ran out, and another worker claimed the session).
+        """
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE sessions SET lease_expires = ? " + WHERE_CLAIMED,
+                (self.clock() + self.lease_seconds, CLAIMED, *claim),
+            )
+            return cursor.rowcount == 1
+
+    def finish(self, claim: Claim, output: Path) -> bool:
+        """
+        Hands the session's extracted recordings (in the output directory)
+        over to the coordinator. Returns False if the claim has been lost, in
+        which case the output should be thrown away.
+        """
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE sessions SET state = ?, output = ?, lease_expires = NULL "
+                + WHERE_CLAIMED,
+                (EXTRACTED, os.fspath(output), CLAIMED, *claim),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, claim: Claim, error: str) -> None:
+        """
+        Gives up on the claim, because the session could not be extracted.
+        Another worker will try again, unless it has been tried too many
+        times already.
+        """
+        state = FAILED if claim.attempt >= self.max_attempts else PENDING
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE sessions SET state = ?, error = ?, lease_expires = NULL "
+                + WHERE_CLAIMED,
+                (state, error, CLAIMED, *claim),
+            )
+        self.logger.warning("%s released %s: %s", claim.worker, claim.session, error)
+
+    def extracted(self) -> List[Tuple[str, Path]]:
+        """
+        Returns every session (and its output directory) that is waiting to
+        be committed.
+        """
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT name, output FROM sessions WHERE state = ? ORDER BY name",
+                (EXTRACTED,),
+            ).fetchall()
+        return [(name, Path(output)) for name, output in rows]
+
+    def mark_committed(self, session: str) -> None:
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE sessions SET state = ? WHERE name = ? AND state = ?",
+                (COMMITTED, session, EXTRACTED),
+            )
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Returns how many sessions are in each state.
+        """
+        with self._transaction() as db:
+            rows = db.execute("SELECT state, COUNT(*) FROM sessions GROUP BY state")
+            counts = {state: 0 for state in STATES}
+            counts.update(rows)
+        return counts
+
+    def is_drained(self) -> bool:
+        """
+        True when no session needs a worker, or the coordinator, anymore.
+        """
+        counts = self.counts()
+        return counts[PENDING] == counts[CLAIMED] == counts[EXTRACTED] == 0
+
+
+class Heartbeat:
+    """
+    Renews a claim's lease in the background, for as long as the
+    with-statement lasts. If the claim is lost, .lost becomes True.
+    """
+
+    def __init__(self, queue: SessionQueue, claim: Claim) -> None:
+        self.queue = queue
+        self.claim = claim
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+
+    def __enter__(self) -> "Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _beat(self) -> None:
+        # Renew well before the lease runs out, in case the database is busy.
+        interval = self.queue.lease_seconds / 3
+        while not self._stop.wait(interval):
+            if not self.queue.heartbeat(self.claim):
+                self.lost = True
+                return
+
+
+@logme.log
+def run_worker(
+    queue: SessionQueue,
+    worker: str,
+    extract: Callable[[Claim, Path], None],
+    output_dir: Path,
+    poll_seconds: float = 10.0,
+    logger=None,
+) -> int:
+    """
+    Claims sessions, and extracts them, until there is nothing left to do.
+    extract() saves the session's recordings in the directory it is given,
+    which is within the output directory, and named after the claim. Returns
+    how many sessions this worker extracted.
+
+    If extract() fails, or the claim is lost before it's done, whatever it
+    saved is removed.
+    """
+    extracted = 0
+    while True:
+        claim = queue.claim(worker)
+        if claim is None:
+            counts = queue.counts()
+            if counts[PENDING] == counts[CLAIMED] == 0:
+                return extracted
+            # Another worker might still die and leave its session behind.
+            time.sleep(poll_seconds)
+            continue
+
+        output = output_dir / f"{claim.session}.{claim.worker}.{claim.attempt}"
+        with Heartbeat(queue, claim) as heartbeat:
+            try:
+                output.mkdir(parents=True)
+                extract(claim, output)
+            except Exception as error:
+                logger.exception("Could not extract %s", claim.session)
+                shutil.rmtree(output, ignore_errors=True)
+                queue.release(claim, repr(error))
+                continue
+
+        if heartbeat.lost or not queue.finish(claim, output):
+            logger.warning("Lost the claim on %s; discarding its output", claim.session)
+            shutil.rmtree(output, ignore_errors=True)
+            continue
+        extracted += 1
+
+
+@logme.log
+def run_coordinator(
+    queue: SessionQueue,
+    commit: Callable[[str, Path], None],
+    poll_seconds: float = 10.0,
+    logger=None,
+) -> int:
+    """
+    Commits every session that the workers extract, as soon as they're done,
+    until the queue is drained. Returns how many sessions were committed.
+    """
+    committed = 0
+    while True:
+        for session, output in queue.extracted():
+            logger.info("Committing %s from %s", session, output)
+            commit(session, output)
+            queue.mark_committed(session)
+            committed += 1
+
+        if queue.is_drained():
+            return committed
+        time.sleep(poll_seconds)
+
+
+def record_recording(output: Path, info: RecordingInfo, recording_path: Path) -> None:
+    """
+    Adds a recording to the list of recordings in the output directory.
+    """
+    entry = {
+        "session": str(info.session),
+        "speaker": info.speaker,
+        "type": info.type,
+        "timestamp": info.timestamp,
+        "transcription": info.transcription,
+        "translation": info.translation,
+        "audio": recording_path.name,
+    }
+    with open(output / RECORDINGS_LIST, "a", encoding="UTF-8") as recordings_file:
+        recordings_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def recordings_in(output: Path) -> Iterator[Tuple[RecordingInfo, Path]]:
+    """
+    Yields every recording in the list of recordings in the output directory,
+    and the path to its audio.
+    """
+    recordings_list = output / RECORDINGS_LIST
+    if not recordings_list.exists():
+        return
+
+    with open(recordings_list, encoding="UTF-8") as recordings_file:
+        for line in recordings_file:
+            entry = json.loads(line)
+            info = RecordingInfo(
+                session=SessionID.from_name(entry["session"]),
+                speaker=entry["speaker"],
+                type=entry["type"],
+                timestamp=entry["timestamp"],
+                transcription=entry["transcription"],
+                translation=entry["translation"],
+            )
+            yield info, output / entry["audio"]
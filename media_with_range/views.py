@@ -16,7 +16,9 @@ def serve(request: HttpRequest, path: str) -> HttpResponse:
     return serve_file(request, local_file_path)
 
 
-def serve_file(request: HttpRequest, local_file_path: Path):
+def serve_file(
+    request: HttpRequest, local_file_path: Path, content_type: str = "audio/m4a"
+):
     if "Range" in request.headers:
         value = request.headers["Range"]
 
@@ -49,12 +51,12 @@ def serve_file(request: HttpRequest, local_file_path: Path):
         partial_file_contents = file_contents[lower : upper + 1]
 
         response = FileResponse(
-            io.BytesIO(partial_file_contents), content_type="audio/m4a",
+            io.BytesIO(partial_file_contents), content_type=content_type,
         )
         response.status_code = 206
         response["Accept-Ranges"] = "bytes"
         response["Content-Range"] = f"bytes {lower}-{upper}/{total_content_length}"
     else:
-        response = FileResponse(local_file_path.open("rb"), content_type="audio/m4a",)
+        response = FileResponse(local_file_path.open("rb"), content_type=content_type,)
 
     return response
@@ -198,6 +198,42 @@ RECVAL_SESSIONS_DIR = config(
     "RECVAL_SESSIONS_DIR", BASE_DIR / "data" / "sessions", cast=Path
 )
 
+# Remembers which files every session was imported from, so that sessions that
+# have not changed since the last import can be skipped.
+RECVAL_IMPORT_MANIFEST_PATH = config(
+    "RECVAL_IMPORT_MANIFEST_PATH",
+    BASE_DIR / "private" / "import-manifest.json",
+    cast=Path,
+)
+
+# Encoded audio, named by the hash of the audio itself, so that the same audio is
+# never encoded twice. It is always safe to delete this directory.
+RECVAL_TRANSCODE_CACHE_DIR = config(
+    "RECVAL_TRANSCODE_CACHE_DIR",
+    BASE_DIR / "private" / "transcode-cache",
+    cast=Path,
+)
+
+# Tiers of TextGrids, named by the hash of the TextGrid, so that the same TextGrid is
+# never parsed twice. It is always safe to delete this directory.
+RECVAL_TEXT_GRID_CACHE_DIR = config(
+    "RECVAL_TEXT_GRID_CACHE_DIR",
+    BASE_DIR / "private" / "text-grid-cache",
+    cast=Path,
+)
+
+# Decoded audio of masters that cannot be memory-mapped as they are (e.g., anything
+# but PCM .wav files), named by the hash of the master, so that importing with
+# --pcm-cache never decodes the same master twice. Least recently used audio is
+# evicted to keep it under RECVAL_PCM_CACHE_SIZE bytes. It is always safe to
+# delete this directory.
+RECVAL_PCM_CACHE_DIR = config(
+    "RECVAL_PCM_CACHE_DIR",
+    BASE_DIR / "private" / "pcm-cache",
+    cast=Path,
+)
+RECVAL_PCM_CACHE_SIZE = config("RECVAL_PCM_CACHE_SIZE", 20 * 1000 ** 3, cast=int)
+
 ################################### MEDIA (Uploads) ####################################
 
 # Audio (including compressed recordings) and pictures are uploaded here.
@@ -209,6 +245,12 @@ MEDIA_URL = config("MEDIA_URL", default="/media/")
 # Recoring URLS will be moved here
 MEDIA_ROOT = config("MEDIA_ROOT", default=BASE_DIR / "data", cast=str)
 
+# Imports stage transcoded audio here before it's stored. Audio is hard linked into
+# MEDIA_ROOT, so this should be on the same filesystem (otherwise, it's copied), but
+# it must not be within MEDIA_ROOT, since everything in there is served to anyone.
+# By default, it's next to MEDIA_ROOT (e.g., data-staging, next to data).
+RECVAL_STAGING_DIR = config("RECVAL_STAGING_DIR", default=None)
+
 LOGIN_REDIRECT_URL = "/"
 
 ITWEWINA_URL = "https://sapir.artsrn.ualberta.ca/cree-dictionary/"
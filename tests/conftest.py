@@ -20,6 +20,7 @@
 Fixtures and magic for pytests.
 """
 
+import shutil
 from pathlib import Path
 from tempfile import TemporaryDirectory
 
@@ -50,6 +51,40 @@ def wave_file_path():
     return test_wav
 
 
+@pytest.fixture
+def sessions_dir(_temporary_data_directory, wave_file_path):
+    """
+    Returns a directory of sessions, as they would be found in
+    RECVAL_SESSIONS_DIR. There are two sessions, each with two mics, and each
+    track is the "acimosis" recording annotated with one word and one
+    sentence. The speakers can be found in tests/fixtures/test_metadata.csv.
+    """
+    sessions = _temporary_data_directory / "sessions"
+    for session_name in ("2015-04-15-PM-___-_", "2015-04-29-PM-___-_"):
+        session_dir = sessions / session_name
+        session_dir.mkdir(parents=True)
+        for mic in (2, 3):
+            shutil.copy(wave_file_path, session_dir / f"{mic}_001.wav")
+            shutil.copy(text_grid_path(), session_dir / f"{mic}_001.TextGrid")
+    return sessions
+
+
+def text_grid_path() -> Path:
+    """
+    Annotations for test.wav, with the following tiers:
+    English (word), Cree (word), English (sentence), Cree (sentence).
+    """
+    return fixtures_dir / "test.TextGrid"
+
+
+@pytest.fixture
+def metadata_csv_path():
+    """
+    Returns the path to some sample metadata, as downloaded from Google Sheets.
+    """
+    return fixtures_dir / "test_metadata.csv"
+
+
 @pytest.fixture
 def metadata_csv_file():
     """
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from hypothesis import given  # type: ignore
+from hypothesis.strategies import booleans, integers, lists  # type: ignore
+from textgrid import IntervalTier  # type: ignore
+
+from librecval.alignment import NOT_FOUND, IntervalIndex
+
+# Times are multiples of 1/8 of a second, so that they (and their midpoints)
+# can be represented exactly in both seconds and milliseconds.
+STEP = 0.125
+
+
+def make_tier(name, boundaries, gaps):
+    """
+    Creates a tier whose intervals are between the boundaries, leaving out
+    some intervals to make gaps.
+    """
+    tier = IntervalTier(name)
+    times = sorted(set(boundaries))
+    for i, (start, end) in enumerate(zip(times, times[1:])):
+        if gaps and gaps[i % len(gaps)]:
+            continue
+        tier.add(start * STEP, end * STEP, f"{name} {i}")
+    return tier
+
+
+@given(
+    lists(integers(min_value=0, max_value=200), max_size=30),
+    lists(booleans(), max_size=5),
+    lists(integers(min_value=0, max_value=200), max_size=30),
+    lists(booleans(), max_size=5),
+)
+def test_same_as_interval_containing(words, word_gaps, glosses, gloss_gaps):
+    """
+    Aligning entire tiers at once finds the same intervals as looking up each
+    midpoint with IntervalTier.intervalContaining().
+    """
+    cree_tier = make_tier("Cree", words, word_gaps)
+    english_tier = make_tier("English", glosses, gloss_gaps)
+
+    aligned = IntervalIndex.from_tier(english_tier).midpoints_containing(
+        IntervalIndex.from_tier(cree_tier)
+    )
+
+    assert len(aligned) == len(cree_tier)
+    for interval, index in zip(cree_tier, aligned):
+        midtime = (interval.minTime + interval.maxTime) / 2
+        expected = english_tier.intervalContaining(midtime)
+        if expected is None:
+            assert index == NOT_FOUND
+        else:
+            assert english_tier[int(index)] is expected
+
+
+def test_empty_tier():
+    english = IntervalIndex([], [], [])
+    cree = IntervalIndex([100], [200], ["acimosis"])
+    assert list(english.midpoints_containing(cree)) == [NOT_FOUND]
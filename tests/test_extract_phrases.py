@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for extracting recordings from a directory of sessions.
+"""
+
+import shutil
+import wave
+from pathlib import Path
+
+import pytest  # type: ignore
+from pydub import AudioSegment  # type: ignore
+from textgrid import IntervalTier, TextGrid  # type: ignore
+
+from librecval import extract_phrases
+from librecval.alignment import IntervalIndex
+from librecval.extract_phrases import (
+    RecordingExtractor,
+    RecordingNotFoundError,
+    WaveFile,
+    load_text_grid,
+    parse_text_grid,
+)
+from librecval.recording_session import parse_metadata
+from librecval.text_grid_cache import TextGridCache
+
+TEXT_GRID = Path(__file__).parent / "fixtures" / "test.TextGrid"
+
+
+def test_extract_words_and_sentences(sessions_dir: Path, metadata_csv_file) -> None:
+    """
+    Extract recordings from every track in every session.
+    """
+    ex = RecordingExtractor(parse_metadata(metadata_csv_file))
+    recordings = list(ex.scan(sessions_dir))
+
+    # Two sessions, two mics, one word and one sentence each:
+    assert len(recordings) == 8
+    info, audio = recordings[0]
+    assert str(info.session) == "2015-04-15-PM-___-_"
+    assert info.speaker == "LOU"
+    assert (info.type, info.transcription, info.translation) == (
+        "word",
+        "acimosis",
+        "puppy",
+    )
+    assert info.timestamp == 100
+    assert len(audio) == 300
+
+    # "minôs" is within a sentence, so it is only extracted as a sentence.
+    sentences = [info for info, _ in recordings if info.type == "sentence"]
+    assert len(sentences) == 4
+    assert all(info.transcription == "minôs" for info in sentences)
+
+
+def test_parallel_scan_is_deterministic(sessions_dir: Path, metadata_csv_file) -> None:
+    """
+    Extracting with several processes yields the same recordings, in the same
+    order, as extracting with one.
+    """
+    ex = RecordingExtractor(parse_metadata(metadata_csv_file))
+    serial = list(ex.scan(sessions_dir))
+    parallel = list(ex.scan(sessions_dir, jobs=3))
+
+    assert [info for info, _ in parallel] == [info for info, _ in serial]
+    assert [audio.raw_data for _, audio in parallel] == [
+        audio.raw_data for _, audio in serial
+    ]
+
+
+def test_extract_from_multichannel_master(
+    sessions_dir: Path, metadata_csv_file, monkeypatch
+) -> None:
+    """
+    When every mic was recorded into one multi-channel file, each mic's
+    recordings come from its own channel, and the file is only opened once.
+    """
+    # Make each mic sound different, so that mixing up channels is noticed:
+    for session_dir in sessions_dir.iterdir():
+        mic_3 = AudioSegment.from_wav(session_dir / "3_001.wav")
+        mic_3.invert_phase().export(session_dir / "3_001.wav", format="wav")
+
+    metadata = parse_metadata(metadata_csv_file)
+    expected = dict(RecordingExtractor(metadata).scan(sessions_dir))
+
+    # Replace each session's per-mic files with one master; mic 2 is the
+    # second channel, and mic 3 the third.
+    for session_dir in sessions_dir.iterdir():
+        mic_2 = AudioSegment.from_wav(session_dir / "2_001.wav")
+        mic_3 = AudioSegment.from_wav(session_dir / "3_001.wav")
+        master = AudioSegment.from_mono_audiosegments(mic_2.reverse(), mic_2, mic_3)
+        master.export(session_dir / "master.wav", format="wav")
+        (session_dir / "2_001.wav").unlink()
+        (session_dir / "3_001.wav").unlink()
+
+    opened = []
+    open_audio = extract_phrases.open_audio
+
+    def spy(sound_file, *args):
+        opened.append(sound_file.name)
+        return open_audio(sound_file, *args)
+
+    monkeypatch.setattr(extract_phrases, "open_audio", spy)
+
+    ex = RecordingExtractor(metadata)
+    recordings = list(ex.scan(sessions_dir))
+
+    assert opened == ["master.wav", "master.wav"]  # once per session
+    assert len(recordings) == len(expected) == 8
+    for info, audio in recordings:
+        assert audio.channels == 1
+        assert audio.raw_data == expected[info].raw_data
+
+
+def test_ambiguous_multichannel_masters(sessions_dir: Path, metadata_csv_file) -> None:
+    """
+    Audio is not taken from a master unless it's the only one.
+    """
+    session_dir = next(sessions_dir.iterdir())
+    mic_2 = AudioSegment.from_wav(session_dir / "2_001.wav")
+    master = AudioSegment.from_mono_audiosegments(mic_2, mic_2, mic_2)
+    for name in ("master-a.wav", "master-b.wav"):
+        master.export(session_dir / name, format="wav")
+    (session_dir / "2_001.wav").unlink()
+    shutil.copy(session_dir / "3_001.TextGrid", session_dir / "4_001.TextGrid")
+
+    ex = RecordingExtractor(parse_metadata(metadata_csv_file))
+    recordings = list(ex.scan(sessions_dir))
+
+    # Only mic 3 has audio in this session:
+    assert len(recordings) == 6
+    assert ex.report.session(session_dir.name).skipped["no audio"] == 2
+    assert ex.report.session(session_dir.name).has_problems
+
+
+def test_extract_one_recording(sessions_dir: Path, metadata_csv_file) -> None:
+    """
+    A single recording can be extracted again, given its ID, optionally with
+    different bounds.
+    """
+    ex = RecordingExtractor(parse_metadata(metadata_csv_file))
+    recordings = list(ex.scan(sessions_dir))
+    expected_info, expected_audio = recordings[-1]
+    rec_id = expected_info.compute_sha256hash()
+
+    info, audio = ex.extract_recording(
+        sessions_dir, expected_info.session, rec_id, speaker=expected_info.speaker
+    )
+    assert info == expected_info
+    assert audio.raw_data == expected_audio.raw_data
+
+    end = expected_info.timestamp + 100
+    info, audio = ex.extract_recording(
+        sessions_dir, expected_info.session, rec_id, end=end
+    )
+    # Same recording, cut short:
+    assert info.compute_sha256hash() == rec_id
+    assert len(audio) == 100
+
+    with pytest.raises(RecordingNotFoundError):
+        ex.extract_recording(sessions_dir, expected_info.session, "0" * 64)
+    with pytest.raises(ValueError):
+        ex.extract_recording(
+            sessions_dir, expected_info.session, rec_id, start=end, end=end
+        )
+
+
+@pytest.mark.parametrize("sample_width", [1, 2, 3, 4])
+@pytest.mark.parametrize("channels", [1, 2])
+def test_wave_file_slices_like_pydub(tmp_path: Path, sample_width, channels) -> None:
+    """
+    Slicing a memory-mapped .wav file yields the exact same audio as slicing
+    the decoded file with pydub, including slices that run off the end.
+    """
+    wav_path = tmp_path / "test.wav"
+    with wave.open(str(wav_path), "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(sample_width)
+        wav.setframerate(44_100)
+        # About 1 second of noise-like data.
+        frames = 44_123
+        size = frames * channels * sample_width
+        wav.writeframes(bytes((i * 37) % 251 for i in range(size)))
+
+    decoded = AudioSegment.from_file(str(wav_path))
+    mapped = WaveFile(wav_path)
+    try:
+        assert len(mapped) == len(decoded)
+        for start, end in [(0, 10), (123, 456), (900, len(decoded) + 2), (990, 2000)]:
+            expected = decoded[start:end]
+            actual = mapped[start:end]
+            assert actual.sample_width == expected.sample_width
+            assert actual.channels == expected.channels
+            assert actual.frame_rate == expected.frame_rate
+            assert actual.raw_data == expected.raw_data
+    finally:
+        mapped.close()
+
+
+@pytest.mark.parametrize("encoding", ["UTF-8", "UTF-16"])
+@pytest.mark.parametrize("short", [False, True])
+def test_parse_text_grid_like_textgrid_package(tmp_path: Path, encoding, short) -> None:
+    """
+    Tiers are parsed into exactly the same intervals as the textgrid package
+    would parse them into, in either of Praat's text formats.
+    """
+    text_grid = TextGrid.fromFile(str(TEXT_GRID))
+    tricky = IntervalTier("Cree (word)", 0, 0.91)
+    tricky.add(0.1, 0.285, 'the "puppy"')
+    tricky.add(0.285, 0.2850001, "too short to keep")
+    tricky.add(0.5, 0.8875, "two\nlines")
+    text_grid.tiers[1] = tricky
+    path = tmp_path / "test.TextGrid"
+    if short:
+        path.write_text(as_short_text_grid(text_grid), encoding=encoding)
+    else:
+        text_grid.write(str(path))
+        path.write_text(path.read_text(encoding="UTF-8"), encoding=encoding)
+
+    tiers = parse_text_grid(path.read_bytes())
+
+    assert len(tiers) == 4
+    for tier, expected in zip(tiers, TextGrid.fromFile(str(path)).tiers):
+        expected = IntervalIndex.from_tier(expected)
+        assert tier.name == expected.name
+        assert tier.starts.tolist() == expected.starts.tolist()
+        assert tier.ends.tolist() == expected.ends.tolist()
+        assert tier.marks == expected.marks
+
+
+def test_text_grid_cache(tmp_path: Path, monkeypatch) -> None:
+    """
+    A TextGrid is only parsed the first time it is loaded.
+    """
+    cache = TextGridCache(tmp_path / "cache")
+    tiers = load_text_grid(TEXT_GRID, cache)
+
+    def parse(contents):
+        raise AssertionError("parsed the TextGrid again")
+
+    monkeypatch.setattr(extract_phrases, "parse_text_grid", parse)
+    cached = load_text_grid(TEXT_GRID, cache)
+
+    assert [tier.name for tier in cached] == [tier.name for tier in tiers]
+    assert [tier.marks for tier in cached] == [tier.marks for tier in tiers]
+    assert [tier.starts.tolist() for tier in cached] == [
+        tier.starts.tolist() for tier in tiers
+    ]
+
+
+def as_short_text_grid(text_grid: TextGrid) -> str:
+    """
+    Praat's short text format, which the textgrid package cannot write.
+    """
+    lines = ['File type = "ooTextFile short"', '"TextGrid"', ""]
+    lines += [str(text_grid.minTime), str(text_grid.maxTime), "<exists>"]
+    lines.append(str(len(text_grid.tiers)))
+    for tier in text_grid.tiers:
+        lines += ['"IntervalTier"', f'"{tier.name}"']
+        lines += [str(tier.minTime), str(tier.maxTime), str(len(tier))]
+        for interval in tier:
+            mark = interval.mark.replace('"', '""')
+            lines += [str(interval.minTime), str(interval.maxTime), f'"{mark}"']
+    return "\n".join(lines) + "\n"
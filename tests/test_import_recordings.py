@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for importing a directory of sessions.
+"""
+
+import json
+import subprocess
+from pathlib import Path
+
+import pytest  # type: ignore
+from pydub import AudioSegment  # type: ignore
+
+from librecval import extract_phrases, import_recordings
+from librecval.extract_phrases import RecordingExtractor
+from librecval.import_journal import ImportJournal
+from librecval.import_manifest import ImportManifest
+from librecval.import_recordings import (
+    LADDER_TIERS,
+    initialize,
+    plan_speaker_reassignments,
+    read_measurements,
+)
+from librecval.quality import SILENT, TRUNCATED, QualityAnalyzer
+from librecval.recording_session import parse_metadata
+from librecval.speech_profile import SpeechProfile
+from librecval.transcode_cache import TranscodeCache
+
+
+def test_import_with_encoder_pool(
+    sessions_dir: Path, metadata_csv_path: Path, destination: Path
+) -> None:
+    """
+    Recordings are imported in the order they were extracted, even when
+    several of them are encoded at once.
+    """
+    imported = []
+
+    def import_recording(info, recording_path):
+        assert recording_path.exists()
+        imported.append(info)
+
+    initialize(
+        directory=sessions_dir,
+        transcoded_recordings_path=destination,
+        metadata_filename=metadata_csv_path,
+        import_recording=import_recording,
+        recording_format="wav",
+        encoders=3,
+        queue_size=2,
+    )
+
+    with open(metadata_csv_path) as metadata_csv:
+        ex = RecordingExtractor(parse_metadata(metadata_csv))
+    assert imported == [info for info, _ in ex.scan(sessions_dir)]
+    assert len(list(destination.glob("*.wav"))) == len(imported)
+
+
+def test_manifest_skips_unchanged_sessions(
+    sessions_dir: Path, metadata_csv_path: Path, destination: Path
+) -> None:
+    """
+    Sessions are only imported again when their files have changed.
+    """
+    manifest_path = destination / "import-manifest.json"
+
+    def import_all():
+        imported = []
+        initialize(
+            directory=sessions_dir,
+            transcoded_recordings_path=destination,
+            metadata_filename=metadata_csv_path,
+            import_recording=lambda info, path: imported.append(info),
+            recording_format="wav",
+            manifest=ImportManifest(manifest_path),
+        )
+        return imported
+
+    assert len(import_all()) == 8
+    assert manifest_path.exists()
+    assert import_all() == []
+
+    # Correct a translation in one of the TextGrids:
+    text_grid = sessions_dir / "2015-04-29-PM-___-_" / "3_001.TextGrid"
+    text_grid.write_text(text_grid.read_text().replace('"puppy"', '"little dog"'))
+
+    # Only the changed recording is new.
+    (reimported,) = import_all()
+    assert str(reimported.session) == "2015-04-29-PM-___-_"
+    assert reimported.translation == "little dog"
+
+
+def test_speaker_reassignments(
+    sessions_dir: Path, metadata_csv_path: Path, destination: Path
+) -> None:
+    """
+    Sessions whose speaker codes are all that changed in the metadata can have
+    their recordings reassigned, instead of being imported again.
+    """
+    manifest_path = destination / "import-manifest.json"
+    changed_csv_path = destination / "metadata.csv"
+
+    def import_all(metadata_filename):
+        imported = []
+        initialize(
+            directory=sessions_dir,
+            transcoded_recordings_path=destination,
+            metadata_filename=metadata_filename,
+            import_recording=lambda info, path: imported.append(info),
+            recording_format="wav",
+            manifest=ImportManifest(manifest_path),
+        )
+        return imported
+
+    original = import_all(metadata_csv_path)
+    # Someone else was on mic 3 in one session. In the other session, the
+    # speaker on mic 1 was also on mic 3, which cannot be reassigned.
+    changed_csv_path.write_text(
+        metadata_csv_path.read_text(encoding="UTF-8")
+        .replace("2015-04-15pm,ELICIT,LOU,MAR", "2015-04-15pm,ELICIT,LOU,ROS")
+        .replace("2015-04-29pm,LOU,BET,JER", "2015-04-29pm,LOU,BET,LOU"),
+        encoding="UTF-8",
+    )
+    with open(changed_csv_path, encoding="UTF-8") as metadata_csv:
+        metadata = parse_metadata(metadata_csv)
+
+    manifest = ImportManifest(manifest_path)
+    changes = manifest.diff_metadata(metadata)
+    assert changes.changed == ["2015-04-15-PM-___-_", "2015-04-29-PM-___-_"]
+    assert changes.removed == []
+
+    (reassignment,) = plan_speaker_reassignments(sessions_dir, metadata, manifest)
+    assert str(reassignment.session) == "2015-04-15-PM-___-_"
+    assert reassignment.speakers == {"MAR": "ROS"}
+    reassigned = [info for info in original if info.speaker == "MAR"]
+    assert reassignment.recordings == {
+        info.compute_sha256hash(): info._replace(speaker="ROS").compute_sha256hash()
+        for info in reassigned
+    }
+
+    manifest.record_metadata(reassignment.session, metadata[reassignment.session])
+    manifest.save()
+    # Only the session that could not be reassigned is imported again, and only
+    # its new recordings at that:
+    reimported = import_all(changed_csv_path)
+    assert len(reimported) == 2
+    assert all(str(info.session) == "2015-04-29-PM-___-_" for info in reimported)
+    assert all(info.speaker == "LOU" for info in reimported)
+
+
+def test_audio_is_not_decoded_when_recordings_exist(
+    sessions_dir: Path, metadata_csv_path: Path, destination: Path, monkeypatch
+) -> None:
+    """
+    When all of a track's recordings have been written, its audio is not
+    decoded again.
+    """
+    decoded = []
+    open_audio = extract_phrases.open_audio
+
+    def spy(sound_file, *args):
+        decoded.append(sound_file)
+        return open_audio(sound_file, *args)
+
+    monkeypatch.setattr(extract_phrases, "open_audio", spy)
+
+    def import_all():
+        initialize(
+            directory=sessions_dir,
+            transcoded_recordings_path=destination,
+            metadata_filename=metadata_csv_path,
+            import_recording=lambda info, path: None,
+            recording_format="wav",
+        )
+
+    import_all()
+    assert len(decoded) == 4
+
+    # Remove one recording: only its track needs to be decoded again.
+    decoded.clear()
+    sorted(destination.glob("*.wav"))[0].unlink()
+    import_all()
+    assert len(decoded) == 1
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_import_report(
+    sessions_dir: Path, metadata_csv_path: Path, destination: Path, jobs
+) -> None:
+    """
+    The report says what was extracted from each session, and how long each
+    stage took, even when extracting in several processes.
+    """
+    report = initialize(
+        directory=sessions_dir,
+        transcoded_recordings_path=destination,
+        metadata_filename=metadata_csv_path,
+        import_recording=lambda info, path: None,
+        recording_format="wav",
+        jobs=jobs,
+    )
+
+    assert report.recordings == 8
+    session = report.sessions["2015-04-15-PM-___-_"]
+    assert (session.text_grids, session.words, session.sentences) == (2, 2, 2)
+    assert not session.skipped
+
+    assert report.stage("parse").count == 4
+    assert report.stage("decode").count == 4
+    for stage in ("slice", "normalize", "encode", "insert"):
+        assert report.stage(stage).count == 8
+
+    report_path = destination / "report.json"
+    report.save(report_path)
+    contents = json.loads(report_path.read_text(encoding="UTF-8"))
+    assert contents["sessions"]["2015-04-29-PM-___-_"]["words"] == 2
+    assert "✅ 2015-04-29-PM-___-_" in report.summary()
+
+    # Everything is skipped the second time:
+    report = initialize(
+        directory=sessions_dir,
+        transcoded_recordings_path=destination,
+        metadata_filename=metadata_csv_path,
+        import_recording=lambda info, path: None,
+        recording_format="wav",
+        jobs=jobs,
+    )
+    assert report.recordings == 0
+    assert report.sessions["2015-04-15-PM-___-_"].skipped["already imported"] == 4
+    # That's not a problem:
+    assert "✅ 2015-04-15-PM-___-_" in report.summary()
+
+
+def test_resume_after_crash(
+    sessions_dir: Path, metadata_csv_path: Path, destination: Path
+) -> None:
+    """
+    An import that crashed resumes after the last TextGrid it finished, and
+    removes any recordings that it only partially wrote.
+    """
+    journal_path = destination / "import.journal"
+    imported = []
+
+    def import_all(crash_after=None):
+        def import_recording(info, path):
+            if len(imported) == crash_after:
+                raise MemoryError("Oh no!")
+            imported.append(info)
+
+        return initialize(
+            directory=sessions_dir,
+            transcoded_recordings_path=destination,
+            metadata_filename=metadata_csv_path,
+            import_recording=import_recording,
+            recording_format="wav",
+            journal=ImportJournal(journal_path),
+            # Don't check which recordings exist; only use the journal:
+            existing_recordings=lambda rec_ids: set(),
+        )
+
+    # Each track has one word and one sentence, so crash in the second track:
+    with pytest.raises(MemoryError):
+        import_all(crash_after=3)
+    assert journal_path.exists()
+    partial_path = destination / "0123abcd.partial.wav"
+    partial_path.write_bytes(b"RIFF")
+
+    report = import_all()
+
+    assert report.sessions["2015-04-15-PM-___-_"].skipped["resumed"] == 1
+    assert report.recordings == 6
+    # The first track was imported once, the second track twice:
+    assert len(imported) == 2 + 1 + 6
+    assert len(set(imported)) == 8
+    assert not partial_path.exists()
+    assert not journal_path.exists()
+
+
+def test_journal_survives_torn_line(sessions_dir: Path, destination: Path) -> None:
+    """
+    A line that was cut off by a crash is ignored, and does not swallow the
+    next line written to the journal.
+    """
+    journal_path = destination / "import.journal"
+    session_dir = sessions_dir / "2015-04-15-PM-___-_"
+    tracks = [
+        (session_dir / f"{mic}_001.TextGrid", session_dir / f"{mic}_001.wav")
+        for mic in (2, 3)
+    ]
+    ImportJournal(journal_path).record(*tracks[0])
+    with open(journal_path, "a", encoding="UTF-8") as journal_file:
+        journal_file.write('{"text_grid": "/oh/no')
+
+    journal = ImportJournal(journal_path)
+    journal.record(*tracks[1])
+
+    resumed = ImportJournal(journal_path)
+    assert all(resumed.is_done(*track) for track in tracks)
+
+
+def test_transcode_cache(
+    sessions_dir: Path,
+    metadata_csv_path: Path,
+    destination: Path,
+    tmp_path: Path,
+    monkeypatch,
+) -> None:
+    """
+    Audio is only encoded once, even if the recording's metadata changes.
+    """
+    encoded = []
+    encode = import_recordings.encode
+
+    def spy(audio, path, *args, **kwargs):
+        encoded.append(path)
+        return encode(audio, path, *args, **kwargs)
+
+    monkeypatch.setattr(import_recordings, "encode", spy)
+    cache = TranscodeCache(tmp_path / "cache")
+
+    def import_all():
+        initialize(
+            directory=sessions_dir,
+            transcoded_recordings_path=destination,
+            metadata_filename=metadata_csv_path,
+            import_recording=lambda info, path: None,
+            recording_format="wav",
+            transcode_cache=cache,
+        )
+
+    import_all()
+    assert len(list(destination.glob("*.wav"))) == 8
+    # Every track is a copy of the same audio, so there are only two distinct
+    # snippets: the word and the sentence.
+    assert len(encoded) == 2
+
+    # Correct a translation in one of the TextGrids:
+    text_grid = sessions_dir / "2015-04-29-PM-___-_" / "3_001.TextGrid"
+    text_grid.write_text(text_grid.read_text().replace('"puppy"', '"little dog"'))
+    before = set(destination.glob("*.wav"))
+    import_all()
+
+    # There's a new recording, but its audio was not encoded again:
+    assert len(encoded) == 2
+    (new_recording,) = set(destination.glob("*.wav")) - before
+    assert any(new_recording.samefile(old) for old in before)
+
+
+def test_transcode_cache_hit_is_a_hard_link(
+    sessions_dir: Path,
+    metadata_csv_path: Path,
+    destination: Path,
+    tmp_path: Path,
+    monkeypatch,
+) -> None:
+    """
+    Tagged audio is cached too, so a cache hit never runs ffmpeg.
+    """
+    cache = TranscodeCache(tmp_path / "cache")
+
+    def import_all(transcoded_recordings_path):
+        initialize(
+            directory=sessions_dir,
+            transcoded_recordings_path=transcoded_recordings_path,
+            metadata_filename=metadata_csv_path,
+            import_recording=lambda info, path: None,
+            transcode_cache=cache,
+        )
+
+    import_all(destination)
+    first_import = sorted(destination.glob("*.m4a"))
+    assert len(first_import) == 8
+
+    ffmpeg_runs = []
+    popen = subprocess.Popen
+
+    def spy(args, *rest, **kwargs):
+        if args[0] == AudioSegment.converter:
+            ffmpeg_runs.append(args)
+        return popen(args, *rest, **kwargs)
+
+    monkeypatch.setattr(subprocess, "Popen", spy)
+    again = tmp_path / "again"
+    again.mkdir()
+    import_all(again)
+
+    assert ffmpeg_runs == []
+    for recording in first_import:
+        assert (again / recording.name).samefile(recording)
+
+
+def test_transcode_cache_key_depends_on_encoder(tmp_path: Path) -> None:
+    """
+    Encoders don't make identical files, so each one gets its own cache entry.
+    """
+    cache = TranscodeCache(tmp_path / "cache")
+    audio = AudioSegment.silent(duration=100)
+    parameters = {"bitrate": "64k"}
+    assert cache.key_for(audio, parameters, "pydub") != cache.key_for(
+        audio, parameters, "pyav"
+    )
+
+
+def test_extra_formats(
+    sessions_dir: Path, metadata_csv_path: Path, destination: Path
+) -> None:
+    """
+    Recordings can be saved as Opus too, right next to the .m4a files.
+    """
+    imported = []
+    initialize(
+        directory=sessions_dir,
+        transcoded_recordings_path=destination,
+        metadata_filename=metadata_csv_path,
+        import_recording=lambda info, path: imported.append((info, path)),
+        extra_formats=["webm"],
+    )
+
+    assert len(imported) == 8
+    for info, path in imported:
+        assert path.suffix == ".m4a"
+        opus = path.with_suffix(".webm")
+        # WebM files start with an EBML header:
+        blob = opus.read_bytes()
+        assert blob[:4] == b"\x1a\x45\xdf\xa3"
+        assert b"webm" in blob[:64]
+        assert info.speaker.encode("UTF-8") in blob
+
+
+def test_bitrate_ladder(
+    sessions_dir: Path, metadata_csv_path: Path, destination: Path
+) -> None:
+    """
+    Lower tiers of the bitrate ladder are saved in every format.
+    """
+    imported = []
+    initialize(
+        directory=sessions_dir,
+        transcoded_recordings_path=destination,
+        metadata_filename=metadata_csv_path,
+        import_recording=lambda info, path: imported.append(path),
+        extra_formats=["webm"],
+        tiers=LADDER_TIERS,
+    )
+
+    assert len(imported) == 8
+    for path in imported:
+        rec_id = path.stem
+        for audio_format in "m4a", "webm":
+            low, medium, high = [
+                destination / f"{rec_id}.{tier}{audio_format}"
+                for tier in ("low.", "medium.", "")
+            ]
+            sizes = [low.stat().st_size, medium.stat().st_size, high.stat().st_size]
+            assert sizes == sorted(sizes), f"{audio_format}: {sizes}"
+            assert sizes[0] < sizes[2]
+
+
+def test_speech_profile(
+    sessions_dir: Path, metadata_csv_path: Path, destination: Path
+) -> None:
+    """
+    The speech profile is applied before encoding, and the report says how
+    much it saved.
+    """
+    report = initialize(
+        directory=sessions_dir,
+        transcoded_recordings_path=destination,
+        metadata_filename=metadata_csv_path,
+        import_recording=lambda info, path: None,
+        recording_format="wav",
+        profile=SpeechProfile(frame_rate=16000),
+    )
+
+    for path in destination.glob("*.wav"):
+        assert AudioSegment.from_wav(str(path)).frame_rate == 16000
+    assert report.profile.count == 8
+    assert report.stage("profile").count == 8
+    assert 0 < report.profile.bytes_after < report.profile.bytes_before
+    assert "speech profile" in report.summary()
+
+
+def test_measurements_are_saved(
+    sessions_dir: Path, metadata_csv_path: Path, destination: Path
+) -> None:
+    """
+    Each recording's loudness and problems are saved next to it, measured
+    before encoding. Unusable recordings are still imported, but the report
+    counts them; merely truncated recordings are not unusable.
+    """
+    imported = []
+    report = initialize(
+        directory=sessions_dir,
+        transcoded_recordings_path=destination,
+        metadata_filename=metadata_csv_path,
+        import_recording=lambda info, path: imported.append(path),
+        recording_format="wav",
+    )
+
+    assert len(imported) == 8
+    for path in imported:
+        measurements = read_measurements(path)
+        assert measurements is not None
+        loudness = measurements.loudness
+        assert loudness.duration == len(AudioSegment.from_wav(str(path)))
+        assert loudness.peak is not None and loudness.peak <= 0.0
+        assert max(loudness.waveform) > 0
+        # The fixture's intervals cut "acimosis" off in the middle:
+        assert measurements.problems == [TRUNCATED]
+    assert read_measurements(destination / "missing.wav") is None
+    assert report.stage("assess").count == 8
+    assert sum(session.unusable for session in report.sessions.values()) == 0
+    assert "unusable" not in report.summary()
+
+
+def test_quality_analyzer_settings(
+    sessions_dir: Path, metadata_csv_path: Path, destination: Path
+) -> None:
+    """
+    The quality analyzer's thresholds can be changed.
+    """
+    imported = []
+    report = initialize(
+        directory=sessions_dir,
+        transcoded_recordings_path=destination,
+        metadata_filename=metadata_csv_path,
+        import_recording=lambda info, path: imported.append(path),
+        recording_format="wav",
+        # Nothing is loud enough for this:
+        analyzer=QualityAnalyzer(silence_threshold=0.0),
+    )
+
+    assert len(imported) == 8
+    for path in imported:
+        assert read_measurements(path).problems == [SILENT]
+    assert sum(session.unusable for session in report.sessions.values()) == 8
+    assert "(4 unusable)" in report.summary()
+
+
+@pytest.fixture
+def destination(_temporary_data_directory: Path) -> Path:
+    """
+    Where to write audio files.
+    """
+    audio_dir = _temporary_data_directory / "audio"
+    audio_dir.mkdir()
+    return audio_dir
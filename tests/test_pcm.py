@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pathlib import Path
+
+import pytest  # type: ignore
+from hypothesis import given  # type: ignore
+from hypothesis.strategies import binary, floats, lists, sampled_from  # type: ignore
+from pydub import AudioSegment  # type: ignore
+from pydub.generators import Sine  # type: ignore
+
+from librecval.pcm import (
+    WAVEFORM_BINS,
+    channel_of,
+    loudness_of,
+    normalize_peak,
+    normalize_peaks,
+    sound_bounds,
+)
+
+
+def test_normalize_like_pydub(wave_file_path: Path) -> None:
+    """
+    Normalizing snippets of a real recording produces the exact same samples
+    as pydub.
+    """
+    sound = AudioSegment.from_file(str(wave_file_path))
+    sound_bites = [sound[start : start + 300] for start in range(0, len(sound), 100)]
+
+    normalized = normalize_peaks(sound_bites)
+
+    assert len(normalized) == len(sound_bites)
+    for actual, original in zip(normalized, sound_bites):
+        assert actual.raw_data == original.normalize(headroom=0.1).raw_data
+        assert actual.frame_rate == original.frame_rate
+        assert actual.channels == original.channels
+
+
+@given(
+    sample_width=sampled_from([1, 2, 4]),
+    chunks=lists(binary(max_size=64), max_size=5),
+    headroom=floats(min_value=0.0, max_value=20.0),
+)
+def test_normalize_arbitrary_samples(sample_width, chunks, headroom) -> None:
+    """
+    Any samples are normalized exactly like pydub does, including silence,
+    empty segments, and samples at the extremes of the range.
+    """
+    segments = [
+        AudioSegment(
+            data=chunk[: len(chunk) - len(chunk) % sample_width],
+            sample_width=sample_width,
+            frame_rate=8000,
+            channels=1,
+        )
+        for chunk in chunks
+    ]
+
+    normalized = normalize_peaks(segments, headroom=headroom)
+
+    assert [s.raw_data for s in normalized] == [
+        s.normalize(headroom=headroom).raw_data for s in segments
+    ]
+
+
+@pytest.mark.parametrize("sample_width", [1, 2, 4])
+def test_normalize_most_negative_sample(sample_width) -> None:
+    """
+    The most negative sample is louder than the most positive sample.
+    """
+    most_negative = b"\x00" * (sample_width - 1) + b"\x80"
+    segment = AudioSegment(
+        data=most_negative + b"\x01" + b"\x00" * (sample_width - 1),
+        sample_width=sample_width,
+        frame_rate=8000,
+        channels=1,
+    )
+    expected = segment.normalize(headroom=0.1)
+    assert normalize_peak(segment).raw_data == expected.raw_data
+
+
+@pytest.mark.parametrize("channels", [1, 2])
+@pytest.mark.parametrize("frame_rate", [8000, 16000, 44100])
+def test_sound_bounds(channels, frame_rate) -> None:
+    """
+    Finds where the sound starts and ends, to within a chunk.
+    """
+    silence = AudioSegment.silent(duration=500, frame_rate=frame_rate)
+    tone = Sine(440, sample_rate=frame_rate).to_audio_segment(duration=300)
+    audio = (silence + tone + silence).set_channels(channels)
+
+    start, end = sound_bounds(audio, threshold=-50.0, chunk_length=10)
+    assert 490 <= start <= 500
+    assert 800 <= end <= 810
+
+
+def test_sound_bounds_of_silence() -> None:
+    assert sound_bounds(AudioSegment.silent(duration=500)) is None
+    assert sound_bounds(AudioSegment.empty()) is None
+
+
+@pytest.mark.parametrize("sample_width", [1, 2, 3, 4])
+def test_channel_of(sample_width) -> None:
+    """
+    Each channel comes out as mono audio, with the same samples.
+    """
+    left = Sine(440).to_audio_segment(duration=100).set_sample_width(sample_width)
+    right = Sine(660).to_audio_segment(duration=100).set_sample_width(sample_width)
+    stereo = AudioSegment.from_mono_audiosegments(left, right)
+
+    for channel, expected in enumerate((left, right)):
+        mono = channel_of(stereo, channel)
+        assert mono.channels == 1
+        assert mono.frame_rate == stereo.frame_rate
+        assert mono.raw_data == expected.raw_data
+
+
+def test_loudness_like_pydub(wave_file_path: Path) -> None:
+    """
+    Levels are measured exactly like pydub measures them.
+    """
+    sound = AudioSegment.from_file(str(wave_file_path))[:2000]
+
+    loudness = loudness_of(sound)
+
+    assert loudness.duration == len(sound)
+    assert loudness.peak == pytest.approx(sound.max_dBFS)
+    assert loudness.rms == pytest.approx(sound.dBFS)
+    assert len(loudness.waveform) == WAVEFORM_BINS
+    assert all(0 <= level <= 100 for level in loudness.waveform)
+
+
+def test_loudness_waveform() -> None:
+    """
+    The waveform follows the audio, even when it's shorter than the waveform.
+    """
+    quiet = Sine(440).to_audio_segment(duration=500, volume=-20.0)
+    loud = Sine(440).to_audio_segment(duration=500, volume=0.0)
+
+    waveform = loudness_of(quiet + loud, bins=4).waveform
+    assert waveform[0] == waveform[1] == 10
+    assert waveform[2] == waveform[3] == 100
+
+    assert len(loudness_of(loud[:1], bins=WAVEFORM_BINS).waveform) == WAVEFORM_BINS
+
+
+def test_loudness_of_silence() -> None:
+    loudness = loudness_of(AudioSegment.silent(duration=500))
+    assert loudness.duration == 500
+    assert loudness.peak is None and loudness.rms is None
+    assert loudness.waveform == [0] * WAVEFORM_BINS
+    assert loudness_of(AudioSegment.empty()).duration == 0
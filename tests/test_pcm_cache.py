@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+from pathlib import Path
+
+from pydub import AudioSegment  # type: ignore
+from pydub.generators import Sine  # type: ignore
+
+from librecval import extract_phrases
+from librecval.extract_phrases import WaveFile, open_audio
+from librecval.pcm_cache import PCMCache
+
+
+def test_decoded_audio_is_cached(
+    monkeypatch, wave_file_path: Path, tmp_path: Path
+) -> None:
+    """
+    A master that has to be decoded is only decoded once; after that, it is
+    memory-mapped from the cache, even if it was renamed.
+    """
+    # Pretend this is a format that has to be decoded:
+    master = tmp_path / "master.flac"
+    shutil.copyfile(wave_file_path, master)
+    decoded = []
+    from_file = AudioSegment.from_file
+
+    def decode(sound_file, *args, **kwargs):
+        decoded.append(sound_file)
+        return from_file(sound_file, "wav", *args, **kwargs)
+
+    monkeypatch.setattr(extract_phrases.AudioSegment, "from_file", decode)
+    cache = PCMCache(tmp_path / "cache", max_size=10 ** 9)
+
+    with open_audio(master, cache) as first:
+        assert isinstance(first, AudioSegment)
+        expected = first[100:400]
+    renamed = master.rename(tmp_path / "renamed.flac")
+    with open_audio(renamed, cache) as second:
+        assert isinstance(second, WaveFile)
+        assert second[100:400].raw_data == expected.raw_data
+        assert second.frame_rate == expected.frame_rate
+
+    assert len(decoded) == 1
+
+
+def test_least_recently_used_audio_is_evicted(tmp_path: Path) -> None:
+    tone = Sine(440).to_audio_segment(duration=1000)
+    size = len(tone.raw_data) + 100
+    cache = PCMCache(tmp_path, max_size=2 * size)
+
+    oldest = cache.put("aa", tone)
+    newest = cache.put("bb", tone)
+    # Using the oldest makes it the newest:
+    os.utime(newest, ns=(0, 0))
+    os.utime(oldest, ns=(0, 0))
+    assert cache.get("aa") == oldest
+
+    cache.put("cc", tone)
+
+    assert cache.get("aa") == oldest
+    assert cache.get("bb") is None
+    assert cache.get("cc") is not None
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pathlib import Path
+
+from pydub import AudioSegment  # type: ignore
+from pydub.generators import Sine, WhiteNoise  # type: ignore
+
+from librecval.pcm import normalize_peak, samples_of
+from librecval.quality import (
+    CLIPPED,
+    NOISY,
+    SILENT,
+    TRUNCATED,
+    QualityAnalyzer,
+    clipped_fraction,
+)
+
+
+def test_clean_recording(wave_file_path: Path) -> None:
+    """
+    A good recording has no problems, whether or not it's normalized.
+    """
+    audio = AudioSegment.from_file(str(wave_file_path))
+    for recording in audio, normalize_peak(audio):
+        assessment = QualityAnalyzer().assess(recording)
+        assert assessment.problems == []
+        assert not assessment.is_unusable
+        assert assessment.clipped == 0.0
+        assert assessment.snr > 10.0
+
+
+def test_clipped_recording(wave_file_path: Path) -> None:
+    """
+    Clipping is found, even once the flat tops are normalized.
+    """
+    # Way too much gain:
+    audio = AudioSegment.from_file(str(wave_file_path)) + 20
+    for recording in audio, normalize_peak(audio):
+        assessment = QualityAnalyzer().assess(recording)
+        assert CLIPPED in assessment.problems
+        assert assessment.is_unusable
+
+
+def test_crests_are_not_clipping() -> None:
+    """
+    The crests of a loud, low tone are not mistaken for clipping.
+    """
+    tone = Sine(80).to_audio_segment(duration=1000, volume=-0.1)
+    assert clipped_fraction(samples_of(tone)) == 0.0
+
+
+def test_noisy_recording() -> None:
+    noise = WhiteNoise().to_audio_segment(duration=1000)
+    assert QualityAnalyzer().assess(noise).problems == [NOISY]
+
+
+def test_silent_recording(wave_file_path: Path) -> None:
+    analyzer = QualityAnalyzer()
+    quiet = AudioSegment.from_file(str(wave_file_path)) - 45
+    assert analyzer.assess(quiet).problems == [SILENT]
+    assert analyzer.assess(AudioSegment.silent(duration=500)).problems == [SILENT]
+    assert analyzer.assess(AudioSegment.empty()).problems == [SILENT]
+
+
+def test_truncated_recording(wave_file_path: Path) -> None:
+    """
+    A recording that starts in the middle of speech is truncated.
+    """
+    audio = AudioSegment.from_file(str(wave_file_path))
+    assessment = QualityAnalyzer().assess(audio[400:])
+    assert assessment.problems == [TRUNCATED]
+    # Plenty of fine recordings start or end loud, so that's for a person to judge:
+    assert not assessment.is_unusable
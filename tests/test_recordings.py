@@ -16,15 +16,23 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import warnings
+import sys
 import tempfile
-from uuid import uuid4
+import warnings
 from pathlib import Path
+from uuid import uuid4
 
 import pytest  # type: ignore
 from pydub.generators import Square  # type: ignore
 
-from librecval.transcode_recording import transcode_to_aac
+from librecval.transcode_recording import (
+    ENCODERS,
+    AACEncoder,
+    PyAVEncoder,
+    PydubEncoder,
+    get_encoder,
+    transcode_to_aac,
+)
 
 
 def test_can_transcode_wave_file(
@@ -87,6 +95,59 @@ def test_can_recover_metadata(wave_file_path: Path, temporary_directory: Path) -
     assert b"2015" in blob
 
 
+def test_get_encoder() -> None:
+    """
+    pydub is the default encoder; PyAV has to be asked for (and installed).
+    """
+    assert isinstance(get_encoder(), PydubEncoder)
+    with pytest.raises(TypeError):
+        AACEncoder()  # type: ignore
+    with pytest.raises(ValueError):
+        get_encoder("lame")
+    if PyAVEncoder.is_available():
+        assert isinstance(get_encoder("pyav"), PyAVEncoder)
+
+
+def test_get_encoder_without_pyav(monkeypatch) -> None:
+    """
+    Asking for PyAV when it isn't installed is an error, not a crash halfway
+    through an import.
+    """
+    # Importing a module that's None in sys.modules raises ImportError:
+    monkeypatch.setitem(sys.modules, "av", None)
+    assert not PyAVEncoder.is_available()
+    with pytest.raises(ValueError, match="PyAV is not installed"):
+        get_encoder("pyav")
+    # pydub still works, since it only needs ffmpeg:
+    assert isinstance(get_encoder("pydub"), PydubEncoder)
+
+
+@pytest.mark.parametrize("name", sorted(ENCODERS))
+def test_encoders_write_the_same_tags(name: str, temporary_directory: Path) -> None:
+    """
+    Every encoder writes an .m4a file, with the same tags.
+    """
+    if name == "pyav" and not PyAVEncoder.is_available():
+        pytest.skip("PyAV is not installed")
+    encoder = ENCODERS[name]()
+    destination = temporary_directory / f"{uuid4()}.m4a"
+
+    acimosis = "ᐊᒋᒧᓯᐢ"
+    transcode_to_aac(
+        Square(441).to_audio_segment(),
+        destination,
+        encoder,
+        tags=dict(title=acimosis, artist="SPEAKER", album="2015-12-03", year=2015),
+    )
+
+    blob = destination.read_bytes()
+    assert b"ftyp" == blob[4:8]
+    assert b"M4A " == blob[8:12]
+    assert acimosis.encode("UTF-8") in blob
+    assert b"SPEAKER" in blob
+    assert b"2015-12-03" in blob
+
+
 @pytest.fixture
 def temporary_directory():
     with tempfile.TemporaryDirectory() as name:
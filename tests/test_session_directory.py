@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for finding a TextGrid's audio in a session directory.
+"""
+
+import os
+from pathlib import Path
+
+from librecval import session_directory
+from librecval.session_directory import SessionDirectory
+
+
+def test_audacity_format(tmp_path: Path) -> None:
+    for name in ("2_001.TextGrid", "2_001.wav", "3_001.TextGrid", "notes.txt"):
+        (tmp_path / name).touch()
+
+    directory = SessionDirectory(tmp_path)
+    assert directory.text_grids == [
+        tmp_path / "2_001.TextGrid",
+        tmp_path / "3_001.TextGrid",
+    ]
+    assert directory.audio_for(tmp_path / "2_001.TextGrid") == tmp_path / "2_001.wav"
+    assert directory.audio_for(tmp_path / "3_001.TextGrid") is None
+
+
+def test_audition_format(tmp_path: Path) -> None:
+    recorded_dir = tmp_path / "2018-01-07am_Recorded"
+    recorded_dir.mkdir()
+    (tmp_path / "2018-01-07am.sesx").touch()
+    (tmp_path / "Track 2_001.TextGrid").touch()
+    (recorded_dir / "Track 2_001.wav").touch()
+
+    directory = SessionDirectory(tmp_path)
+    (text_grid,) = directory.text_grids
+    assert directory.audio_for(text_grid) == recorded_dir / "Track 2_001.wav"
+    assert directory.wave_files == []
+
+
+def test_audition_format_needs_exactly_one_sesx_file(tmp_path: Path) -> None:
+    for stem in ("2018-01-07am", "2018-01-07am-copy"):
+        (tmp_path / f"{stem}_Recorded").mkdir()
+        (tmp_path / f"{stem}_Recorded" / "2_001.wav").touch()
+        (tmp_path / f"{stem}.sesx").touch()
+
+    directory = SessionDirectory(tmp_path)
+    assert directory.audio_for(tmp_path / "2_001.TextGrid") is None
+
+
+def test_lists_each_directory_once(tmp_path: Path, monkeypatch) -> None:
+    recorded_dir = tmp_path / "2018-01-07am_Recorded"
+    recorded_dir.mkdir()
+    (tmp_path / "2018-01-07am.sesx").touch()
+    for mic in (2, 3, 4):
+        (tmp_path / f"{mic}_001.TextGrid").touch()
+        (recorded_dir / f"{mic}_001.wav").touch()
+
+    listed = []
+    scandir = os.scandir
+
+    def spy(path):
+        listed.append(Path(path))
+        return scandir(path)
+
+    monkeypatch.setattr(session_directory.os, "scandir", spy)
+
+    directory = SessionDirectory(tmp_path)
+    for text_grid in directory.text_grids:
+        assert directory.audio_for(text_grid) is not None
+    assert listed == [tmp_path, recorded_dir]
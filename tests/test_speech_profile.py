@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pathlib import Path
+
+import pytest  # type: ignore
+from pydub import AudioSegment  # type: ignore
+from pydub.generators import Sine  # type: ignore
+
+from librecval.speech_profile import SpeechProfile
+from librecval.transcode_recording import transcode_to_aac
+
+
+def test_trims_silence_and_resamples() -> None:
+    silence = AudioSegment.silent(duration=1000, frame_rate=48000)
+    tone = Sine(440, sample_rate=48000).to_audio_segment(duration=500)
+    audio = silence + tone + silence
+
+    profiled = SpeechProfile(padding=100, frame_rate=16000).apply(audio)
+
+    assert profiled.frame_rate == 16000
+    # The tone, and 100 ms on either side (give or take a chunk):
+    assert 690 <= len(profiled) <= 720
+
+
+def test_leaves_silence_and_low_rates_alone() -> None:
+    silence = AudioSegment.silent(duration=1000, frame_rate=8000)
+    profiled = SpeechProfile(frame_rate=16000).apply(silence)
+    assert len(profiled) == 1000
+    assert profiled.frame_rate == 8000
+
+
+def test_does_not_mix_down_to_mono() -> None:
+    """
+    Snippets are one mic's channel; a stereo snippet is a bug, which the
+    encoders' mono check should catch, rather than be hidden by a downmix.
+    """
+    tone = Sine(440).to_audio_segment(duration=500)
+    stereo = AudioSegment.from_mono_audiosegments(tone, tone)
+
+    profiled = SpeechProfile().apply(stereo)
+
+    assert profiled.channels == 2
+    with pytest.raises(AssertionError, match="not mono"):
+        transcode_to_aac(profiled, Path("stereo.m4a"))
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for importing sessions with several workers.
+"""
+
+from pathlib import Path
+
+import pytest  # type: ignore
+
+from librecval.extract_phrases import RecordingInfo
+from librecval.recording_session import SessionID
+from librecval.work_queue import (
+    SessionQueue,
+    record_recording,
+    recordings_in,
+    run_coordinator,
+    run_worker,
+)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
+
+
+@pytest.fixture
+def queue(tmp_path: Path, clock: Clock) -> SessionQueue:
+    queue = SessionQueue(tmp_path / "queue.sqlite3", lease_seconds=60, clock=clock)
+    assert queue.add(["2015-04-15-PM-___-_", "2015-04-29-PM-___-_"]) == 2
+    # Sessions are only queued once:
+    assert queue.add(["2015-04-15-PM-___-_"]) == 0
+    return queue
+
+
+def test_each_session_is_claimed_once(queue: SessionQueue, tmp_path: Path) -> None:
+    first = queue.claim("alpha")
+    second = queue.claim("beta")
+    assert first is not None and second is not None
+    assert first.session != second.session
+    assert queue.claim("gamma") is None
+
+    assert queue.finish(first, tmp_path / "first")
+    assert queue.extracted() == [(first.session, tmp_path / "first")]
+    queue.mark_committed(first.session)
+    assert not queue.is_drained()
+
+    assert queue.finish(second, tmp_path / "second")
+    queue.mark_committed(second.session)
+    assert queue.is_drained()
+    assert queue.counts()["committed"] == 2
+
+
+def test_abandoned_claims_are_retried(
+    queue: SessionQueue, clock: Clock, tmp_path: Path
+) -> None:
+    abandoned = queue.claim("alpha")
+    alive = queue.claim("beta")
+
+    clock.now += 40
+    assert queue.heartbeat(alive)
+    clock.now += 40
+    # alpha's lease ran out, but beta kept renewing its lease:
+    retry = queue.claim("gamma")
+    assert retry is not None
+    assert retry.session == abandoned.session
+    assert retry.attempt == 2
+    assert queue.claim("delta") is None
+
+    # alpha comes back to life, but it's too late:
+    assert not queue.heartbeat(abandoned)
+    assert not queue.finish(abandoned, tmp_path / "alpha")
+    assert queue.finish(retry, tmp_path / "gamma")
+    assert queue.extracted()[0] == (retry.session, tmp_path / "gamma")
+
+
+def test_sessions_fail_after_too_many_attempts(
+    queue: SessionQueue, clock: Clock
+) -> None:
+    for attempt in range(1, queue.max_attempts + 1):
+        claim = queue.claim("alpha")
+        assert claim.attempt == attempt
+        queue.release(claim, "could not decode")
+    # The session that failed was first; the other one is still fine:
+    assert queue.counts()["failed"] == 1
+
+    # Workers that keep dying on the other one count as failures too:
+    for attempt in range(1, queue.max_attempts + 1):
+        claim = queue.claim("beta")
+        assert claim.attempt == attempt
+        clock.now += 61
+    assert queue.claim("beta") is None
+    assert queue.counts()["failed"] == 2
+    assert queue.is_drained()
+
+
+def test_workers_and_coordinator(queue: SessionQueue, tmp_path: Path) -> None:
+    def extract(claim, output):
+        (output / "recording.m4a").write_bytes(b"half-written")
+        if claim.session.startswith("2015-04-29") and claim.attempt == 1:
+            raise RuntimeError("worker crashed")
+
+    committed = []
+
+    assert run_worker(queue, "alpha", extract, tmp_path, poll_seconds=0) == 2
+    # What the crashed attempt left behind is gone:
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "2015-04-15-PM-___-_.alpha.1",
+        "2015-04-29-PM-___-_.alpha.2",
+        "queue.sqlite3",
+    ]
+
+    def commit(session, output):
+        committed.append(output.name)
+
+    assert run_coordinator(queue, commit, poll_seconds=0) == 2
+    assert committed == ["2015-04-15-PM-___-_.alpha.1", "2015-04-29-PM-___-_.alpha.2"]
+    assert queue.is_drained()
+
+
+def test_recordings_list(tmp_path: Path) -> None:
+    info = RecordingInfo(
+        SessionID.from_name("2015-04-15-PM-___-_"),
+        "LOU",
+        "word",
+        100,
+        "acimosis",
+        "puppy",
+    )
+    recording_path = tmp_path / f"{info.compute_sha256hash()}.m4a"
+    record_recording(tmp_path, info, recording_path)
+
+    assert list(recordings_in(tmp_path)) == [(info, recording_path)]
+    assert list(recordings_in(tmp_path / "nothing-here")) == []
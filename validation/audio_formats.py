@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Chooses which format to serve a recording's audio in.
+
+Every recording has .m4a audio, which every browser can play. Recordings may
+also have Opus audio (in .webm files), which is much smaller, but not
+supported by every browser (e.g., Safari).
+
+Recordings may also have lower bitrate versions of their audio, for clients
+on slow or metered connections: the tiers of the bitrate ladder.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+# The format that every recording has.
+DEFAULT_AUDIO_FORMAT = "m4a"
+
+# The Content-Type to serve each format with.
+AUDIO_CONTENT_TYPES: Dict[str, str] = {"m4a": "audio/m4a", "webm": "audio/webm"}
+
+# The tiers of the bitrate ladder, from the fewest bytes to the most. See
+# librecval.import_recordings.BITRATE_LADDER.
+TIERS = ("low", "medium", "high")
+# The top of the ladder: the recording itself.
+DEFAULT_TIER = "high"
+
+# A format, and a tier of the bitrate ladder (None for the top of the ladder).
+AudioVariant = Tuple[str, Optional[str]]
+
+# The media types (in an Accept header) that each format satisfies.
+ACCEPTABLE_MEDIA_TYPES: Dict[str, Tuple[str, ...]] = {
+    "m4a": ("audio/m4a", "audio/x-m4a", "audio/mp4", "audio/aac"),
+    "webm": ("audio/webm",),
+}
+
+
+def preferred_audio_formats(request) -> List[str]:
+    """
+    Returns every audio format, in the order the client prefers them.
+
+    A ?format= query parameter always comes first. Otherwise, formats are
+    ordered by the Accept header. Wildcards (e.g., audio/*) don't express a
+    preference, so unless the client asks for Opus more than AAC, the
+    default format comes first.
+    """
+    formats = list(AUDIO_CONTENT_TYPES)
+    # Stable sorts keep the default format ahead in case of ties:
+    formats.sort(key=lambda audio_format: audio_format != DEFAULT_AUDIO_FORMAT)
+
+    weights = parse_accept(request.headers.get("Accept", ""))
+    formats.sort(key=lambda audio_format: -quality_of(audio_format, weights))
+
+    requested = request.GET.get("format")
+    if requested in formats:
+        formats.remove(requested)
+        formats.insert(0, requested)
+    return formats
+
+
+def preferred_tier(request) -> str:
+    """
+    Returns the tier of the bitrate ladder that the client wants. A ?tier=
+    query parameter always wins. Otherwise, clients that ask to save data
+    (with the Save-Data header) get the bottom of the ladder.
+    """
+    requested = request.GET.get("tier")
+    if requested in TIERS:
+        return requested
+    if request.headers.get("Save-Data", "").strip().lower() == "on":
+        return TIERS[0]
+    return DEFAULT_TIER
+
+
+def preferred_audio_variants(request) -> List[AudioVariant]:
+    """
+    Returns every variant of a recording's audio, in the order the client
+    prefers them. The format matters most, since the client may not be able
+    to play some of them. If the preferred tier is missing, the top of the
+    ladder will do.
+    """
+    tier = preferred_tier(request)
+    tiers = [None] if tier == DEFAULT_TIER else [tier, None]
+    return [
+        (audio_format, audio_tier)
+        for audio_format in preferred_audio_formats(request)
+        for audio_tier in tiers
+    ]
+
+
+def quality_of(audio_format: str, weights: Dict[str, float]) -> float:
+    """
+    How much the client wants the format, from 0.0 (not at all) to 1.0.
+    """
+    explicit = [
+        weights[media_type]
+        for media_type in ACCEPTABLE_MEDIA_TYPES[audio_format]
+        if media_type in weights
+    ]
+    if explicit:
+        return max(explicit)
+    return weights.get("audio/*", weights.get("*/*", 0.0))
+
+
+def parse_accept(header: str) -> Dict[str, float]:
+    """
+    Parses an Accept header, returning the quality of every media type.
+
+    >>> parse_accept("audio/webm,audio/*;q=0.9,*/*;q=0.5")
+    {'audio/webm': 1.0, 'audio/*': 0.9, '*/*': 0.5}
+    >>> parse_accept("")
+    {}
+    """
+    weights: Dict[str, float] = {}
+    for media_range in header.split(","):
+        media_type, *parameters = media_range.split(";")
+        media_type = media_type.strip().lower()
+        if not media_type:
+            continue
+
+        quality = 1.0
+        for parameter in parameters:
+            name, _equals, value = parameter.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[media_type] = quality
+    return weights
@@ -21,6 +21,8 @@ def environment(**options):
 
     # Register filters
     env.filters["audio_url"] = audio_url_filter
+    env.filters["duration"] = duration_filter
+    env.filters["loudness"] = loudness_filter
 
     return env
 
@@ -40,3 +42,25 @@ def audio_url_filter(rec) -> str:
          <source src="{{ recording | audio_url }}" type="audio/aac" />
     """
     return rec.compressed_audio.url
+
+
+def duration_filter(milliseconds) -> str:
+    """
+    Filter that formats a duration in milliseconds, e.g., "1.2 s". Unknown
+    durations (None) are blank.
+    """
+    if milliseconds is None:
+        return ""
+    return f"{milliseconds / 1000:.1f} s"
+
+
+def loudness_filter(rec) -> str:
+    """
+    Filter that describes how loud the recording is, e.g.,
+    "peak -0.9 dBFS, RMS -18.3 dBFS".
+    """
+    levels = {"peak": rec.peak_dbfs, "RMS": rec.rms_dbfs}
+    return ", ".join(
+        f"{name} {level:.1f} dBFS" if level is not None else f"{name} silent"
+        for name, level in levels.items()
+    )
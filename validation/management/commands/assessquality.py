@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Marks recordings that are obviously unusable (clipped, noisy, or silent),
+e.g., recordings that were imported before they were assessed
+automatically. Recordings that already have a quality are left alone.
+
+Usage:
+
+    python manage.py assessquality [--jobs N] [--dry-run]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from os import fspath
+from typing import Optional
+
+from django.core.management.base import BaseCommand, CommandError  # type: ignore
+from pydub import AudioSegment  # type: ignore
+from pydub.exceptions import CouldntDecodeError  # type: ignore
+
+from librecval.quality import Assessment, QualityAnalyzer
+from validation.models import Recording
+
+
+class Command(BaseCommand):
+    help = "marks obviously unusable recordings that have no quality yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help="how many recordings to decode at once (default: 1)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="only list the unusable recordings; do not mark them",
+        )
+
+    def handle(
+        self, *args, jobs: int = 1, dry_run: bool = False, verbosity: int = 1, **options
+    ) -> None:
+        if jobs < 1:
+            raise CommandError(f"--jobs must be at least 1, not {jobs}")
+
+        analyzer = QualityAnalyzer()
+        # Every field is loaded up front: saving a recording copies all of them
+        # into its history, and deferred fields would be fetched one by one.
+        recordings = list(Recording.objects.filter(quality=""))
+
+        unusable = failed = 0
+        with ThreadPoolExecutor(jobs) as pool:
+            assessments = pool.map(lambda r: assess(r, analyzer), recordings)
+            for recording, assessment in zip(recordings, assessments):
+                if assessment is None:
+                    failed += 1
+                    self.stderr.write(f"Could not decode {recording.id}")
+                    continue
+                if not assessment.is_unusable:
+                    continue
+
+                unusable += 1
+                if dry_run or verbosity > 1:
+                    problems = ", ".join(assessment.problems)
+                    self.stdout.write(f"{recording.id}: {problems}")
+                if not dry_run:
+                    # Saved one by one, so that the change is in its history:
+                    recording.quality = Recording.UNUSABLE
+                    recording.save(update_fields=["quality"])
+
+        self.stdout.write(
+            f"Assessed {len(recordings) - failed} recordings; "
+            f"{unusable} unusable; {failed} could not be decoded"
+        )
+
+
+def assess(recording: Recording, analyzer: QualityAnalyzer) -> Optional[Assessment]:
+    """
+    Decodes the recording's audio, and assesses it. Returns None if the audio
+    could not be decoded.
+    """
+    field = recording.compressed_audio
+    try:
+        try:
+            audio = AudioSegment.from_file(fspath(field.storage.path(field.name)))
+        except NotImplementedError:
+            # Not stored locally, so let ffmpeg read it from a temporary file.
+            with field.open("rb") as audio_file:
+                audio = AudioSegment.from_file(audio_file)
+    except (CouldntDecodeError, OSError):
+        return None
+    return analyzer.assess(audio)
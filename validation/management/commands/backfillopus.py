@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Encodes Opus audio (.webm) for recordings that only have .m4a audio, e.g.,
+recordings that were imported before Opus audio existed.
+
+Usage:
+
+    python manage.py backfillopus [--jobs N]
+"""
+
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from subprocess import CalledProcessError
+
+from django.core.management.base import BaseCommand, CommandError  # type: ignore
+
+from librecval.transcode_recording import OPUS_EXPORT_PARAMETERS, transcode_file
+from validation.management.commands.importrecordings import (
+    staging_directory,
+    store_extra_audio,
+)
+from validation.models import Recording
+
+AUDIO_FORMAT = "webm"
+
+
+class Command(BaseCommand):
+    help = "encodes Opus audio for recordings that don't have it yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help="how many recordings to transcode at once (default: 1)",
+        )
+
+    def handle(self, *args, jobs: int = 1, **options) -> None:
+        if jobs < 1:
+            raise CommandError(f"--jobs must be at least 1, not {jobs}")
+
+        recordings = [
+            recording
+            for recording in Recording.objects.all()
+            if (AUDIO_FORMAT, None) not in recording.extra_audio_variants
+        ]
+
+        encoded = failed = 0
+        with staging_directory() as staging_dir, ThreadPoolExecutor(jobs) as pool:
+            results = pool.map(
+                lambda recording: backfill(recording, Path(staging_dir)), recordings
+            )
+            for recording, succeeded in zip(recordings, results):
+                if succeeded:
+                    encoded += 1
+                    recording.add_extra_audio(AUDIO_FORMAT)
+                    recording.save(update_fields=["extra_audio"])
+                else:
+                    failed += 1
+                    self.stderr.write(f"Could not transcode {recording.id}")
+
+        self.stdout.write(f"Encoded {encoded} recordings; {failed} failed")
+
+
+def backfill(recording: Recording, staging_dir: Path) -> bool:
+    """
+    Transcodes the recording's .m4a audio, and stores the result. Returns
+    False if the audio could not be transcoded.
+    """
+    destination = staging_dir / f"{recording.id}.{AUDIO_FORMAT}"
+    storage = recording.compressed_audio.storage
+    try:
+        source = Path(storage.path(recording.compressed_audio.name))
+    except NotImplementedError:
+        # Not stored locally, so ffmpeg needs a local copy.
+        source = staging_dir / Path(recording.compressed_audio.name).name
+        with recording.compressed_audio.open("rb") as remote_file:
+            with open(source, "wb") as local_file:
+                shutil.copyfileobj(remote_file, local_file)
+
+    try:
+        transcode_file(source, destination, OPUS_EXPORT_PARAMETERS)
+    except CalledProcessError:
+        if destination.exists():
+            destination.unlink()
+        return False
+    finally:
+        if source.parent == staging_dir:
+            source.unlink()
+
+    store_extra_audio(recording, destination, AUDIO_FORMAT)
+    return True
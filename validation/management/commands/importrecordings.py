@@ -22,24 +22,95 @@ been created.
 Its defaults are configured using the following settings:
     MEDIA_ROOT
     RECVAL_AUDIO_PREFIX
+    RECVAL_IMPORT_MANIFEST_PATH
     RECVAL_METADATA_PATH
+    RECVAL_PCM_CACHE_DIR
+    RECVAL_PCM_CACHE_SIZE
     RECVAL_SESSIONS_DIR
+    RECVAL_STAGING_DIR
+    RECVAL_TEXT_GRID_CACHE_DIR
+    RECVAL_TRANSCODE_CACHE_DIR
 See recvalsite/settings.py for more information.
 """
 
-from pathlib import Path
-from tempfile import TemporaryDirectory
+import os
+import shutil
+import socket
+import time
+from functools import partial
+from pathlib import Path, PurePosixPath
+from tempfile import TemporaryDirectory, gettempdir
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 
 import logme  # type: ignore
 from django.conf import settings  # type: ignore
-from django.core.files.base import ContentFile  # type: ignore
+from django.core.files.base import File  # type: ignore
 from django.core.management.base import BaseCommand, CommandError  # type: ignore
+from django.db import IntegrityError, transaction  # type: ignore
+from simple_history.utils import bulk_create_with_history  # type: ignore
 
 from librecval import REPOSITORY_ROOT
 from librecval.extract_phrases import RecordingInfo
+from librecval.import_journal import ImportJournal
+from librecval.import_manifest import ImportManifest
+from librecval.import_recordings import (
+    BITRATE_LADDER,
+    LADDER_TIERS,
+    Format,
+    Measurements,
+    SpeakerReassignment,
+)
 from librecval.import_recordings import initialize as import_recordings
+from librecval.import_recordings import (
+    measurements_path,
+    plan_speaker_reassignments,
+    read_measurements,
+)
+from librecval.import_report import ImportReport
+from librecval.pcm_cache import PCMCache
+from librecval.quality import is_unusable
+from librecval.recording_session import SessionID, parse_metadata
+from librecval.session_directory import list_directory
+from librecval.speech_profile import SpeechProfile
+from librecval.text_grid_cache import TextGridCache
+from librecval.transcode_cache import TranscodeCache, link_or_copy
+from librecval.transcode_recording import (
+    ENCODERS,
+    AACEncoder,
+    PydubEncoder,
+    get_encoder,
+)
+from librecval.work_queue import (
+    Claim,
+    SessionQueue,
+    record_recording,
+    recordings_in,
+    run_coordinator,
+    run_worker,
+)
 from validation.models import Phrase, Recording, RecordingSession, Speaker
 
+# How many recording IDs to look up in the database at once.
+MAX_IDS_PER_QUERY = 500
+
+# How many recordings to insert per query. Keeps well under SQLite's limit of
+# 999 variables per query, even with all of the recording's fields.
+BULK_CREATE_BATCH_SIZE = 100
+
+# Staging directories that can't be traced to a process on this machine are
+# removed once they haven't changed in this long (in seconds).
+STALE_STAGING_AGE = 24 * 60 * 60
+
+# The speech profile's defaults; the command line can override some of them.
+DEFAULT_PROFILE = SpeechProfile()
+
+# Formats that recordings may be stored in, besides their .m4a audio.
+EXTRA_FORMATS: Tuple[Format, ...] = ("webm",)
+
+# How many times to retry inserting a session's recordings, if another import
+# inserted some of the same recordings at the same time.
+MAX_INSERT_ATTEMPTS = 3
+
 
 class Command(BaseCommand):
     help = "imports recordings into the database"
@@ -68,101 +139,944 @@ class Command(BaseCommand):
             default=Path("./audio"),
         )
 
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help="how many processes to use to extract recordings (default: 1)",
+        )
+
+        parser.add_argument(
+            "--encoders",
+            type=int,
+            default=1,
+            help="how many recordings to transcode at once (default: 1)",
+        )
+
+        parser.add_argument(
+            "--encoder",
+            choices=sorted(ENCODERS),
+            default=PydubEncoder.name,
+            help="how to encode .m4a files (default: pydub; pyav is much faster, "
+            "but needs PyAV installed)",
+        )
+
+        parser.add_argument(
+            "--opus",
+            action="store_true",
+            default=False,
+            help="also saves Opus audio (.webm), for browsers that support it",
+        )
+
+        parser.add_argument(
+            "--bitrate-ladder",
+            action="store_true",
+            default=False,
+            help="also saves low and medium bitrate audio, for slow connections",
+        )
+
+        parser.add_argument(
+            "--speech-profile",
+            action="store_true",
+            default=False,
+            help="trims silence, and resamples recordings before encoding them",
+        )
+
+        parser.add_argument(
+            "--silence-threshold",
+            type=float,
+            default=DEFAULT_PROFILE.silence_threshold,
+            help="with --speech-profile, anything quieter than this (in dBFS) is "
+            "silence (default: %(default)s)",
+        )
+
+        parser.add_argument(
+            "--sample-rate",
+            type=int,
+            default=DEFAULT_PROFILE.frame_rate,
+            help="with --speech-profile, the sample rate of the recordings "
+            "(default: %(default)s)",
+        )
+
+        parser.add_argument(
+            "--pcm-cache",
+            action="store_true",
+            default=False,
+            help="keeps the decoded audio of masters that are not PCM .wav files, "
+            "so that importing them again does not decode them again",
+        )
+
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            default=False,
+            help="imports sessions even if they have not changed since the last import",
+        )
+
+        parser.add_argument(
+            "--work-queue",
+            type=Path,
+            default=None,
+            help="imports sessions together with other processes (even on other "
+            "machines), using the queue in this SQLite database. Each process is a "
+            "worker, which saves recordings to --audio-dir (which must be shared), "
+            "unless it is the --coordinate process",
+        )
+
+        parser.add_argument(
+            "--coordinate",
+            action="store_true",
+            default=False,
+            help="with --work-queue, queues every session, and saves what the "
+            "workers extract to the database. Run exactly one of these",
+        )
+
+        parser.add_argument(
+            "--report",
+            type=Path,
+            default=None,
+            help="where to write a JSON report of the import",
+        )
+
     def handle(
         self,
         *args,
         store_db=True,
         wav=False,
         audio_dir: Path = Path("./audio"),
-        **options
+        jobs: int = 1,
+        encoders: int = 1,
+        encoder: str = PydubEncoder.name,
+        opus: bool = False,
+        bitrate_ladder: bool = False,
+        speech_profile: bool = False,
+        silence_threshold: float = DEFAULT_PROFILE.silence_threshold,
+        sample_rate: int = DEFAULT_PROFILE.frame_rate,
+        force: bool = False,
+        work_queue: Optional[Path] = None,
+        coordinate: bool = False,
+        report: Optional[Path] = None,
+        pcm_cache: bool = False,
+        **options,
     ) -> None:
         sessions_dir = options.get("session_dir", settings.RECVAL_SESSIONS_DIR)
 
+        if jobs < 1:
+            raise CommandError(f"--jobs must be at least 1, not {jobs}")
+        if encoders < 1:
+            raise CommandError(f"--encoders must be at least 1, not {encoders}")
+        if coordinate and work_queue is None:
+            raise CommandError("--coordinate needs a --work-queue")
+        try:
+            aac_encoder = get_encoder(encoder)
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        # The manifest only makes sense for the destination it describes.
         if store_db:
-            self._handle_store_django(sessions_dir)
+            manifest_path = settings.RECVAL_IMPORT_MANIFEST_PATH
+        else:
+            manifest_path = audio_dir / "import-manifest.json"
+        # With --force, start with a blank slate, but still write a new manifest.
+        manifest = ImportManifest(manifest_path, load=not force)
+        # If the last import crashed, this lets us resume where it left off.
+        journal = ImportJournal(manifest_path.with_suffix(".journal"), load=not force)
+        extra_formats: Tuple[Format, ...] = EXTRA_FORMATS if opus else ()
+        tiers = LADDER_TIERS if bitrate_ladder else ()
+        profile = None
+        if speech_profile:
+            profile = DEFAULT_PROFILE._replace(
+                silence_threshold=silence_threshold, frame_rate=sample_rate
+            )
+        decoded_masters = None
+        if pcm_cache:
+            decoded_masters = PCMCache(
+                settings.RECVAL_PCM_CACHE_DIR, settings.RECVAL_PCM_CACHE_SIZE
+            )
+
+        if work_queue is not None:
+            queue = SessionQueue(work_queue)
+            # Whoever starts first queues the sessions; nobody queues them twice.
+            _files, directories = list_directory(sessions_dir)
+            added = queue.add(sorted(directories))
+            self.stdout.write(f"Queued {added} new sessions")
+            if coordinate:
+                # Workers and the coordinator must agree on which files to
+                # expect, but nothing else.
+                self._handle_coordinate(queue, extra_formats, tiers)
+                return
+            import_report = self._handle_work(
+                queue,
+                sessions_dir,
+                audio_dir,
+                jobs,
+                encoders,
+                encoder=aac_encoder,
+                extra_formats=extra_formats,
+                tiers=tiers,
+                profile=profile,
+                pcm_cache=decoded_masters,
+            )
+        elif store_db:
+            import_report = self._handle_store_django(
+                sessions_dir,
+                manifest,
+                journal,
+                jobs,
+                encoders,
+                encoder=aac_encoder,
+                extra_formats=extra_formats,
+                tiers=tiers,
+                profile=profile,
+                pcm_cache=decoded_masters,
+            )
         else:
-            self._handle_store_wav(sessions_dir, audio_dir, wav)
+            import_report = self._handle_store_wav(
+                sessions_dir,
+                audio_dir,
+                manifest,
+                journal,
+                wav,
+                jobs,
+                encoders,
+                encoder=aac_encoder,
+                extra_formats=extra_formats,
+                tiers=tiers,
+                profile=profile,
+                pcm_cache=decoded_masters,
+            )
+
+        self.stdout.write(import_report.summary())
+        if report is not None:
+            import_report.save(report)
 
     def _handle_store_wav(
-        self, sessions_dir: Path, audio_dir: Path, wav: bool = False
-    ) -> None:
+        self,
+        sessions_dir: Path,
+        audio_dir: Path,
+        manifest: ImportManifest,
+        journal: ImportJournal,
+        wav: bool = False,
+        jobs: int = 1,
+        encoders: int = 1,
+        encoder: Optional[AACEncoder] = None,
+        extra_formats: Sequence[Format] = (),
+        tiers: Sequence[str] = (),
+        profile: Optional[SpeechProfile] = None,
+        pcm_cache: Optional[PCMCache] = None,
+    ) -> ImportReport:
         """
         Stores wave files to a specific directory.
         """
-        import_recordings(
+        return import_recordings(
             directory=sessions_dir,
             transcoded_recordings_path=audio_dir,
             metadata_filename=settings.RECVAL_METADATA_PATH,
             import_recording=null_recording_importer,
             recording_format="wav" if wav else "m4a",
+            jobs=jobs,
+            encoders=encoders,
+            manifest=manifest,
+            journal=journal,
+            transcode_cache=TranscodeCache(settings.RECVAL_TRANSCODE_CACHE_DIR),
+            text_grid_cache=TextGridCache(settings.RECVAL_TEXT_GRID_CACHE_DIR),
+            encoder=encoder,
+            extra_formats=extra_formats,
+            tiers=tiers,
+            profile=profile,
+            pcm_cache=pcm_cache,
         )
 
-    def _handle_store_django(self, sessions_dir: Path) -> None:
+    def _handle_store_django(
+        self,
+        sessions_dir: Path,
+        manifest: ImportManifest,
+        journal: ImportJournal,
+        jobs: int = 1,
+        encoders: int = 1,
+        encoder: Optional[AACEncoder] = None,
+        extra_formats: Sequence[Format] = (),
+        tiers: Sequence[str] = (),
+        profile: Optional[SpeechProfile] = None,
+        pcm_cache: Optional[PCMCache] = None,
+    ) -> ImportReport:
         """
         Stores m4a files, managed by Django's media engine.
         """
+        # Sessions whose speakers were merely reassigned need not be imported.
+        self._reassign_speakers(sessions_dir, manifest)
+
         # Store transcoded audio in a temp directory;
         # these files will be then handled by the currently configured storage backend.
-        with TemporaryDirectory() as audio_dir:
+        importer = RecordingImporter(extra_formats, tiers)
+        with staging_directory() as audio_dir, importer:
             # Now, import all those recordings!
-            import_recordings(
+            return import_recordings(
                 directory=sessions_dir,
                 transcoded_recordings_path=audio_dir,
                 metadata_filename=settings.RECVAL_METADATA_PATH,
-                import_recording=django_recording_importer,
+                import_recording=importer,
+                existing_recordings=django_existing_recordings,
+                recording_format="m4a",
+                jobs=jobs,
+                encoders=encoders,
+                manifest=manifest,
+                journal=journal,
+                # Recordings must be in the database before they're journaled.
+                checkpoint=importer.flush,
+                transcode_cache=TranscodeCache(settings.RECVAL_TRANSCODE_CACHE_DIR),
+                text_grid_cache=TextGridCache(settings.RECVAL_TEXT_GRID_CACHE_DIR),
+                encoder=encoder,
+                extra_formats=extra_formats,
+                tiers=tiers,
+                profile=profile,
+                pcm_cache=pcm_cache,
+            )
+
+    def _reassign_speakers(self, sessions_dir: Path, manifest: ImportManifest) -> None:
+        """
+        Compares the metadata with the metadata of the last import. Sessions
+        whose speaker codes are all that changed get their recordings given to
+        the new speakers, in bulk, and are marked as imported with the new
+        metadata. Any other change means the session is imported again.
+        """
+        with open(settings.RECVAL_METADATA_PATH) as metadata_csv:
+            metadata = parse_metadata(metadata_csv)
+        changes = manifest.diff_metadata(metadata)
+        if changes.changed or changes.removed:
+            self.stdout.write(str(changes))
+
+        reassignments = plan_speaker_reassignments(
+            sessions_dir,
+            metadata,
+            manifest,
+            text_grid_cache=TextGridCache(settings.RECVAL_TEXT_GRID_CACHE_DIR),
+        )
+        for reassignment in reassignments:
+            count = reassign_speakers(reassignment)
+            manifest.record_metadata(
+                reassignment.session, metadata[reassignment.session]
+            )
+            manifest.save()
+            speakers = ", ".join(
+                f"{old} → {new}" for old, new in sorted(reassignment.speakers.items())
+            )
+            self.stdout.write(
+                f"Reassigned {count} recordings in {reassignment.session}: {speakers}"
+            )
+
+    def _handle_work(
+        self,
+        queue: SessionQueue,
+        sessions_dir: Path,
+        audio_dir: Path,
+        jobs: int = 1,
+        encoders: int = 1,
+        encoder: Optional[AACEncoder] = None,
+        extra_formats: Sequence[Format] = (),
+        tiers: Sequence[str] = (),
+        profile: Optional[SpeechProfile] = None,
+        pcm_cache: Optional[PCMCache] = None,
+    ) -> ImportReport:
+        """
+        Extracts sessions from the work queue, until there are none left.
+        Each session's recordings are saved to their own directory, within the
+        audio directory, for the coordinator to save to the database.
+        """
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        report = ImportReport()
+
+        def extract(claim: Claim, output: Path) -> None:
+            session_report = import_recordings(
+                directory=sessions_dir,
+                transcoded_recordings_path=output,
+                metadata_filename=settings.RECVAL_METADATA_PATH,
+                import_recording=partial(record_recording, output),
+                existing_recordings=django_existing_recordings,
                 recording_format="m4a",
+                jobs=jobs,
+                encoders=encoders,
+                transcode_cache=TranscodeCache(settings.RECVAL_TRANSCODE_CACHE_DIR),
+                text_grid_cache=TextGridCache(settings.RECVAL_TEXT_GRID_CACHE_DIR),
+                encoder=encoder,
+                extra_formats=extra_formats,
+                tiers=tiers,
+                profile=profile,
+                session_names=[claim.session],
+                pcm_cache=pcm_cache,
+            )
+            report.merge(session_report)
+
+        sessions = run_worker(queue, worker, extract, audio_dir)
+        self.stdout.write(f"{worker} extracted {sessions} sessions")
+        report.finish()
+        return report
+
+    def _handle_coordinate(
+        self,
+        queue: SessionQueue,
+        extra_formats: Sequence[Format] = (),
+        tiers: Sequence[str] = (),
+    ) -> None:
+        """
+        Saves each session's recordings to the database as soon as a worker
+        has extracted them, until every session is done.
+        """
+        # The workers' files are removed once each session is committed.
+        importer = RecordingImporter(extra_formats, tiers, keep_files=True)
+        run_coordinator(queue, partial(commit_extracted_session, importer))
+
+        counts = queue.counts()
+        self.stdout.write(
+            ", ".join(f"{count} {state}" for state, count in counts.items())
+        )
+
+
+@logme.log
+class RecordingImporter:
+    """
+    Imports recordings into the database, in bulk.
+
+    Speakers, sessions, and phrases are looked up (or created) only the first
+    time they are seen, and remembered afterwards. Recordings are buffered
+    until their session is complete (or until flush() is called), and then all
+    of them (and their history) are inserted in one transaction.
+
+    Use it as a context manager, so that the last session is inserted too.
+
+    Audio in any of the extra formats, and in the given tiers of the bitrate
+    ladder, is expected next to each recording's audio (e.g., abc123.webm and
+    abc123.low.m4a next to abc123.m4a), and is stored as well (and noted in
+    the recording's extra_audio). So is the recording's loudness (from
+    abc123.json), if it was measured; if the quality analyzer found it
+    unusable, it is marked as such.
+
+    Once stored, the files are removed, unless keep_files is set; then, it's
+    up to the caller to remove them, once the recordings are in the database.
+    """
+
+    def __init__(
+        self,
+        extra_formats: Sequence[Format] = (),
+        tiers: Sequence[str] = (),
+        keep_files: bool = False,
+    ) -> None:
+        # Every (format, tier) that is stored along with the .m4a audio:
+        self.extra_audio: List[Tuple[str, Optional[str]]] = [
+            (audio_format, None) for audio_format in extra_formats
+        ]
+        self.extra_audio += [
+            (audio_format, tier)
+            for audio_format in ("m4a", *extra_formats)
+            for tier in tiers
+            if tier in BITRATE_LADDER.get(audio_format, {})
+        ]
+        self.keep_files = keep_files
+        self.speakers: Dict[str, Speaker] = {}
+        self.sessions: Dict[str, RecordingSession] = {}
+        self.phrases: Dict[Tuple[str, str], Phrase] = {}
+        self._pending: List[Recording] = []
+        self._pending_session: Optional[str] = None
+
+    def __enter__(self) -> "RecordingImporter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # Don't bother inserting anything if the import failed.
+        if exc_type is None:
+            self.flush()
+
+    def __call__(self, info: RecordingInfo, recording_path: Path) -> None:
+        """
+        Imports a single recording.
+        """
+        if str(info.session) != self._pending_session:
+            self.flush()
+            self._pending_session = str(info.session)
+
+        # Recording requires a Speaker, a RecordingSession, and a Phrase.
+        recording = Recording(
+            id=info.compute_sha256hash(),
+            speaker=self.speaker_for(info.speaker),
+            timestamp=info.timestamp,
+            phrase=self.phrase_for(info),
+            session=self.session_for(info.session),
+            quality="",
+        )
+        measurements = read_measurements(recording_path)
+        if measurements is not None:
+            apply_measurements(recording, measurements)
+            # Like the audio, it's only needed until the recording is stored:
+            if not self.keep_files:
+                measurements_path(recording_path).unlink()
+        recording.clean()
+        store_audio(recording, recording_path, keep=self.keep_files)
+        for audio_format, tier in self.extra_audio:
+            filename = PurePosixPath(recording.get_audio_name(audio_format, tier)).name
+            store_extra_audio(
+                recording,
+                recording_path.with_name(filename),
+                audio_format,
+                tier,
+                keep=self.keep_files,
+            )
+            recording.add_extra_audio(audio_format, tier)
+        self._pending.append(recording)
+
+    def speaker_for(self, code: str) -> Speaker:
+        speaker = self.speakers.get(code)
+        if speaker is None:
+            # get_or_create() copes with another import creating the same
+            # speaker at the same time, since the code is the primary key.
+            speaker, created = Speaker.objects.get_or_create(
+                code=code  # TODO: normalized?
             )
+            if created:
+                self.logger.info("New speaker: %s", speaker)
+            self.speakers[code] = speaker
+        return speaker
+
+    def session_for(self, session_id: SessionID) -> RecordingSession:
+        session = self.sessions.get(str(session_id))
+        if session is None:
+            session, created = RecordingSession.get_or_create_by_session_id(session_id)
+            if created:
+                self.logger.info("New session: %s", session)
+            self.sessions[str(session_id)] = session
+        return session
+
+    def phrase_for(self, info: RecordingInfo) -> Phrase:
+        key = (info.transcription, info.type)
+        phrase = self.phrases.get(key)
+        if phrase is None:
+            phrase = self._get_or_create_phrase(info)
+            self.phrases[key] = phrase
+        return phrase
+
+    def _get_or_create_phrase(self, info: RecordingInfo) -> Phrase:
+        existing = Phrase.objects.filter(
+            transcription=info.transcription, kind=info.type
+        ).order_by("id")
+
+        phrase = existing.first()
+        if phrase is not None:
+            return phrase
+
+        phrase = Phrase.objects.create(
+            transcription=info.transcription,
+            kind=info.type,
+            translation=info.translation,
+            validated=False,
+            origin=None,
+        )
+        # Nothing stops another import from creating the same phrase at the
+        # same time, so everybody agrees to use the oldest one.
+        oldest = existing.first()
+        if oldest.id != phrase.id:
+            self.logger.info("Another import created %s first", oldest)
+            phrase.delete()
+            return oldest
+
+        self.logger.info("New phrase: %s", phrase)
+        return phrase
+
+    def flush(self) -> None:
+        """
+        Inserts all the pending recordings in a single transaction.
+        """
+        recordings, self._pending = self._pending, []
+        if not recordings:
+            return
+
+        for attempt in range(1, MAX_INSERT_ATTEMPTS + 1):
+            # Another import may have inserted some of these in the meantime.
+            existing = django_existing_recordings([r.id for r in recordings])
+            for recording in recordings:
+                if recording.id in existing:
+                    self.logger.warn("Already imported: %s", recording.id)
+                    discard_audio(recording)
+            recordings = [r for r in recordings if r.id not in existing]
+
+            try:
+                with transaction.atomic():
+                    bulk_create_with_history(
+                        recordings, Recording, batch_size=BULK_CREATE_BATCH_SIZE
+                    )
+            except IntegrityError:
+                if attempt == MAX_INSERT_ATTEMPTS:
+                    raise
+                self.logger.warn("Conflict while saving recordings; retrying")
+            else:
+                break
+
+        self.logger.debug(
+            "Saved %d recordings from %s", len(recordings), self._pending_session
+        )
+
+
+def apply_measurements(recording: Recording, measurements: Measurements) -> None:
+    """
+    Copies what was measured while the recording was saved onto the recording.
+    Recordings with problems that make them unusable are marked as such.
+    """
+    loudness = measurements.loudness
+    recording.duration = loudness.duration
+    recording.peak_dbfs = loudness.peak
+    recording.rms_dbfs = loudness.rms
+    recording.waveform = " ".join(str(peak) for peak in loudness.waveform)
+    if is_unusable(measurements.problems):
+        recording.quality = Recording.UNUSABLE
+
+
+def audio_storage():
+    """
+    Returns the storage backend for the recordings' audio.
+    """
+    return Recording._meta.get_field("compressed_audio").storage
+
+
+def staging_root() -> Path:
+    """
+    Where transcoded audio is staged: RECVAL_STAGING_DIR, or by default, next
+    to MEDIA_ROOT (e.g., data-staging, next to data). Never within MEDIA_ROOT,
+    since everything in there is served to anyone.
+    """
+    if settings.RECVAL_STAGING_DIR:
+        return Path(settings.RECVAL_STAGING_DIR)
+    try:
+        media_root = Path(audio_storage().path(""))
+    except NotImplementedError:
+        # The audio can't be hard linked into place anyway.
+        return Path(gettempdir()) / "recval-staging"
+    return media_root.with_name(media_root.name + "-staging")
+
+
+def staging_directory() -> TemporaryDirectory:
+    """
+    Returns a temporary directory for transcoded audio, within staging_root().
+    It's named after the process that made it, so staging directories left
+    behind by imports that crashed can be found: they're removed first, along
+    with any audio they never stored.
+    """
+    root = staging_root()
+    root.mkdir(parents=True, exist_ok=True)
+    remove_stale_staging_directories(root)
+    try:
+        media_root = Path(audio_storage().path(""))
+    except NotImplementedError:
+        pass
+    else:
+        # Imports used to stage audio in .import-* directories in MEDIA_ROOT:
+        remove_stale_staging_directories(media_root, ".import-*")
+
+    owner = f"{socket.gethostname()}:{os.getpid()}:"
+    return TemporaryDirectory(prefix=owner, dir=root)
 
 
 @logme.log
-def django_recording_importer(
-    info: RecordingInfo, recording_path: Path, logger
+def remove_stale_staging_directories(
+    directory: Path, pattern: str = "*", logger=None
 ) -> None:
     """
-    Imports a single recording.
+    Removes the staging directories (see staging_directory()) whose imports
+    are no longer running.
     """
+    for path in directory.glob(pattern):
+        if path.is_dir() and is_stale_staging_directory(path):
+            logger.info("Removing stale staging directory: %s", path)
+            shutil.rmtree(path, ignore_errors=True)
 
-    # Recording requires a Speaker, a RecordingSession, and a Phrase.
-    # Make those first.
-    speaker, speaker_created = Speaker.objects.get_or_create(
-        code=info.speaker  # TODO: normalized?
-    )
-    if speaker_created:
-        logger.info("New speaker: %s", speaker)
 
-    session, session_created = RecordingSession.get_or_create_by_session_id(
-        info.session
-    )
-    if session_created:
-        logger.info("New session: %s", session)
+def is_stale_staging_directory(path: Path) -> bool:
+    """
+    Whether the process that made the staging directory is gone. That can only
+    be known for processes on this machine; otherwise, the directory is stale
+    once nothing was written to it for STALE_STAGING_AGE seconds.
+    """
+    host, _, rest = path.name.partition(":")
+    pid = rest.partition(":")[0]
+    if host == socket.gethostname() and pid.isdigit():
+        return not is_running(int(pid))
 
-    phrase, phrase_created = Phrase.objects.get_or_create(
-        transcription=info.transcription,
-        kind=info.type,
-        defaults=dict(translation=info.translation, validated=False, origin=None),
-    )
-    if phrase_created:
-        logger.info("New phrase: %s", phrase)
-
-    # XXX: this is kind of dumb; the compressed audio is written to storage, read again,
-    # and will be written back by Django :/
-    audio_data = recording_path.read_bytes()
-    django_file = ContentFile(audio_data, name=recording_path.name)
-
-    # Finally, we can create the recording.
-    recording = Recording(
-        id=info.compute_sha256hash(),
-        speaker=speaker,
-        compressed_audio=django_file,
-        timestamp=info.timestamp,
-        phrase=phrase,
-        session=session,
-        quality="",
+    try:
+        age = time.time() - path.stat().st_mtime
+    except FileNotFoundError:
+        return False
+    return age > STALE_STAGING_AGE
+
+
+def is_running(pid: int) -> bool:
+    try:
+        # Signal 0 checks that the process exists, without signalling it.
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # It exists, but it's somebody else's.
+        return True
+    return True
+
+
+def store_audio(recording: Recording, recording_path: Path, keep: bool = False) -> None:
+    """
+    Hands the transcoded audio over to storage, without reading it into
+    memory. Local files are hard linked into place (and removed from where
+    they were, unless asked to keep them), so they are not even copied;
+    otherwise, the file is streamed to the storage backend.
+    """
+    field = Recording._meta.get_field("compressed_audio")
+    storage = field.storage
+    name = field.generate_filename(recording, recording_path.name)
+
+    if storage.exists(name) and not is_audio_of_any_recording(name):
+        # An import stored it, then crashed before it saved the recording (see
+        # RecordingImporter.flush()). Replace it, rather than store a copy.
+        if keep:
+            kept_path = recording_path
+            recording_path = recording_path.with_name("." + recording_path.name)
+            link_or_copy(kept_path, recording_path)
+        replace_audio(name, recording_path)
+        recording.compressed_audio = name
+        return
+
+    while True:
+        name = storage.get_available_name(name, max_length=field.max_length)
+        try:
+            destination = Path(storage.path(name))
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            os.link(recording_path, destination)
+        except FileExistsError:
+            # Another import took this name in the meantime; try another.
+            continue
+        except (NotImplementedError, OSError):
+            # Not local, or on another filesystem:
+            with open(recording_path, "rb") as audio_file:
+                name = storage.save(name, File(audio_file), max_length=field.max_length)
+            break
+        else:
+            if not keep:
+                recording_path.unlink()
+            break
+
+    # Assigning the name means the file is already committed to storage.
+    recording.compressed_audio = name
+
+
+def store_extra_audio(
+    recording: Recording,
+    audio_path: Path,
+    audio_format: str,
+    tier: Optional[str] = None,
+    keep: bool = False,
+) -> None:
+    """
+    Hands audio in another format (e.g., Opus), or another tier of the bitrate
+    ladder, over to storage, next to the recording's .m4a audio. Unlike the
+    .m4a audio, its name is always Recording.get_audio_name(), so if it
+    already exists, it is kept. Either way, the file is removed from where it
+    was, unless asked to keep it.
+    """
+    storage = audio_storage()
+    name = recording.get_audio_name(audio_format, tier)
+
+    if storage.exists(name):
+        if not keep:
+            audio_path.unlink()
+        return
+
+    try:
+        destination = Path(storage.path(name))
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        os.link(audio_path, destination)
+    except FileExistsError:
+        # Another import stored it in the meantime.
+        pass
+    except (NotImplementedError, OSError):
+        with open(audio_path, "rb") as audio_file:
+            storage.save(name, File(audio_file))
+    if not keep:
+        audio_path.unlink()
+
+
+def replace_audio(name: str, audio_path: Path) -> None:
+    """
+    Replaces the audio in storage with the given file, keeping its name.
+    """
+    storage = audio_storage()
+    try:
+        destination = Path(storage.path(name))
+    except NotImplementedError:
+        storage.delete(name)
+        with open(audio_path, "rb") as audio_file:
+            saved_name = storage.save(name, File(audio_file))
+        assert saved_name == name, f"{name} was saved as {saved_name}"
+        audio_path.unlink()
+        return
+
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    # Replace the file, rather than write over it: the old file may be a hard
+    # link into the transcode cache, and nobody ever sees a half-written file.
+    try:
+        os.replace(audio_path, destination)
+    except OSError:
+        # The staging directory is on another filesystem; copy it over first.
+        copied_path = destination.with_name("." + destination.name)
+        shutil.copyfile(audio_path, copied_path)
+        os.replace(copied_path, destination)
+        audio_path.unlink()
+
+
+def copy_from_storage(name: str, audio_path: Path) -> None:
+    """
+    Copies audio out of storage. Local files are hard linked instead.
+    """
+    storage = audio_storage()
+    try:
+        os.link(storage.path(name), audio_path)
+    except (NotImplementedError, OSError):
+        with storage.open(name, "rb") as stored, open(audio_path, "wb") as audio_file:
+            shutil.copyfileobj(stored, audio_file)
+
+
+@logme.log
+def reassign_speakers(reassignment: SpeakerReassignment, logger=None) -> int:
+    """
+    Gives the session's recordings to their new speakers, in bulk. Since a
+    recording's ID depends on its speaker, each one gets its new ID, and its
+    audio is renamed to match. Nothing is extracted or encoded again, so the
+    tags in the audio itself still name the old speaker.
+
+    Returns how many recordings were reassigned.
+    """
+    old_ids = list(reassignment.recordings)
+    recordings: List[Recording] = []
+    for start in range(0, len(old_ids), MAX_IDS_PER_QUERY):
+        batch = old_ids[start : start + MAX_IDS_PER_QUERY]
+        recordings += Recording.objects.filter(id__in=batch)
+
+    # Speakers may have swapped mics, so a new ID may be another recording's
+    # old ID; those are fine, since every old recording is replaced.
+    taken = django_existing_recordings(
+        [reassignment.recordings[r.id] for r in recordings]
+    ) - set(old_ids)
+    for recording in recordings:
+        if reassignment.recordings[recording.id] in taken:
+            logger.warn("Already imported with its new speaker: %s", recording.id)
+    recordings = [r for r in recordings if reassignment.recordings[r.id] not in taken]
+    if not recordings:
+        return 0
+
+    speakers = {}
+    for code in set(reassignment.speakers.values()):
+        speakers[code], _created = Speaker.objects.get_or_create(code=code)
+
+    replaced_ids = [r.id for r in recordings]
+    # Every old name of the audio, and its new name:
+    renames: List[Tuple[str, str]] = []
+    for recording in recordings:
+        audio_name = recording.compressed_audio.name
+        extra_audio = recording.extra_audio_variants
+        old_names = [recording.get_audio_name(*variant) for variant in extra_audio]
+
+        recording.id = reassignment.recordings[recording.id]
+        recording.speaker = speakers[reassignment.speakers[recording.speaker_id]]
+        recording.compressed_audio = recording.get_audio_name(
+            PurePosixPath(audio_name).suffix[1:]
+        )
+        renames.append((audio_name, recording.compressed_audio.name))
+        renames += zip(
+            old_names,
+            (recording.get_audio_name(*variant) for variant in extra_audio),
+        )
+
+    storage = audio_storage()
+    with staging_directory() as staging_dir:
+        # A new name may be another recording's old name (e.g., when two
+        # speakers swapped mics), so copy everything out of the way first.
+        staged = []
+        for old_name, new_name in renames:
+            staged_path = Path(staging_dir) / PurePosixPath(new_name).name
+            copy_from_storage(old_name, staged_path)
+            staged.append((new_name, staged_path))
+
+        with transaction.atomic():
+            for start in range(0, len(replaced_ids), MAX_IDS_PER_QUERY):
+                batch = replaced_ids[start : start + MAX_IDS_PER_QUERY]
+                Recording.objects.filter(id__in=batch).delete()
+            bulk_create_with_history(
+                recordings, Recording, batch_size=BULK_CREATE_BATCH_SIZE
+            )
+
+        new_names = {new_name for _old_name, new_name in renames}
+        for old_name, _new_name in renames:
+            if old_name not in new_names:
+                storage.delete(old_name)
+        for new_name, staged_path in staged:
+            replace_audio(new_name, staged_path)
+
+    logger.debug(
+        "Reassigned %d recordings in %s", len(recordings), reassignment.session
     )
-    recording.clean()
+    return len(recordings)
 
-    logger.debug("Saving recording %s", recording)
-    recording.save()
+
+def discard_audio(recording: Recording) -> None:
+    """
+    Deletes the recording's audio from storage, if it was already saved.
+    """
+    if recording.compressed_audio._committed:
+        # Another import may have stored the same audio, under the same name,
+        # and saved its recording first; that audio is not ours to delete.
+        if not is_audio_of_any_recording(recording.compressed_audio.name):
+            recording.compressed_audio.delete(save=False)
+
+
+def is_audio_of_any_recording(name: str) -> bool:
+    """
+    Whether the audio in storage belongs to a recording in the database.
+    """
+    return Recording.objects.filter(compressed_audio=name).exists()
+
+
+def django_existing_recordings(rec_ids: List[str]) -> Set[str]:
+    """
+    Returns the recording IDs that are already in the database.
+    """
+    existing: Set[str] = set()
+    # Keep well under SQLite's limit of 999 variables per query.
+    for start in range(0, len(rec_ids), MAX_IDS_PER_QUERY):
+        batch = rec_ids[start : start + MAX_IDS_PER_QUERY]
+        existing.update(
+            Recording.objects.filter(id__in=batch).values_list("id", flat=True)
+        )
+    return existing
+
+
+@logme.log
+def commit_extracted_session(
+    importer: RecordingImporter, session: str, output: Path, logger=None
+) -> None:
+    """
+    Saves the recordings that a worker extracted from the session (into the
+    output directory) to the database, then removes the output directory.
+
+    The importer must keep the files it stores (see RecordingImporter), so
+    that nothing is lost if the coordinator crashes before the recordings
+    are in the database: the next coordinator simply commits them again.
+    """
+    assert importer.keep_files, "the worker's files must outlive a crash"
+    recordings = list(recordings_in(output))
+    existing = django_existing_recordings(
+        [info.compute_sha256hash() for info, _recording_path in recordings]
+    )
+    with importer:
+        for info, recording_path in recordings:
+            if info.compute_sha256hash() in existing:
+                logger.warning("Already committed: %s from %s", recording_path, session)
+                continue
+            importer(info, recording_path)
+    shutil.rmtree(output, ignore_errors=True)
 
 
 def null_recording_importer(info: RecordingInfo, recording_path: Path) -> None:
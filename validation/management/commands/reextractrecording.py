@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Extracts a single recording from its master again, and replaces its audio
+in storage, e.g., to fix a recording that was cut off. Nothing else in its
+session is touched.
+
+Usage:
+
+    python manage.py reextractrecording RECORDING_ID [--start MS] [--end MS]
+
+Its defaults are configured using the following settings:
+    RECVAL_METADATA_PATH
+    RECVAL_SESSIONS_DIR
+    RECVAL_TEXT_GRID_CACHE_DIR
+    RECVAL_TRANSCODE_CACHE_DIR
+"""
+
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings  # type: ignore
+from django.core.management.base import BaseCommand, CommandError  # type: ignore
+
+from librecval.extract_phrases import RecordingExtractor, RecordingNotFoundError
+from librecval.import_recordings import read_measurements, save_recording
+from librecval.quality import QualityAnalyzer
+from librecval.recording_session import parse_metadata
+from librecval.speech_profile import SpeechProfile
+from librecval.text_grid_cache import TextGridCache
+from librecval.transcode_cache import TranscodeCache
+from librecval.transcode_recording import get_encoder
+from validation.management.commands.importrecordings import (
+    DEFAULT_PROFILE,
+    apply_measurements,
+    replace_audio,
+    staging_directory,
+)
+from validation.models import Recording
+
+
+class Command(BaseCommand):
+    help = "extracts a single recording from its master again"
+
+    def add_arguments(self, parser):
+        parser.add_argument("recording_id")
+        parser.add_argument(
+            "--start",
+            type=int,
+            default=None,
+            help="where the recording starts in its master, in milliseconds "
+            "(default: where its TextGrid says)",
+        )
+        parser.add_argument(
+            "--end",
+            type=int,
+            default=None,
+            help="where the recording ends in its master, in milliseconds "
+            "(default: where its TextGrid says)",
+        )
+        parser.add_argument(
+            "--speech-profile",
+            action="store_true",
+            default=False,
+            help="trims silence, and resamples the recording before encoding it "
+            "(as importrecordings --speech-profile does)",
+        )
+
+    def handle(
+        self,
+        recording_id: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        speech_profile: bool = False,
+        **options,
+    ) -> None:
+        try:
+            recording = Recording.objects.get(id=recording_id)
+        except Recording.DoesNotExist:
+            raise CommandError(f"No such recording: {recording_id}")
+
+        profile = DEFAULT_PROFILE if speech_profile else None
+        try:
+            reextract_recording(recording, start, end, profile)
+        except (RecordingNotFoundError, ValueError) as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(
+            f"Extracted {recording.id} again: {recording.duration} ms"
+            + (f" ({recording.quality})" if recording.quality else "")
+        )
+
+
+def reextract_recording(
+    recording: Recording,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    profile: Optional[SpeechProfile] = None,
+) -> None:
+    """
+    Cuts the recording out of its master again (optionally, at a different
+    start or end, in milliseconds), encodes it in every format that it was
+    stored in, and replaces its audio in storage. Its ID stays the same.
+
+    Its measurements are updated. If the quality analyzer finds the new audio
+    unusable, so is the recording; otherwise, it keeps whatever quality it
+    had, since the analyzer can't tell a good recording from a bad one.
+    """
+    with open(settings.RECVAL_METADATA_PATH) as metadata_csv:
+        metadata = parse_metadata(metadata_csv)
+
+    extractor = RecordingExtractor(
+        metadata, text_grid_cache=TextGridCache(settings.RECVAL_TEXT_GRID_CACHE_DIR)
+    )
+    info, audio = extractor.extract_recording(
+        Path(settings.RECVAL_SESSIONS_DIR),
+        recording.session.as_session_id(),
+        recording.id,
+        speaker=recording.speaker.code,
+        start=start,
+        end=end,
+    )
+    # Same as importing: assess before trimming.
+    problems = QualityAnalyzer().assess(audio).problems
+    if profile is not None:
+        audio = profile.apply(audio)
+
+    # Encode everything that was stored before, and nothing more:
+    extra_formats = [
+        audio_format
+        for audio_format, tier in recording.extra_audio_variants
+        if tier is None
+    ]
+    variants = [
+        (audio_format, tier)
+        for audio_format, tier in recording.extra_audio_variants
+        if tier is not None
+    ]
+
+    with staging_directory() as staging_dir:
+        recording_path = save_recording(
+            Path(staging_dir),
+            info,
+            audio,
+            "m4a",
+            cache=TranscodeCache(settings.RECVAL_TRANSCODE_CACHE_DIR),
+            encoder=get_encoder(),
+            extra_formats=extra_formats,
+            tiers=sorted({tier for _audio_format, tier in variants}),
+            problems=problems,
+        )
+        measurements = read_measurements(recording_path)
+        assert measurements is not None
+
+        # The recording itself goes last, as it does when importing:
+        for audio_format, tier in variants:
+            replace_audio(
+                recording.get_audio_name(audio_format, tier),
+                recording_path.with_name(f"{recording.id}.{tier}.{audio_format}"),
+            )
+        for audio_format in extra_formats:
+            replace_audio(
+                recording.get_audio_name(audio_format),
+                recording_path.with_suffix(f".{audio_format}"),
+            )
+        replace_audio(recording.compressed_audio.name, recording_path)
+
+    # The problems were saved with its measurements; any that make it unusable
+    # mark it as such:
+    assert measurements.problems == problems
+    apply_measurements(recording, measurements)
+    recording.save()
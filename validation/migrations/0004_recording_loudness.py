@@ -0,0 +1,87 @@
+# Generated by Django 2.2.28 on 2026-10-16 19:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("validation", "0003_auto_20200805_1549"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicalrecording",
+            name="duration",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="How long the recording is, in milliseconds",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="historicalrecording",
+            name="peak_dbfs",
+            field=models.FloatField(
+                blank=True,
+                help_text="The level of the loudest sample (dBFS)",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="historicalrecording",
+            name="rms_dbfs",
+            field=models.FloatField(
+                blank=True,
+                help_text="The average (RMS) level of the recording (dBFS)",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="historicalrecording",
+            name="waveform",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="The peak of each slice of the recording, as space-separated percentages of full scale",
+                max_length=256,
+            ),
+        ),
+        migrations.AddField(
+            model_name="recording",
+            name="duration",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="How long the recording is, in milliseconds",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="recording",
+            name="peak_dbfs",
+            field=models.FloatField(
+                blank=True,
+                help_text="The level of the loudest sample (dBFS)",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="recording",
+            name="rms_dbfs",
+            field=models.FloatField(
+                blank=True,
+                help_text="The average (RMS) level of the recording (dBFS)",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="recording",
+            name="waveform",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="The peak of each slice of the recording, as space-separated percentages of full scale",
+                max_length=256,
+            ),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.28 on 2026-10-16 20:21
+
+import posixpath
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Every other format (and tier of the bitrate ladder) that audio could have
+# been stored in before recordings kept track of them.
+EXTRA_AUDIO = ("webm", "low.m4a", "medium.m4a", "low.webm", "medium.webm")
+
+
+def find_extra_audio(apps, schema_editor):
+    """
+    Notes the audio that the recordings that were already imported have in
+    storage. This is the last time storage is asked.
+    """
+    Recording = apps.get_model("validation", "Recording")
+    storage = Recording._meta.get_field("compressed_audio").storage
+
+    found = []
+    for recording in Recording.objects.only("id").iterator():
+        recording.extra_audio = " ".join(
+            suffix
+            for suffix in EXTRA_AUDIO
+            if storage.exists(
+                posixpath.join(settings.RECVAL_AUDIO_PREFIX, f"{recording.id}.{suffix}")
+            )
+        )
+        if recording.extra_audio:
+            found.append(recording)
+    Recording.objects.bulk_update(found, ["extra_audio"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("validation", "0004_recording_loudness"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicalrecording",
+            name="extra_audio",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="The other formats (and tiers of the bitrate ladder) that the audio is stored in, as space-separated suffixes (e.g., low.m4a)",
+                max_length=128,
+            ),
+        ),
+        migrations.AddField(
+            model_name="recording",
+            name="extra_audio",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="The other formats (and tiers of the bitrate ladder) that the audio is stored in, as space-separated suffixes (e.g., low.m4a)",
+                max_length=128,
+            ),
+        ),
+        migrations.RunPython(find_extra_audio, migrations.RunPython.noop),
+    ]
@@ -16,8 +16,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import posixpath
 import re
 from pathlib import Path
+from typing import List, Optional, Tuple
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
@@ -318,6 +320,14 @@ def generate_primary_key(sender, instance, **kwargs):
 # The length of a SHA 256 hash, as hexadecimal characters.
 SHA256_HEX_LENGTH = 64
 
+# Room for a waveform of librecval.pcm.WAVEFORM_BINS peaks, each up to "100",
+# separated by spaces.
+WAVEFORM_MAX_LENGTH = 4 * 64
+
+# Room for every other format and tier of the bitrate ladder (e.g., "webm
+# low.m4a medium.m4a low.webm medium.webm"), separated by spaces.
+EXTRA_AUDIO_MAX_LENGTH = 128
+
 
 class Recording(models.Model):
     """
@@ -342,13 +352,46 @@ class Recording(models.Model):
     phrase = models.ForeignKey(Phrase, on_delete=models.CASCADE)
     session = models.ForeignKey(RecordingSession, on_delete=models.CASCADE)
 
-    # TODO: determine this automatically during import process
+    # Obviously unusable recordings are marked automatically when they are
+    # imported (see librecval.quality, and the assessquality command).
     quality = models.CharField(
         help_text="Is the recording clean? Is it suitable to use publicly?",
         **arguments_for_choices(QUALITY_CHOICES),
         blank=True,
     )
 
+    # Measured once, when the recording is imported, so that the recording can
+    # be described without downloading its audio. See librecval.pcm.Loudness.
+    duration = models.PositiveIntegerField(
+        help_text="How long the recording is, in milliseconds", null=True, blank=True
+    )
+    peak_dbfs = models.FloatField(
+        help_text="The level of the loudest sample (dBFS)", null=True, blank=True
+    )
+    rms_dbfs = models.FloatField(
+        help_text="The average (RMS) level of the recording (dBFS)",
+        null=True,
+        blank=True,
+    )
+    waveform = models.CharField(
+        help_text="The peak of each slice of the recording, as space-separated "
+        "percentages of full scale",
+        max_length=WAVEFORM_MAX_LENGTH,
+        blank=True,
+        default="",
+    )
+
+    # Recorded whenever audio in another format (or tier of the bitrate ladder)
+    # is stored, so that finding out which ones exist never has to ask the
+    # storage. See get_audio_name().
+    extra_audio = models.CharField(
+        help_text="The other formats (and tiers of the bitrate ladder) that the "
+        "audio is stored in, as space-separated suffixes (e.g., low.m4a)",
+        max_length=EXTRA_AUDIO_MAX_LENGTH,
+        blank=True,
+        default="",
+    )
+
     # Keep track of the recording's history.
     history = HistoricalRecords(excluded_fields=["compressed_audio"])
 
@@ -362,6 +405,46 @@ class Recording(models.Model):
         """
         return Path(settings.MEDIA_ROOT) / settings.RECVAL_AUDIO_PREFIX
 
+    @property
+    def waveform_peaks(self) -> List[int]:
+        """
+        The waveform, as a list of percentages (empty if it was never measured).
+        """
+        return [int(peak) for peak in self.waveform.split()]
+
+    @property
+    def extra_audio_variants(self) -> List[Tuple[str, Optional[str]]]:
+        """
+        Every other format (and tier of the bitrate ladder) that the
+        recording's audio is stored in, as (format, tier) pairs.
+        """
+        variants = []
+        for suffix in self.extra_audio.split():
+            tier, _dot, audio_format = suffix.rpartition(".")
+            variants.append((audio_format, tier or None))
+        return variants
+
+    def add_extra_audio(self, audio_format: str, tier: Optional[str] = None) -> None:
+        """
+        Notes that the recording's audio is now stored in another format (or
+        tier of the bitrate ladder). Doesn't save the recording.
+        """
+        if (audio_format, tier) in self.extra_audio_variants:
+            return
+        suffix = audio_format if tier is None else f"{tier}.{audio_format}"
+        self.extra_audio = " ".join([*self.extra_audio.split(), suffix])
+
+    def get_audio_name(self, audio_format: str, tier: Optional[str] = None) -> str:
+        """
+        Returns the name of the recording's audio in another format (e.g.,
+        "webm"), or another tier of the bitrate ladder (e.g., "low"), relative
+        to settings.MEDIA_ROOT. The audio may not exist!
+        """
+        filename = f"{self.id}.{audio_format}"
+        if tier is not None:
+            filename = f"{self.id}.{tier}.{audio_format}"
+        return posixpath.join(settings.RECVAL_AUDIO_PREFIX, filename)
+
 
 # ############################### Utilities ############################### #
 
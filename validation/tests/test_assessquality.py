@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pathlib import Path
+
+import pytest  # type: ignore
+from django.core.management import call_command  # type: ignore
+from model_bakery import baker  # type: ignore
+from pydub import AudioSegment  # type: ignore
+from pydub.generators import Sine  # type: ignore
+
+from validation.models import Recording
+
+
+@pytest.mark.django_db
+def test_assess_quality(settings, tmp_path: Path, capsys) -> None:
+    """
+    Obviously unusable recordings are marked as such, unless someone already
+    decided on their quality.
+    """
+    settings.MEDIA_ROOT = tmp_path
+    audio_dir = Recording.get_path_to_audio_directory()
+    audio_dir.mkdir(parents=True)
+    silence = AudioSegment.silent(duration=300)
+    tone = Sine(440).to_audio_segment(duration=500, volume=-6.0)
+
+    def make_recording(audio: AudioSegment, **kwargs) -> Recording:
+        recording = baker.make_recipe("validation.recording", **kwargs)
+        audio.export(audio_dir / f"{recording.id}.wav", format="wav").close()
+        recording.compressed_audio = recording.get_audio_name("wav")
+        recording.save()
+        return recording
+
+    clean = make_recording(silence + tone + silence, quality="")
+    # Way too much gain:
+    clipped = make_recording(silence + (tone + 20) + silence, quality="")
+    reviewed = make_recording(silence + (tone + 20) + silence, quality=Recording.CLEAN)
+
+    call_command("assessquality", "--dry-run")
+    assert f"{clipped.id}: clipped" in capsys.readouterr().out
+    assert Recording.objects.get(id=clipped.id).quality == ""
+
+    call_command("assessquality", "--jobs", "2")
+    assert "Assessed 2 recordings; 1 unusable" in capsys.readouterr().out
+    assert Recording.objects.get(id=clean.id).quality == ""
+    assert Recording.objects.get(id=clipped.id).quality == Recording.UNUSABLE
+    assert Recording.objects.get(id=reviewed.id).quality == Recording.CLEAN
+    assert Recording.history.filter(id=clipped.id, quality="unusable").exists()
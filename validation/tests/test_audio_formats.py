@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest  # type: ignore
+from django.test import RequestFactory  # type: ignore
+
+from validation.audio_formats import (
+    preferred_audio_formats,
+    preferred_audio_variants,
+    preferred_tier,
+)
+
+# What browsers send when requesting audio for an <audio> element:
+CHROME = "*/*"
+FIREFOX = (
+    "audio/webm,audio/ogg,audio/wav,audio/*;q=0.9,application/ogg;q=0.7,"
+    "video/*;q=0.6,*/*;q=0.5"
+)
+
+
+@pytest.mark.parametrize(
+    "accept,query,expected",
+    [
+        # No preference: .m4a works everywhere.
+        (None, {}, "m4a"),
+        (CHROME, {}, "m4a"),
+        ("audio/*", {}, "m4a"),
+        # Firefox explicitly prefers WebM:
+        (FIREFOX, {}, "webm"),
+        ("audio/mp4;q=0.5, audio/webm", {}, "webm"),
+        ("audio/mp4, audio/webm;q=0.5", {}, "m4a"),
+        ("audio/webm;q=nonsense, audio/*", {}, "m4a"),
+        # The query parameter beats the Accept header:
+        (CHROME, {"format": "webm"}, "webm"),
+        (FIREFOX, {"format": "m4a"}, "m4a"),
+        # ...unless it's not a format we have.
+        (FIREFOX, {"format": "flac"}, "webm"),
+    ],
+)
+def test_preferred_audio_format(accept, query, expected) -> None:
+    headers = {} if accept is None else {"HTTP_ACCEPT": accept}
+    request = RequestFactory().get("/recording/abc.m4a", query, **headers)
+
+    formats = preferred_audio_formats(request)
+    assert formats[0] == expected
+    # Every format is always an option:
+    assert sorted(formats) == ["m4a", "webm"]
+
+
+@pytest.mark.parametrize(
+    "save_data,query,expected",
+    [
+        (None, {}, "high"),
+        ("on", {}, "low"),
+        ("ON", {}, "low"),
+        ("off", {}, "high"),
+        # The query parameter beats the Save-Data header:
+        ("on", {"tier": "medium"}, "medium"),
+        (None, {"tier": "low"}, "low"),
+        (None, {"tier": "ultra"}, "high"),
+    ],
+)
+def test_preferred_tier(save_data, query, expected) -> None:
+    headers = {} if save_data is None else {"HTTP_SAVE_DATA": save_data}
+    request = RequestFactory().get("/recording/abc.m4a", query, **headers)
+    assert preferred_tier(request) == expected
+
+
+def test_preferred_audio_variants() -> None:
+    """
+    The format matters more than the tier; the top tier is always an option.
+    """
+    request = RequestFactory().get(
+        "/recording/abc.m4a", HTTP_ACCEPT=FIREFOX, HTTP_SAVE_DATA="on"
+    )
+    assert preferred_audio_variants(request) == [
+        ("webm", "low"),
+        ("webm", None),
+        ("m4a", "low"),
+        ("m4a", None),
+    ]
+
+    request = RequestFactory().get("/recording/abc.m4a")
+    assert preferred_audio_variants(request) == [("m4a", None), ("webm", None)]
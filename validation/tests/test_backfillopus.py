@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pathlib import Path
+
+import pytest  # type: ignore
+from django.core.management import call_command  # type: ignore
+from model_bakery import baker  # type: ignore
+from pydub.generators import Square  # type: ignore
+
+from librecval.transcode_recording import transcode_to_aac
+from validation.models import Recording
+
+
+@pytest.mark.django_db
+def test_backfill_opus(settings, tmp_path: Path, capsys) -> None:
+    """
+    Recordings with only .m4a audio get Opus audio too, with the same tags.
+    """
+    settings.MEDIA_ROOT = tmp_path
+    audio_dir = Recording.get_path_to_audio_directory()
+    audio_dir.mkdir(parents=True)
+
+    recording = baker.make_recipe("validation.recording")
+    m4a_path = audio_dir / f"{recording.id}.m4a"
+    transcode_to_aac(
+        Square(441).to_audio_segment(), m4a_path, tags=dict(title="acimosis")
+    )
+    recording.compressed_audio = recording.get_audio_name("m4a")
+    recording.save()
+
+    call_command("backfillopus")
+
+    opus_path = tmp_path / recording.get_audio_name("webm")
+    blob = opus_path.read_bytes()
+    assert blob[:4] == b"\x1a\x45\xdf\xa3", "Did not write a WebM file"
+    assert b"acimosis" in blob
+    assert "Encoded 1 recordings" in capsys.readouterr().out
+    assert Recording.objects.get(id=recording.id).extra_audio == "webm"
+
+    # Recordings that already have Opus audio are left alone:
+    call_command("backfillopus")
+    assert "Encoded 0 recordings" in capsys.readouterr().out
+    assert opus_path.read_bytes() == blob
+    # Nothing is left behind in the staging directory:
+    assert {p.name for p in audio_dir.iterdir()} == {m4a_path.name, opus_path.name}
@@ -288,6 +288,20 @@ def test_recording():
     assert str(recording.session) in str(recording)
 
 
+def test_recording_extra_audio():
+    """
+    A recording remembers which other formats (and tiers) its audio is in.
+    """
+    recording = Recording()
+    assert recording.extra_audio_variants == []
+
+    recording.add_extra_audio("webm")
+    recording.add_extra_audio("m4a", "low")
+    recording.add_extra_audio("webm")
+    assert recording.extra_audio == "webm low.m4a"
+    assert recording.extra_audio_variants == [("webm", None), ("m4a", "low")]
+
+
 @pytest.mark.django_db
 def test_phrase_recordings():
     # Keep it in a 32 bit signed integer
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import shutil
+from pathlib import Path
+
+import pytest  # type: ignore
+from django.core.management import call_command  # type: ignore
+
+from librecval import REPOSITORY_ROOT
+from librecval.extract_phrases import RecordingInfo
+from validation.models import Recording, Speaker
+
+FIXTURES = REPOSITORY_ROOT / "tests" / "fixtures"
+
+
+@pytest.mark.django_db
+def test_reassign_speakers(imported, settings, tmp_path, capsys) -> None:
+    """
+    When only the speaker codes of a session change in the metadata, its
+    recordings are given to their new speakers, without importing it again.
+    """
+    capsys.readouterr()
+    moved = Recording.objects.filter(speaker__code="MAR").first()
+    opus_name = moved.get_audio_name("webm")
+    (settings.MEDIA_ROOT / opus_name).write_bytes(b"opus")
+    moved.add_extra_audio("webm")
+    moved.save()
+    audio = {
+        key_of(r): (settings.MEDIA_ROOT / r.compressed_audio.name).read_bytes()
+        for r in Recording.objects.all()
+    }
+
+    # Someone else was on mic 3 in one session, and the speakers on mics 2 and
+    # 3 swapped places in the other:
+    metadata_path = tmp_path / "metadata.csv"
+    metadata_path.write_text(
+        settings.RECVAL_METADATA_PATH.read_text(encoding="UTF-8")
+        .replace("2015-04-15pm,ELICIT,LOU,MAR", "2015-04-15pm,ELICIT,LOU,ROS")
+        .replace("2015-04-29pm,LOU,BET,JER", "2015-04-29pm,LOU,JER,BET"),
+        encoding="UTF-8",
+    )
+    settings.RECVAL_METADATA_PATH = metadata_path
+
+    call_command("importrecordings")
+
+    out = capsys.readouterr().out
+    assert "Metadata changed for 2 sessions" in out
+    assert "Reassigned 2 recordings in 2015-04-15-PM-___-_: MAR → ROS" in out
+    assert "Reassigned 4 recordings in 2015-04-29-PM-___-_: BET → JER, JER → BET" in (
+        out
+    )
+    assert "0 recordings in" in out
+
+    assert Recording.objects.count() == 8
+    assert not Recording.objects.filter(speaker__code="MAR").exists()
+    assert Speaker.objects.filter(code="ROS").exists()
+    old_speakers = {"ROS": "MAR", "JER": "BET", "BET": "JER"}
+    for recording in Recording.objects.all():
+        assert recording.id == recording_id(recording)
+        audio_path = settings.MEDIA_ROOT / recording.compressed_audio.name
+        old_speaker = old_speakers.get(recording.speaker_id, recording.speaker_id)
+        assert audio_path.read_bytes() == audio.pop(key_of(recording, old_speaker))
+    assert audio == {}
+
+    # Other formats are renamed along with the recording:
+    assert not (settings.MEDIA_ROOT / opus_name).exists()
+    (reassigned,) = Recording.objects.filter(
+        speaker__code="ROS", timestamp=moved.timestamp, phrase=moved.phrase
+    )
+    assert (settings.MEDIA_ROOT / reassigned.get_audio_name("webm")).read_bytes() == (
+        b"opus"
+    )
+    assert reassigned.extra_audio_variants == [("webm", None)]
+    assert Recording.history.filter(id=reassigned.id).exists()
+
+    # Nothing changed since, so the next import does nothing at all:
+    call_command("importrecordings")
+    assert "Reassigned" not in capsys.readouterr().out
+
+
+def key_of(recording: Recording, speaker=None):
+    """
+    What identifies the recording, besides its ID.
+    """
+    speaker = speaker or recording.speaker_id
+    return (recording.session_id, speaker, recording.timestamp, recording.phrase_id)
+
+
+def recording_id(recording: Recording) -> str:
+    """
+    The ID that the recording would have been given when it was imported.
+    """
+    info = RecordingInfo(
+        recording.session.as_session_id(),
+        recording.speaker_id,
+        recording.phrase.kind,
+        recording.timestamp,
+        recording.phrase.transcription,
+        recording.phrase.translation,
+    )
+    return info.compute_sha256hash()
+
+
+@pytest.fixture
+def imported(tmp_path: Path, settings):
+    """
+    Imports the two fixture sessions, as importrecordings would.
+    """
+    sessions = tmp_path / "sessions"
+    for session_name in ("2015-04-15-PM-___-_", "2015-04-29-PM-___-_"):
+        session_dir = sessions / session_name
+        session_dir.mkdir(parents=True)
+        for mic in (2, 3):
+            shutil.copy(FIXTURES / "test.wav", session_dir / f"{mic}_001.wav")
+            shutil.copy(FIXTURES / "test.TextGrid", session_dir / f"{mic}_001.TextGrid")
+
+    settings.MEDIA_ROOT = tmp_path / "media"
+    settings.RECVAL_SESSIONS_DIR = sessions
+    settings.RECVAL_METADATA_PATH = FIXTURES / "test_metadata.csv"
+    settings.RECVAL_TEXT_GRID_CACHE_DIR = tmp_path / "text-grid-cache"
+    settings.RECVAL_TRANSCODE_CACHE_DIR = tmp_path / "transcode-cache"
+    settings.RECVAL_PCM_CACHE_DIR = tmp_path / "pcm-cache"
+    settings.RECVAL_IMPORT_MANIFEST_PATH = tmp_path / "manifest.json"
+
+    call_command("importrecordings")
+    assert Recording.objects.count() == 8
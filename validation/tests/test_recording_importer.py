@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest  # type: ignore
+
+from librecval.extract_phrases import RecordingInfo
+from librecval.import_recordings import measurements_path
+from librecval.pcm import Loudness
+from librecval.recording_session import SessionID
+from librecval.work_queue import record_recording
+from validation.management.commands.importrecordings import (
+    RecordingImporter,
+    commit_extracted_session,
+    staging_directory,
+)
+from validation.models import Phrase, Recording, RecordingSession, Speaker
+
+
+@pytest.mark.django_db
+def test_import_in_bulk(recordings) -> None:
+    """
+    Recordings are saved once their session is done, along with their history.
+    """
+    # Three recordings of two phrases, in two sessions, by two speakers:
+    with RecordingImporter() as importer:
+        importer(*recordings[0])
+        importer(*recordings[1])
+        assert Recording.objects.count() == 0, "should wait for the session"
+        importer(*recordings[2])
+        assert Recording.objects.count() == 2
+
+    assert Recording.objects.count() == 3
+    assert Recording.history.count() == 3
+    assert Speaker.objects.count() == 2
+    assert RecordingSession.objects.count() == 2
+    assert Phrase.objects.count() == 2
+
+    info, recording_path = recordings[0]
+    recording = Recording.objects.get(id=info.compute_sha256hash())
+    assert recording.compressed_audio.read() == info.signature().encode("UTF-8")
+    # Local audio is moved into place, rather than copied.
+    assert not recording_path.exists()
+
+
+@pytest.mark.django_db
+def test_import_same_recordings_twice(recordings, settings) -> None:
+    """
+    Two imports can save the same recordings without clashing.
+    """
+    first, second = RecordingImporter(), RecordingImporter()
+    for info, recording_path in recordings:
+        # Each import transcodes its own copy of the audio:
+        copy = recording_path.with_name("copy-" + recording_path.name)
+        copy.write_bytes(recording_path.read_bytes())
+        first(info, recording_path)
+        second(info, copy)
+
+    first.flush()
+    second.flush()
+
+    assert Recording.objects.count() == 3
+    assert Recording.history.count() == 3
+    assert Phrase.objects.count() == 2
+    # The second copy of the audio is not left behind:
+    audio_dir = settings.MEDIA_ROOT / settings.RECVAL_AUDIO_PREFIX
+    assert len(list(audio_dir.iterdir())) == 3
+
+
+@pytest.mark.django_db
+def test_resume_after_crash(recordings, settings, tmp_path: Path) -> None:
+    """
+    Audio stored by an import that crashed before saving its recordings is
+    replaced when the import is resumed, rather than stored twice.
+    """
+    info, recording_path = recordings[0]
+    crashed = RecordingImporter()
+    crashed(info, recording_path)
+    # ...and the import crashes before crashed.flush().
+
+    resumed_path = tmp_path / "resumed" / recording_path.name
+    resumed_path.parent.mkdir()
+    resumed_path.write_bytes(b"resumed " + info.signature().encode("UTF-8"))
+    with RecordingImporter() as importer:
+        importer(info, resumed_path)
+
+    recording = Recording.objects.get()
+    assert recording.compressed_audio.read().startswith(b"resumed ")
+    audio_dir = settings.MEDIA_ROOT / settings.RECVAL_AUDIO_PREFIX
+    assert [p.name for p in audio_dir.iterdir()] == [recording_path.name]
+
+
+def test_staging_directory_removes_stale_ones(settings, tmp_path: Path) -> None:
+    """
+    Staging directories left behind by imports that crashed are removed.
+    """
+    settings.MEDIA_ROOT = tmp_path / "media"
+    # Next to MEDIA_ROOT, since everything within it is served to anyone:
+    staging_root = tmp_path / "media-staging"
+    host = socket.gethostname()
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+
+    crashed = staging_root / f"{host}:{finished.pid}:crashed"
+    running = staging_root / f"{host}:{os.getpid()}:running"
+    elsewhere = staging_root / "elsewhere:1:running"
+    old_style = settings.MEDIA_ROOT / ".import-crashed"
+    for directory in (crashed, running, elsewhere, old_style):
+        directory.mkdir(parents=True)
+        (directory / "abc123.m4a").write_bytes(b"audio")
+    # Nothing has been written to it for a long time:
+    os.utime(old_style, (0, 0))
+
+    with staging_directory() as staging_dir:
+        assert Path(staging_dir).parent == staging_root
+        assert not crashed.exists()
+        assert not old_style.exists()
+        assert running.exists()
+        assert elsewhere.exists()
+    assert not Path(staging_dir).exists()
+
+    settings.RECVAL_STAGING_DIR = str(tmp_path / "staging")
+    with staging_directory() as staging_dir:
+        assert Path(staging_dir).parent == tmp_path / "staging"
+
+
+@pytest.mark.django_db
+def test_import_extra_formats(recordings, settings) -> None:
+    """
+    Audio in extra formats is stored next to the recording's .m4a audio.
+    """
+    with RecordingImporter(extra_formats=["webm"]) as importer:
+        for info, recording_path in recordings:
+            opus_path = recording_path.with_suffix(".webm")
+            opus_path.write_bytes(b"opus " + info.signature().encode("UTF-8"))
+            importer(info, recording_path)
+            assert not opus_path.exists()
+
+    for info, _recording_path in recordings:
+        recording = Recording.objects.get(id=info.compute_sha256hash())
+        opus_path = settings.MEDIA_ROOT / recording.get_audio_name("webm")
+        assert opus_path.read_bytes() == b"opus " + info.signature().encode("UTF-8")
+        assert recording.extra_audio_variants == [("webm", None)]
+
+
+@pytest.mark.django_db
+def test_import_bitrate_ladder(recordings, settings) -> None:
+    """
+    Lower tiers of the bitrate ladder are stored next to the .m4a audio.
+    """
+    with RecordingImporter(tiers=["low"]) as importer:
+        for info, recording_path in recordings:
+            low_path = recording_path.with_suffix(".low.m4a")
+            low_path.write_bytes(b"low " + info.signature().encode("UTF-8"))
+            importer(info, recording_path)
+
+    for info, _recording_path in recordings:
+        recording = Recording.objects.get(id=info.compute_sha256hash())
+        low_path = settings.MEDIA_ROOT / recording.get_audio_name("m4a", "low")
+        assert low_path.read_bytes() == b"low " + info.signature().encode("UTF-8")
+        assert recording.extra_audio_variants == [("m4a", "low")]
+
+
+@pytest.mark.django_db
+def test_import_measurements(recordings) -> None:
+    """
+    What was measured during extraction is stored with the recording.
+    """
+    (info, recording_path), (other, _), (broken, broken_path) = recordings
+    loudness = Loudness(duration=1234, peak=-0.5, rms=-18.25, waveform=[0, 50, 100])
+    write_measurements(recording_path, loudness, [])
+    write_measurements(broken_path, loudness, ["clipped"])
+
+    with RecordingImporter() as importer:
+        for recording in recordings:
+            importer(*recording)
+
+    recording = Recording.objects.get(id=info.compute_sha256hash())
+    assert recording.duration == 1234
+    assert recording.peak_dbfs == -0.5
+    assert recording.rms_dbfs == -18.25
+    assert recording.waveform_peaks == [0, 50, 100]
+    assert recording.quality == ""
+    # Recordings without measurements are left blank:
+    unmeasured = Recording.objects.get(id=other.compute_sha256hash())
+    assert unmeasured.duration is None
+    assert unmeasured.waveform_peaks == []
+    # Recordings with problems are unusable:
+    assert Recording.objects.get(id=broken.compute_sha256hash()).quality == (
+        Recording.UNUSABLE
+    )
+
+
+@pytest.mark.django_db
+def test_commit_extracted_session(recordings, tmp_path: Path) -> None:
+    """
+    The coordinator saves the recordings that a worker extracted, even if a
+    previous coordinator crashed before saving them to the database.
+    """
+    output = tmp_path / "worker-output"
+    output.mkdir()
+    for info, recording_path in recordings:
+        moved_path = output / recording_path.name
+        recording_path.rename(moved_path)
+        record_recording(output, info, moved_path)
+    # As if the coordinator crashed after storing the first recording's audio:
+    info, recording_path = recordings[0]
+    RecordingImporter(keep_files=True)(info, output / recording_path.name)
+    assert Recording.objects.count() == 0
+
+    importer = RecordingImporter(keep_files=True)
+    commit_extracted_session(importer, "2015-04-15-AM-___-_", output)
+
+    assert Recording.objects.count() == 3
+    assert not output.exists()
+    # Committing the same session again changes nothing:
+    commit_extracted_session(importer, "2015-04-15-AM-___-_", output)
+    assert Recording.objects.count() == 3
+
+
+def write_measurements(recording_path: Path, loudness, problems) -> None:
+    measurements = {"loudness": loudness._asdict(), "problems": problems}
+    with open(measurements_path(recording_path), "w", encoding="UTF-8") as json_file:
+        json.dump(measurements, json_file)
+
+
+@pytest.fixture
+def recordings(tmp_path: Path, settings):
+    settings.MEDIA_ROOT = tmp_path / "media"
+
+    morning = SessionID.from_name("2015-04-15-AM-___-_")
+    evening = SessionID.from_name("2015-04-15-PM-___-_")
+    infos = [
+        RecordingInfo(morning, "LOU", "word", 100, "acimosis", "puppy"),
+        RecordingInfo(morning, "MAR", "word", 100, "acimosis", "puppy"),
+        RecordingInfo(evening, "LOU", "word", 500, "minôs", "cat"),
+    ]
+
+    result = []
+    for info in infos:
+        recording_path = tmp_path / f"{info.compute_sha256hash()}.m4a"
+        recording_path.write_bytes(info.signature().encode("UTF-8"))
+        result.append((info, recording_path))
+    return result
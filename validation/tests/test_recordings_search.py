@@ -44,7 +44,9 @@ def test_search_recordings(client, bake_recording):
 
     # Make two recordings. We want to make sure the query actually works by
     # only retrieving the *relevant* recording.
-    recording = bake_recording(phrase=phrase, speaker=speaker)
+    recording = bake_recording(
+        phrase=phrase, speaker=speaker, duration=1250, waveform="10 100 40"
+    )
     unrelated_recording = bake_recording()
 
     assert recording.phrase != unrelated_recording.phrase
@@ -70,6 +72,8 @@ def test_search_recordings(client, bake_recording):
     assert recording.get("speaker_bio_url").startswith(("http://", "https://"))
     assert speaker.code in recording.get("speaker_bio_url")
     assert recording.get("dialect") == speaker.dialect
+    assert recording.get("duration_ms") == 1250
+    assert recording.get("waveform") == [10, 100, 40]
 
 
 @pytest.mark.django_db
@@ -233,6 +237,29 @@ def test_search_fuzzy_match(client, bake_recording):
         assert len(resultant_recordings) == RECORDINGS_PER_PHRASE
 
 
+@pytest.mark.django_db
+def test_search_links_to_stored_variants(client, bake_recording):
+    """
+    Results link to the variant the client likes best, out of the ones that
+    the recording says are stored.
+    """
+    phrase = baker.make_recipe("validation.phrase", transcription="acimosis")
+    bake_recording(phrase=phrase, extra_audio="webm low.m4a")
+    url = reverse("validation:search_recordings", kwargs={"query": "acimosis"})
+
+    def recording_url(**kwargs) -> str:
+        (result,) = client.get(url, **kwargs).json()
+        return result["recording_url"]
+
+    assert recording_url().endswith(".m4a")
+    assert recording_url(HTTP_ACCEPT="audio/webm").endswith(".webm")
+    assert recording_url(HTTP_SAVE_DATA="on").endswith(".low.m4a")
+    # There's no low tier of the Opus audio:
+    assert recording_url(HTTP_ACCEPT="audio/webm", HTTP_SAVE_DATA="on").endswith(
+        ".webm"
+    )
+
+
 @pytest.fixture
 def bake_recording(tmpdir, settings):
     """
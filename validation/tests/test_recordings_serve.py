@@ -54,14 +54,36 @@ def test_serve_recording(client, exported_recording):
     assert "max-age=" in page.get("Cache-Control")
     assert "public" in page.get("Cache-Control")
     assert "must-revalidate" not in page.get("Cache-Control")
-    # TODO: last modified date?
+    assert page.get("Last-Modified")
     assert page.get("ETag").startswith('"'), "Incorrect ETag syntax"
     assert page.get("ETag").endswith('"'), "Incorrect ETag syntax"
-    assert (
-        page.get("ETag").strip('"') in recording.id
+    assert page.get("ETag").startswith(
+        f'"{recording.id[:7]}-'
     ), "The ETag should be based on the recording ID"
 
 
+@pytest.mark.django_db
+def test_serve_replaced_recording(client, exported_recording, settings):
+    """
+    When a recording's audio is replaced, its ETag changes too.
+    """
+    recording, file_contents = exported_recording
+    url = reverse("validation:recording", kwargs={"recording_id": recording.id})
+    old_etag = client.get(url).get("ETag")
+
+    # Replace the audio, like reextractrecording does:
+    audio_path = Path(settings.MEDIA_ROOT) / recording.get_audio_name("m4a")
+    new_path = audio_path.with_name("new.m4a")
+    AudioSegment.silent(duration=100).export(
+        os.fspath(new_path), format="ipod", parameters=["-strict", "-2"]
+    )
+    os.replace(new_path, audio_path)
+
+    page = client.get(url)
+    assert b"".join(page.streaming_content) == audio_path.read_bytes()
+    assert page.get("ETag") != old_etag
+
+
 @pytest.mark.django_db
 def test_serve_recording_partial_content(client, exported_recording):
     """
@@ -117,6 +139,74 @@ def test_serve_recording_partial_content_open_range(client, exported_recording):
     assert content == file_contents
 
 
+@pytest.mark.django_db
+def test_serve_opus_recording(client, exported_recording):
+    """
+    Browsers that prefer Opus get Opus audio, if the recording has it.
+    """
+    recording, m4a_contents = exported_recording
+    url = reverse("validation:recording", kwargs={"recording_id": recording.id})
+
+    # There's no Opus audio yet, so everybody gets the .m4a file:
+    page = client.get(url, HTTP_ACCEPT="audio/webm")
+    assert page.get("Content-Type") == "audio/m4a"
+    assert b"".join(page.streaming_content) == m4a_contents
+
+    audio_dir = Recording.get_path_to_audio_directory()
+    audio = AudioSegment.silent(duration=100)
+    opus_path = audio_dir / f"{recording.id}.webm"
+    audio.export(os.fspath(opus_path), format="webm", codec="libopus")
+    opus_contents = opus_path.read_bytes()
+
+    opus_requests = [
+        {"HTTP_ACCEPT": "audio/webm,audio/*;q=0.9"},
+        {"data": {"format": "webm"}},
+    ]
+    for kwargs in opus_requests:
+        page = client.get(url, **kwargs)
+        assert page.status_code == 200
+        assert page.get("Content-Type") == "audio/webm"
+        assert b"".join(page.streaming_content) == opus_contents
+        # Caches must not mix up the formats:
+        assert "Accept" in page.get("Vary")
+        assert page.get("ETag") != f'"{recording.id[:7]}"'
+
+    # Browsers without a preference still get the .m4a file:
+    page = client.get(url, HTTP_ACCEPT="*/*")
+    assert page.get("Content-Type") == "audio/m4a"
+
+
+@pytest.mark.django_db
+def test_serve_recording_bitrate_ladder(client, exported_recording, settings):
+    """
+    Clients that want to save data get the bottom of the bitrate ladder.
+    """
+    recording, m4a_contents = exported_recording
+    url = reverse("validation:recording", kwargs={"recording_id": recording.id})
+
+    low_path = Path(settings.MEDIA_ROOT) / recording.get_audio_name("m4a", "low")
+    audio = AudioSegment.silent(duration=100)
+    audio.export(
+        os.fspath(low_path),
+        format="ipod",
+        bitrate="32k",
+        parameters=["-strict", "-2"],
+    )
+    low_contents = low_path.read_bytes()
+
+    for kwargs in [{"HTTP_SAVE_DATA": "on"}, {"data": {"tier": "low"}}]:
+        page = client.get(url, **kwargs)
+        assert page.status_code == 200
+        assert page.get("Content-Type") == "audio/m4a"
+        assert b"".join(page.streaming_content) == low_contents
+        assert "Save-Data" in page.get("Vary")
+        assert page.get("ETag").startswith(f'"{recording.id[:7]}-low-')
+
+    # There's no medium tier, so the recording itself will do:
+    page = client.get(url, {"tier": "medium"})
+    assert b"".join(page.streaming_content) == m4a_contents
+
+
 # ################################ Fixtures ################################ #
 
 
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright (C) 2018 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import shutil
+from pathlib import Path
+
+import pytest  # type: ignore
+from django.core.management import call_command  # type: ignore
+from django.core.management.base import CommandError  # type: ignore
+
+from librecval import REPOSITORY_ROOT
+from librecval.quality import QualityAnalyzer
+from validation.models import Recording
+
+FIXTURES = REPOSITORY_ROOT / "tests" / "fixtures"
+
+
+@pytest.mark.django_db
+def test_reextract_recording(imported, settings, capsys) -> None:
+    """
+    A recording's audio is replaced, without touching anything else.
+    """
+    recording, *others = Recording.objects.order_by("id")
+    audio_path = settings.MEDIA_ROOT / recording.compressed_audio.name
+    original_audio = audio_path.read_bytes()
+    others_audio = {
+        other.id: (settings.MEDIA_ROOT / other.compressed_audio.name).read_bytes()
+        for other in others
+    }
+    end = recording.timestamp + 100
+
+    call_command("reextractrecording", recording.id, "--end", str(end))
+
+    assert f"Extracted {recording.id} again: 100 ms" in capsys.readouterr().out
+    reextracted = Recording.objects.get(id=recording.id)
+    assert reextracted.duration == 100
+    assert reextracted.timestamp == recording.timestamp
+    assert reextracted.compressed_audio.name == recording.compressed_audio.name
+    assert audio_path.read_bytes() != original_audio
+    assert Recording.history.filter(id=recording.id).count() == 2
+    for other in others:
+        other_path = settings.MEDIA_ROOT / other.compressed_audio.name
+        assert other_path.read_bytes() == others_audio[other.id]
+
+    with pytest.raises(CommandError):
+        call_command("reextractrecording", "0" * 64)
+    with pytest.raises(CommandError):
+        call_command(
+            "reextractrecording", recording.id, "--start", str(end), "--end", str(end)
+        )
+
+
+@pytest.mark.django_db
+def test_reextract_recording_quality(imported, monkeypatch) -> None:
+    """
+    A recording keeps the quality that someone gave it, unless its new audio
+    is unusable.
+    """
+    recording = Recording.objects.order_by("id").first()
+    recording.quality = Recording.CLEAN
+    recording.save()
+
+    call_command("reextractrecording", recording.id)
+    assert Recording.objects.get(id=recording.id).quality == Recording.CLEAN
+
+    # Nothing is loud enough for this:
+    monkeypatch.setattr(
+        "validation.management.commands.reextractrecording.QualityAnalyzer",
+        lambda: QualityAnalyzer(silence_threshold=0.0),
+    )
+    call_command("reextractrecording", recording.id)
+    assert Recording.objects.get(id=recording.id).quality == Recording.UNUSABLE
+
+
+@pytest.fixture
+def imported(tmp_path: Path, settings):
+    """
+    Imports the two fixture sessions, as importrecordings would.
+    """
+    sessions = tmp_path / "sessions"
+    for session_name in ("2015-04-15-PM-___-_", "2015-04-29-PM-___-_"):
+        session_dir = sessions / session_name
+        session_dir.mkdir(parents=True)
+        for mic in (2, 3):
+            shutil.copy(FIXTURES / "test.wav", session_dir / f"{mic}_001.wav")
+            shutil.copy(FIXTURES / "test.TextGrid", session_dir / f"{mic}_001.TextGrid")
+
+    settings.MEDIA_ROOT = tmp_path / "media"
+    settings.RECVAL_SESSIONS_DIR = sessions
+    settings.RECVAL_METADATA_PATH = FIXTURES / "test_metadata.csv"
+    settings.RECVAL_TEXT_GRID_CACHE_DIR = tmp_path / "text-grid-cache"
+    settings.RECVAL_TRANSCODE_CACHE_DIR = tmp_path / "transcode-cache"
+    settings.RECVAL_PCM_CACHE_DIR = tmp_path / "pcm-cache"
+    settings.RECVAL_IMPORT_MANIFEST_PATH = tmp_path / "manifest.json"
+
+    call_command("importrecordings")
+    assert Recording.objects.count() == 8
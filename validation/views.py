@@ -31,12 +31,18 @@ from django.http import (
     HttpResponseRedirect,
 )
 from django.urls import reverse
+from django.utils.http import http_date
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login as django_login
 
 from librecval.normalization import to_indexable_form
 
 from .crude_views import *
+from .audio_formats import (
+    AUDIO_CONTENT_TYPES,
+    DEFAULT_AUDIO_FORMAT,
+    preferred_audio_variants,
+)
 from .models import Phrase, Recording
 from .helpers import get_distance_with_translations
 from .forms import EditSegment, Login, Register
@@ -83,15 +89,37 @@ def serve_recording(request, recording_id):
     # just a part of it. Note: GitHub uses 7 digits.
     HASH_PREFIX_LENGTH = 7
     recording = get_object_or_404(Recording, id=recording_id)
-    audio_dir = Recording.get_path_to_audio_directory()
-
-    local_file_path = audio_dir / f"{recording.id}.m4a"
-    response = serve_file(request, local_file_path)
+    media_root = Path(settings.MEDIA_ROOT)
+
+    # Serve the variant the client likes best, out of the ones we have.
+    for audio_format, tier in preferred_audio_variants(request):
+        local_file_path = media_root / recording.get_audio_name(audio_format, tier)
+        if local_file_path.exists():
+            break
+    else:
+        audio_format, tier = DEFAULT_AUDIO_FORMAT, None
+        local_file_path = media_root / recording.get_audio_name(audio_format)
+
+    response = serve_file(
+        request, local_file_path, content_type=AUDIO_CONTENT_TYPES[audio_format]
+    )
 
     # The recording files basically never change, so tell everybody to cache
     # the dookey out these files (or at very least, a year).
     response["Cache-Control"] = f"public, max-age={60 * 60 * 24 * 365}"
-    response["ETag"] = f'"{recording.id[:HASH_PREFIX_LENGTH]}"'
+    # ...but caches must keep the variants apart.
+    response["Vary"] = "Accept, Save-Data"
+    etag = recording.id[:HASH_PREFIX_LENGTH]
+    if audio_format != DEFAULT_AUDIO_FORMAT:
+        etag += f"-{audio_format}"
+    if tier is not None:
+        etag += f"-{tier}"
+    # The audio can be replaced (e.g., when it's extracted again), so the ETag
+    # must change along with the file itself (like nginx's ETags do).
+    stat = local_file_path.stat()
+    etag += f"-{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    response["ETag"] = f'"{etag}"'
+    response["Last-Modified"] = http_date(stat.st_mtime)
     return response
 
 
@@ -111,9 +139,22 @@ def search_recordings(request, query):
         return add_cors_headers(response)
 
     word_forms = frozenset(query.split(","))
+    audio_variants = preferred_audio_variants(request)
+
+    def make_uri_for_recording(rec: Recording) -> str:
+        # Link to the variant the client likes best, out of the ones we have.
+        # The recording knows which ones those are, so storage isn't asked.
+        stored = rec.extra_audio_variants
+        for audio_format, tier in audio_variants:
+            if (audio_format, tier) == (DEFAULT_AUDIO_FORMAT, None):
+                break
+            if (audio_format, tier) in stored:
+                storage = rec.compressed_audio.storage
+                return storage.url(rec.get_audio_name(audio_format, tier))
+        return rec.compressed_audio.url
 
     def make_absolute_uri_for_recording(rec: Recording) -> str:
-        uri = rec.compressed_audio.url
+        uri = make_uri_for_recording(rec)
         if uri.startswith("/"):
             # It's a relative URI: build an absolute URI:
             return request.build_absolute_uri(uri)
@@ -144,11 +185,17 @@ def search_recordings(request, query):
                 "dialect": rec.speaker.dialect,
                 "recording_url": make_absolute_uri_for_recording(rec),
                 "speaker_bio_url": make_absolute_uri_for_speaker(rec.speaker.code),
+                # These are null (or empty) if they were never measured:
+                "duration_ms": rec.duration,
+                "peak_dbfs": rec.peak_dbfs,
+                "rms_dbfs": rec.rms_dbfs,
+                "waveform": rec.waveform_peaks,
             }
             for rec in result_set
         )
 
     response = JsonResponse(recordings, safe=False)
+    response["Vary"] = "Accept, Save-Data"
 
     if len(recordings) == 0:
         # No matches. Return an empty JSON response